@@ -1,8 +1,43 @@
+import asyncio
+import contextlib
+import functools
+import itertools
 import re
-import requests
-import pandas as pd
-from bs4 import BeautifulSoup
-import urlexpander
+import time
+
+from . import errors
+from .cache import normalize_url, resolution_cache
+from .compact import string_table
+from .content import content_cache, content_key
+from .counts import link_counts
+from .extract import stream_find
+from .fetch import fetcher, received_bytes
+from .journal import run_journal
+from .platforms import default_registry, default_vk_registry
+from .ratelimit import async_scheduler, host_throttled, scheduler
+from .shard import (
+    bulk_normalize_link, bulk_route_raw_link, bulk_strip_scheme, mobile_prefix_re, route_parallel, shard_routes,
+    strip_scheme, strip_sm_link
+)
+from .shorteners import default_shorteners, shortener_index, url_host
+from .stats import no_lap, run_stats
+
+
+def parse_html(page_content):
+    """ parses a fetched page with BeautifulSoup, which is only imported once a page has to be parsed """
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(page_content, "html.parser")
+
+
+def advance(steps, value=None, throw=None):
+    """ sends value (or throws an error) into a generator; returns (True, what it yields) or (False, what it returns) """
+    try:
+        if throw is not None:
+            return True, steps.throw(throw)
+        return True, steps.send(value)
+    except StopIteration as stop:
+        return False, stop.value
 
 
 class formatter:
@@ -14,113 +49,651 @@ class formatter:
     ----------
     raw_links: list containing uncleaned and shortened URLs
     
+    http: optional fetcher object used for all HTTP requests. If not provided, one is created
+    with formatter's user-agent and default timeouts/retries.
+    
+    error_sink: optional path to a .jsonl or .csv file, or an errors.error_sink object. Errors are
+    appended to it as they occur, in addition to being kept in the error dataframes.
+    
+    platforms: optional platform_registry holding the rules clean() uses to classify social media
+    links. Defaults to platforms.default_registry(); add platforms and rules to it to support new sites.
+    
+    cache: optional path to a SQLite file, or a resolution_cache object. When provided, shortened
+    URLs and platform page lookups resolved by earlier runs are read from it instead of the network.
+    
+    journal: optional path to a journal file, or a run_journal object. Every network resolution is
+    appended to it as it completes, and resolutions already in it are never fetched again, so a run
+    stopped partway can be repeated with the same journal to resume it. A path resumes the journal
+    if the file exists.
+    
+    lookup_cache: optional content.content_cache, or a path to the SQLite file backing a new one.
+    The outcomes of the youtube watch, rumble, gettr, bitchute, odysee and vk page lookups are kept
+    in it by content ID, so that links to the same video or post that differ only by their query
+    string or title are looked up once. Defaults to an in-memory content_cache for this object.
+    
+    stats: True or a run_stats object to time each stage of the run and the network lookups of
+    each platform (see stats.run_stats). The timings are available as stats_df. Without it no
+    timings are taken.
+    
     Additional Info for Select Attributes
     -------------------------------------
     self.known_shorteners: a list containing a wide variety of URL-shortening services.
     Used to filter for shortened URLs.
     
+    self.shortener_index: shortener_index built from self.known_shorteners. A link is treated as
+    shortened if its host, or a domain its host belongs to, is a known shortener.
+    
     self.shortened_urls_list: filtered list containing shortened URLs
     
+    self.platform_rules: platform_registry used to classify social media links. Each link is
+    dispatched on its platform prefix to that platform's precompiled rules.
+    
+    self.http: the shared fetcher whose pooled keep-alive connections are reused by every
+    request made in unshorten() and clean(). Created on the first request, so runs that make
+    none never import requests.
+    
+    self.garbage_counts: list of (type, count) tuples for the garbage bins, in the order they
+    are listed in garbage_df before it is sorted. garbage_df, which needs pandas, is built from it
+    when accessed.
+    
+    self.unshorten_errors / self.clean_errors: append-only error logs. unshorten_errors_df,
+    clean_errors_df and joined_errors_df are built from them when accessed.
+    
+    self.redirect_chains: dict mapping each shortened URL requested by unshorten() to the list of
+    URLs its redirects went through, starting with the shortened URL itself and ending with the
+    one it was unshortened to, or with the last one reached when a later hop failed. URLs recalled
+    from the journal or cache have no chain.
+    
+    self.stats: the run_stats object collecting timings, or None. stats_df is built from it when
+    accessed.
+    
+    self.link_counts: link_counts of the cleaned links after clean(counts=True), which then leaves
+    formatted_links as None; otherwise None.
+    
+    self.shard_pool: optional shard.shard_pool that clean(processes > 1) runs on instead of starting
+    a process pool for the call. format_stream() sets it so that the chunks of a stream share one pool.
+    
     self.unshorten_executed: Determines whether or not clean() will filter for and discard
     shortened URLs, which is necessary if unshorten() has not been executed.
     """
     
-    def __init__(self, raw_links):
+    builtin_garbage_bins = (
+        "tiktok_garbage", "ig_garbage", "youtube_garbage", "facebook_garbage", "twitter_garbage",
+        "bitchute_garbage", "odysee_garbage", "rumble_garbage", "gettr_garbage", "mail_garbage",
+        "non_url_garbage", "yt_watch_garbage", "fb_watch_garbage", "vk_garbage",
+    )
+
+    """ most redirects unshorten() follows from a shortened URL """
+    max_redirects = 10
+
+    def __init__(
+        self, raw_links, http=None, cache=None, platforms=None, error_sink=None, journal=None, stats=None, lookup_cache=None,
+        _parent=None
+    ):
         self.raw_links = raw_links
 
+        if stats is True:
+            stats = run_stats()
+        self.stats = stats or None
+        lap = self._stopwatch("init")
+
         """ known_shorteners contains a list of url shorteners that will
         be used to extract shortened URLs from raw_links. """
-        self.known_shorteners = urlexpander.constants.all_short_domains.copy()
-        self.known_shorteners += ["youtu.be", "shorturl.me"]
+        if _parent is not None:
+            # a batch of add() classifies links with the object it is merged into
+            self.known_shorteners = _parent.known_shorteners
+            self.shortener_index = _parent.shortener_index
+        else:
+            self.known_shorteners = default_shorteners()
+            self.known_shorteners += ["youtu.be", "shorturl.me"]
+            self.shortener_index = shortener_index(self.known_shorteners)
+        lap("shorteners")
+
+        self.platform_rules = platforms if platforms is not None else default_registry()
+        self.vk_rules = _parent.vk_rules if _parent is not None else default_vk_registry()
+
+        # classify each distinct link once; unshorten() reuses the result instead of testing links again
+        self._short_links = self.shortener_index.short_links(self.raw_links)
 
         # produce a list containing only shortened URLs
-        self.shortened_urls_list = [
-            link for link in self.raw_links
-            if urlexpander.is_short(link, list_of_domains=self.known_shorteners)
-        ]
+        self.shortened_urls_list = [link for link in self.raw_links if link in self._short_links]
         self.shortened_urls_garbage = []
+        lap("classify")
+        self.redirect_chains = {}
 
-        # these two pandas dataframes will store error messages in a searchable format for formatter's two methods
-        self.unshorten_errors_df = pd.DataFrame({"url": [], "error_message": [], "platform": []})
-        self.clean_errors_df = pd.DataFrame({"url": [], "error_message": [], "platform": []})
+        if isinstance(error_sink, str):
+            error_sink = errors.error_sink(error_sink)
+        self.error_sink = error_sink
+
+        # these two logs store error messages for formatter's two methods; they are exposed as
+        # searchable pandas dataframes through unshorten_errors_df and clean_errors_df
+        self.unshorten_errors = errors.error_log(self.error_sink)
+        self.clean_errors = errors.error_log(self.error_sink)
 
         self.headers = {
             "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)\
         AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.5615.121 Safari/537.36"
         }
 
+        # one pooled session for the whole run, so connections to the same host are recycled
+        self._http = http
+
+        if isinstance(cache, str):
+            cache = resolution_cache(cache)
+        self.cache = cache
+
+        if isinstance(journal, str):
+            journal = run_journal(journal, resume=True)
+        self.journal = journal
+
+        if not isinstance(lookup_cache, content_cache):
+            lookup_cache = content_cache(store=lookup_cache)
+        self.lookup_cache = lookup_cache
+
         self.unshorten_executed = False
         self.clean_executed = False
+        self.link_counts = None
+        self.shard_pool = None
+
+    @property
+    def http(self):
+        if self._http is None:
+            self._http = fetcher(headers=self.headers)
+        return self._http
+
+    @http.setter
+    def http(self, http):
+        self._http = http
+
+    def _cache_counts(self):
+        if self.cache is None:
+            return None
+        return self.cache.hits, self.cache.misses
+
+    def _report_cache(self, counts_before, verbose=True):
+        if self.cache is None:
+            return
+        self.cache.flush()
+        hits = self.cache.hits - counts_before[0]
+        misses = self.cache.misses - counts_before[1]
+        if verbose:
+            print(f"\n{hits} lookups were answered from the resolution cache and {misses} required a network request.")
+
+    def _run_steps(self, steps, workers=1, per_host_limit=None):
+        """
+        Runs one of the _steps generators that hold the work of unshorten() and clean(). The
+        generator does the offline work itself and yields each batch of network jobs, (url, key,
+        function) tuples, which are run here through a scheduler; the dict of their results is
+        sent back. An error raised by the scheduler is thrown into the generator, as if raised
+        where the batch was yielded. Returns what the generator returns.
+        """
+        running, value = advance(steps)
+        while running:
+            try:
+                results = scheduler(self.http, workers=workers, per_host_limit=per_host_limit).run(value)
+            except BaseException as error:
+                advance(steps, throw=error)
+                raise
+            running, value = advance(steps, results)
+        return value
+
+    async def _arun_steps(self, steps, concurrency=10, per_host_limit=None):
+        """ asyncio counterpart of _run_steps(): network jobs are awaited through an async_scheduler and the offline steps run in an executor """
+        loop = asyncio.get_running_loop()
+        running, value = await loop.run_in_executor(None, advance, steps)
+        while running:
+            try:
+                results = await async_scheduler(self.http, workers=concurrency, per_host_limit=per_host_limit).run(value)
+            except BaseException as error:
+                advance(steps, throw=error)
+                raise
+            running, value = await loop.run_in_executor(None, advance, steps, results)
+        return value
+
+    def _recall(self, namespace, url):
+        """ returns (ok, value) recorded for url by self.journal or self.cache, or None if neither has it """
+        if self.journal is not None:
+            recorded = self.journal.get(namespace, url)
+            if recorded is not None:
+                return recorded
+        if self.cache is not None:
+            return self.cache.get(namespace, url)
+        return None
+
+    def _remember(self, namespace, url, value=None, error=None):
+        """ records a network outcome in self.journal and self.cache; a value of None records a failure """
+        for store in (self.journal, self.cache):
+            if store is None:
+                continue
+            if value is not None:
+                store.set(namespace, url, value)
+            else:
+                store.set_failure(namespace, url, error)
+
+    def _stopwatch(self, prefix):
+        """ returns the lap() function of a self.stats stopwatch, or one that does nothing """
+        return self.stats.stopwatch(prefix) if self.stats is not None else no_lap
+
+    def _timed(self, platform, url, function, *args, **kwargs):
+        """ calls function(*args, **kwargs), recording its latency, bytes received and whether it raised in self.stats """
+        if self.stats is None:
+            return function(*args, **kwargs)
+        recording = getattr(self.http, "recording", None)
+        with recording() if recording is not None else contextlib.nullcontext([]) as responses:
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except host_throttled:
+                raise
+            except Exception:
+                self.stats.request(platform, url, time.perf_counter() - start, received_bytes(responses), True)
+                raise
+            self.stats.request(platform, url, time.perf_counter() - start, received_bytes(responses))
+        return result
+
+    def _flush_journal(self):
+        if self.journal is not None:
+            self.journal.flush()
+
+    def _resolve(self, platform, link, lookup, garbage):
+        """
+        Resolves a social media link to its account URL with lookup(link), checking self.journal
+        and self.cache first. The account URL is added to self.sm_urls_list. If lookup finds nothing or raises an
+        error, link is added to garbage and the error is recorded in self.clean_errors.
+        
+        Outcomes are remembered in self._resolved for the rest of the run, so a link that appears
+        many times, or links to the same content (see content.content_key()), are only looked up
+        once. Repeats still add one entry (and one error row) each.
+        """
+        key = (platform, content_key(platform, link))
+        if key not in self._resolved:
+            self._resolved[key] = self._resolve_outcome(platform, link, lookup)
+        resolved, error = self._resolved[key]
+
+        if resolved is not None:
+            self.sm_urls_list.append(resolved)
+        else:
+            if error is not None:
+                self.clean_errors.append(link, error, platform)
+            garbage.append(link)
+
+    def _resolve_outcome(self, platform, link, lookup):
+        """ returns (resolved, error) for link from self.lookup_cache, self.journal or self.cache or, failing that, from lookup(link) """
+        recorded = self._recall_lookup(platform, link)
+        if recorded is not None:
+            ok, value = recorded
+            return (value, None) if ok else (None, value)
+
+        key = content_key(platform, link)
+        try:
+            resolved = self._timed(platform, link, lookup, link)
+        except host_throttled:
+            # the scheduler retries the lookup once the host has cooled down
+            raise
+        except Exception as error:
+            self._remember(platform, link, error=error)
+            self.lookup_cache.set_failure(platform, key, error)
+            return None, error
+
+        self._remember(platform, link, resolved)
+        if resolved is not None:
+            self.lookup_cache.set(platform, key, resolved)
+        else:
+            self.lookup_cache.set_failure(platform, key)
+        return resolved, None
+
+    def _recall_lookup(self, platform, link):
+        """
+        returns (ok, value) recorded for a page lookup by self.lookup_cache under the content key of
+        link, or by self.journal or self.cache under link itself; None if none of them has it
+        """
+        key = content_key(platform, link)
+        recorded = self.lookup_cache.get(platform, key)
+        if recorded is None:
+            recorded = self._recall(platform, link)
+            if recorded is not None:
+                # kept in memory only: writing it to the store would restart its TTL
+                ok, value = recorded
+                if ok:
+                    self.lookup_cache.set(platform, key, value, persist=False)
+                else:
+                    self.lookup_cache.set_failure(platform, key, value, persist=False)
+        return recorded
+
+    """ the _lookup methods below fetch a platform page and extract the poster's account URL
+    from it. They return None if the page does not contain it. """
+
+    def _lookup_youtube_channel(self, link):
+        page_content = self.http.get("https://" + link).content
+        if (len(re.findall('(?<="webCommandMetadata":{"url":"/).*(?=/featured)', str(page_content)))!= 0):
+            link = re.findall('(?<="webCommandMetadata":{"url":"/).*(?=/featured)', str(page_content))
+            return "youtube.com/" + link[0]
+        return None
+
+    def _lookup_odysee(self, link):
+        page_content = self.http.get("https://" + link).content
+        if (len(re.findall('(?<="og:url" content="https://)[\.@-_/a-zA-Z0-9]+', str(page_content)))!= 0):
+            return re.findall('(?<="og:url" content="https://)[\.@-_/a-zA-Z0-9]+', str(page_content))[0]
+        return None
+
+    def _lookup_bitchute(self, link):
+        page_content = self.http.get("https://" + link).content
+        link = re.findall('(?<=channel/)[-_a-zA-Z0-9]+(?=/")', str(page_content))
+        return "bitchute.com/" + str(link[0])
+
+    """ the lookups that read one element stream the page with stream_find() and stop downloading
+    once it has been read. If the page ends without it, the page is parsed in full with
+    BeautifulSoup, so that missing elements fail exactly as they always have. """
+
+    def _lookup_rumble(self, link):
+        response = self.http.get("https://" + link, stream=True)
+        media_by, page_content = stream_find(response, "a", attrs={"class": "media-by--a"})
+        if media_by is None:
+            media_by = parse_html(page_content).find("a", class_="media-by--a")
+        if media_by.get("href") != "":
+            user_channel = media_by.get("href")
+            return "rumble.com" + user_channel
+        return None
+
+    def _lookup_gettr(self, link):
+        response = self.http.get("https://" + link, stream=True)
+        title, page_content = stream_find(response, "title", text=True)
+        if title is None:
+            title = parse_html(page_content).title
+        if (len(re.findall(".*(?= on GETTR)", title.get_text()))!= 0):
+            user = re.findall(".*(?= on GETTR)", title.get_text())[0]
+            return "gettr.com/user/" + user
+        return None
+
+    def _lookup_tiktok(self, link):
+        link = self.http.head("https://" + link, allow_redirects=True).url
+        link = re.sub("https://www\.", "", link)
+        link = re.sub("/video.*", "", link)
+        if link != "tiktok.com/":
+            return link
+        return None
+
+    def _lookup_youtube_watch(self, link):
+        response = self.http.get("https://" + link, stream=True)
+        author_link, page_content = stream_find(
+            response, "link", attrs={"href": re.compile("https?://")}, within=("span", {"itemprop": "author"})
+        )
+        if author_link is None:
+            soup = parse_html(page_content)
+            content = soup.find("span", attrs={"itemprop": "author"})
+            author_link = content.find("link", attrs={"href": re.compile("https?://")})
+        if author_link != "":
+            return re.sub("https?://(www\.)?", "", author_link.get("href"))
+        return None
+
+    def _lookup_fb_watch(self, link):
+        response = self.http.get("https://" + link, stream=True)
+        content, page_content = stream_find(response, "link", attrs={"hreflang": "x-default"})
+        if content is None:
+            content = parse_html(page_content).find("link", attrs={"hreflang": "x-default"})
+        if content.get("href") != "":
+            link = content.get("href")
+            link = re.sub("https?://(www\.)?", "", link)
+            return re.sub("/videos.*", "", link)
+        return None
+
+    def _lookup_vk_video(self, link):
+        response = self.http.get("https://" + link, stream=True)
+        # the fourth link of the page
+        fourth_link, page_content = stream_find(response, "a", index=3)
+        if fourth_link is None:
+            fourth_link = parse_html(page_content).find_all("a")[3]
+        if str(fourth_link.get("href")) != "":
+            return "vk.com" + str(fourth_link.get("href"))
+        return None
+
+    def _lookup_vk_wall(self, link):
+        response = self.http.get("https://" + link, stream=True)
+        first_link, page_content = stream_find(response, "a")
+        if first_link is None:
+            first_link = parse_html(page_content).find("a")
+        return "vk.com" + first_link.get("href")
+
+    def _lookup_vk_canonical(self, link):
+        response = self.http.get("https://" + link, stream=True)
+        soup_find, page_content = stream_find(response, "link", attrs={"rel": "canonical"})
+        if soup_find is None:
+            soup_find = parse_html(page_content).find("link", attrs={"rel": "canonical"})
+        if re.findall("vk\.com/[-_a-zA-Z0-9]+", str(soup_find))[0] != "":
+            return re.findall("vk\.com/[-_a-zA-Z0-9]+", str(soup_find))[0]
+        return None
 
-    def unshorten(self):
+    def _prefetch(self, jobs):
+        """
+        Resolves (platform, link, lookup) jobs ahead of the _resolve() calls that will use them.
+        Lookups that need a request are yielded as one batch of network jobs (see _run_steps()),
+        so that requests to different hosts are interleaved and throttled hosts are retried later
+        instead of stalling the rest. Outcomes go to self._resolved.
+        """
+        network_jobs = []
+        for platform, link, lookup in jobs:
+            key = (platform, content_key(platform, link))
+            if key in self._resolved:
+                continue
+            recorded = self._recall_lookup(platform, link)
+            if recorded is not None:
+                ok, value = recorded
+                self._resolved[key] = (value, None) if ok else (None, value)
+            else:
+                # placeholder so that repeated jobs are only scheduled once
+                self._resolved[key] = None
+                network_jobs.append(("https://" + link, key, functools.partial(self._resolve_outcome, platform, link, lookup)))
+        if not network_jobs:
+            return
+        try:
+            self._resolved.update((yield network_jobs))
+        finally:
+            for key in [key for key, outcome in self._resolved.items() if outcome is None]:
+                del self._resolved[key]
+            # lookups finished before an interruption are on disk for a resumed run
+            self._flush_journal()
+
+    def _route_sm_link(self, link):
+        """
+        Decides where a social media link from self.sm_with_expansion goes, using the rules in
+        self.platform_rules. Returns a tuple (destination, value): the name of the list that value
+        is appended to, or ("resolve", (platform, lookup, garbage)) for links whose account must
+        be looked up with _resolve().
+        """
+        return self._bind_lookup(*self.platform_rules.route(link))
+
+    def _route_vk_link(self, link):
+        """ same as _route_sm_link(), for the links collected in self.vk_list """
+        return self._bind_lookup(*self.vk_rules.route(link))
+
+    def _bind_lookup(self, destination, value):
+        if destination != "resolve":
+            return destination, value
+        platform, lookup, garbage = value
+        if isinstance(lookup, str):
+            lookup = getattr(self, lookup)
+        else:
+            lookup = functools.partial(lookup, self)
+        return destination, (platform, lookup, garbage)
+
+    def unshorten(self, workers=1, per_host_limit=None, timeout=None, verbose=True):
         """
         Unshortens shortened URLs contained in self.shortened_urls_list. After completion unshorten() returns
         self.raw_with_expansion, a list combining unshortened URLs with URLs that weren'toriginally shortened.
         
         If not exectuted prior to running clean(), clean() will discard shortened URLs.
         
+        Parameters
+        ----------
+        workers: number of threads used to resolve shortened URLs concurrently. The default of 1
+        resolves them one at a time.
+        
+        per_host_limit: maximum number of requests in flight at once against a single shortener
+        host (e.g. bit.ly). None means no per-host cap beyond workers. Request rates per host are
+        set on self.http (see fetch.fetcher and ratelimit.rate_limiter).
+        
+        timeout: seconds to wait for each shortener to respond. None uses the default timeout of self.http.
+        
+        verbose: if False the success metric is not printed
+        
         Returns
         -------
         self.raw_with_expansion: list containing unshortened URLs + URLs not originally shortened
         
         Workflow
         -------- 
-        --> unshorten URLs using requests
+        --> unshorten URLs through a scheduler that interleaves shortener hosts, concurrently if
+            workers > 1. Redirects are followed one HEAD request at a time, and only until they
+            lead out of the known shorteners or to a social media link (see self.redirect_chains)
+        --> collect results in the order of self.shortened_urls_list
         --> extract non-social media URLs from self.raw_links into self.not_shortened_links
         --> produce self.raw_with_expansion
         --> set self.unshorten_executed' to True
         --> print success metric
         --> return self.raw_with_expansion
         """
+        return self._run_steps(self._unshorten_steps(timeout, verbose), workers, per_host_limit)
+
+    async def aunshorten(self, concurrency=10, per_host_limit=None, timeout=None, verbose=True):
+        """
+        asyncio counterpart of unshorten(), with the same results. Requests are made by up to
+        concurrency threads and awaited, so the event loop is not blocked while they run; the
+        rest of the work is also run off the loop.
         
-        self.not_shortened_links = []
+        timeout is the timeout of each request. To bound the whole call, wrap it in
+        asyncio.wait_for(); when cancelled, no further requests are started and the requests in
+        flight are left to finish in the background, with their results discarded. Shortened URLs
+        resolved before the cancellation are kept in self.journal and self.cache, if any.
+        """
+        return await self._arun_steps(self._unshorten_steps(timeout, verbose), concurrency, per_host_limit)
+
+    def _unshorten_steps(self, timeout=None, verbose=True, memo=None):
+        """
+        body of unshorten() and aunshorten(): a generator that yields its network jobs (see
+        _run_steps()). memo is an optional dict of outcomes of earlier runs (see add()).
+        """
+        self._expand("unshorten")
         self.expanded_urls_list = []
         self.shortened_urls_garbage = []
 
-        self.unshorten_errors_df = pd.DataFrame({"url": [], "error_message": [], "platform": []})
+        self.unshorten_errors = errors.error_log(self.error_sink)
+        cache_counts = self._cache_counts()
+        lap = self._stopwatch("unshorten")
+
+        def full_url(url):
+            return url if re.match("https?://", url) else "https://" + url
+
+        def recorded_url(url):
+            """ returns (url, unshortened_url, error) from self.journal or self.cache, or None if neither has the URL """
+            url = full_url(url)
+            recorded = self._recall("unshorten", url)
+            if recorded is None:
+                return None
+            ok, value = recorded
+            return (url, value, None) if ok else (url, None, value)
+
+        self.platform_rules.compile()
+        sm_filter = self.platform_rules.filter
+
+        def is_destination(url):
+            """ True once a redirect has left the known shorteners, or reached a social media link clean() resolves itself """
+            return not self.shortener_index.is_short(url) or sm_filter.match(strip_scheme(url)) is not None
 
         def unshorten_url(url):
-            if not re.match("https?://", url):
-                url = "https://" + url
-            session = requests.Session()  # so connections are recycled
+            """ returns (url, unshortened_url, error); unshortened_url is None if the URL could not be resolved """
+            url = full_url(url)
+            kwargs = {}
+            if timeout is not None:
+                kwargs["timeout"] = timeout
+            hops = [url]
+
+            def follow():
+                # redirects are followed one at a time, and only until they leave the shorteners:
+                # the landing page, and any tracking or consent hops in front of it, is never requested
+                for target in self.http.redirects(url, self.max_redirects, **kwargs):
+                    hops.append(target)
+                    if is_destination(target):
+                        return
+
             try:
-                resp = session.head(url, allow_redirects=True)
-                unshortened_url = re.sub("https?://(www\.)?", "", resp.url)
-                self.expanded_urls_list.append(unshortened_url)
+                self._timed("unshorten", url, follow)
+            except host_throttled:
+                raise
             except Exception as error:
-                # if there is an error attempt to extract unshortened URL from error message
-                if len(re.findall("(?<=host=').*(?=', port)", str(error))) != 0:
-                    unshortened_url = re.findall("(?<=host=').*(?=', port)", str(error))
-                    unshortened_url = re.sub("https?://(www\.)?", "", unshortened_url[0])
-                    self.expanded_urls_list.append(unshortened_url)
-                else:
-                    #if this is unsuccessful discard shortened URL
-                    self.shortened_urls_garbage.append(url)
-                    self.unshorten_errors_df.loc[len(self.unshorten_errors_df.index)] = [url, error, "shortened_url"]
+                # a hop failing part way leaves a shortener URL, not a destination, so the URL is
+                # unresolved, and is journaled and cached as a failure to be retried
+                if len(hops) > 1:
+                    self.redirect_chains[url] = hops
+                self._remember("unshorten", url, error=error)
+                return url, None, error
+            self.redirect_chains[url] = hops
+            unshortened_url = re.sub("https?://(www\.)?", "", hops[-1])
+            self._remember("unshorten", url, unshortened_url)
+            return url, unshortened_url, None
+
+        # each distinct shortened URL is requested once, then results are expanded back to every occurrence.
+        # spellings of the same URL (scheme, "www.", case of the host) share the request of the first one
+        # the scheduler interleaves shortener hosts and paces each one with self.http's limits
+        # the outcomes are kept in self._unshortened, so that add() does not request them again
+        results = self._unshortened = memo if memo is not None else {}
+        jobs = []
+        requested = {}
+        aliases = {}
+        for url in dict.fromkeys(self.shortened_urls_list):
+            if url in results:
+                continue
+            recorded = recorded_url(url)
+            if recorded is not None:
+                results[url] = recorded
+                continue
+            key = normalize_url(full_url(url))
+            if key in requested:
+                aliases[url] = requested[key]
+            else:
+                requested[key] = url
+                jobs.append((full_url(url), url, functools.partial(unshorten_url, url)))
+        lap("recall")
+        if jobs:
+            try:
+                results.update((yield jobs))
+            finally:
+                self._flush_journal()
+        for url, first in aliases.items():
+            results[url] = (full_url(url),) + results[first][1:]
+        lap("requests")
 
-        for url in self.shortened_urls_list:
-            unshorten_url(url)
+        for url, unshortened_url, error in (results[url] for url in self.shortened_urls_list):
+            if unshortened_url is not None:
+                self.expanded_urls_list.append(unshortened_url)
+            else:
+                #if this is unsuccessful discard shortened URL
+                self.shortened_urls_garbage.append(url)
+                self.unshorten_errors.append(url, error, "shortened_url")
 
         # substract shortened URLs from raw_links to produce not_shortened_links
-        for link in self.raw_links:
-            if not urlexpander.is_short(link, list_of_domains=self.known_shorteners):
-                self.not_shortened_links.append(link)
+        self.not_shortened_links = [link for link in self.raw_links if link not in self._short_links]
 
         # combine not_shortened_links with expanded_urls_list
         self.raw_with_expansion = self.not_shortened_links + self.expanded_urls_list
-        self.raw_with_expansion = [re.sub("https?://(www\.)?", "", i) for i in self.raw_with_expansion]
+        distinct = list(dict.fromkeys(self.raw_with_expansion))
+        schemeless = dict(zip(distinct, bulk_strip_scheme(distinct)))
+        self.raw_with_expansion = [schemeless[i] for i in self.raw_with_expansion]
 
         self.unshorten_executed = True
-        print(
-            f"\n{len(self.shortened_urls_list)} shortened URLs were detected, of which \
+        lap("expand")
+        if verbose:
+            print(
+                f"\n{len(self.shortened_urls_list)} shortened URLs were detected, of which \
 {len(self.expanded_urls_list)} were successfully unshortened."
-        )
-
-        self.joined_errors_df = self.unshorten_errors_df._append(self.clean_errors_df, ignore_index=True)
+            )
+        self._report_cache(cache_counts, verbose)
+        if self.error_sink is not None:
+            self.error_sink.flush()
+        lap("report")
 
         return self.raw_with_expansion
 
-    def clean(self):
+    def clean(self, verbose=True, processes=1, workers=1, counts=False):
         """
         Reformat URLs into an analytically useful format. For non-social media URLs, this involves
         extracting domain names; for social media URLs, this includes converting a link to a specific
@@ -129,12 +702,31 @@ class formatter:
         Additionally, it will collate any errors and discarded URLs and print metrics to the screen
         after completion.
         
-        **Please note that the REGEX on line 185 will filter out non-links typical of URL scrapes from 
+        **Please note that the REGEX telegram_noise_re in shard.py will filter out non-links typical of URL scrapes from 
         Telegram chats. Modify as needed***
         
+        Parameters
+        ----------
+        verbose: if False the metrics are not printed
+        
+        processes: number of processes used for the offline string work (filtering, platform
+        routing, domain extraction and normalization). With processes > 1 the distinct links are
+        sharded across a process pool and their routes merged before the lists are built, in input
+        order, by this process; page lookups and error collection stay in this process. The
+        results are identical to a single-process run. On platforms that start workers with spawn,
+        call clean() from under an if __name__ == "__main__": guard.
+        
+        workers: number of threads used for the page lookups of social media links. Lookups are
+        run through a scheduler that interleaves platforms and paces each one with self.http's
+        limits, so a throttling platform is retried later rather than stalling the others.
+        
+        counts: if True, only the number of lines each cleaned URL comes from is kept, in
+        self.link_counts, and formatted_links is left as None. The list and its sort are skipped,
+        which saves memory and time on large runs whose output is aggregated anyway.
+        
         Returns
         --------
-        self.formatted_links: list containing cleaned URLs
+        self.formatted_links: list containing cleaned URLs, or self.link_counts if counts is True
         
         Workflow
         --------
@@ -146,13 +738,28 @@ class formatter:
         --> produce error and discard metrics
         --> return list of cleaned URLs.
         """
-        
-        self.clean_errors_df = pd.DataFrame({"url": [], "error_message": [], "platform": []})
+        return self._run_steps(self._clean_steps(verbose, processes, counts=counts), workers)
+
+    async def aclean(self, verbose=True, processes=1, concurrency=10, counts=False):
+        """
+        asyncio counterpart of clean(), with the same results. Page lookups are made by up to
+        concurrency threads and awaited, and the offline work runs off the event loop. Cancelling
+        behaves as in aunshorten().
+        """
+        return await self._arun_steps(self._clean_steps(verbose, processes, counts=counts), concurrency)
+
+    def _clean_steps(self, verbose=True, processes=1, memo=None, counts=False):
+        """ body of clean() and aclean(), a generator like _unshorten_steps(); memo is an optional self._resolved of an earlier run """
+        self._expand("clean")
+        self.clean_errors = errors.error_log(self.error_sink)
+        cache_counts = self._cache_counts()
+        lap = self._stopwatch("clean")
+        self._resolved = memo if memo is not None else {}
 
         if self.unshorten_executed is False:
-            self.raw_with_expansion = self.raw_links.copy()
-            self.raw_with_expansion = [i for i in self.raw_with_expansion if i not in self.shortened_urls_list]
-            self.raw_with_expansion = [re.sub("https?://(www\.)?", "", i) for i in self.raw_with_expansion]
+            links = [i for i in self.raw_links if i not in self._short_links]
+        else:
+            links = self.raw_with_expansion
 
         # categorize and format social media links
         self.sm_urls_list = []
@@ -174,157 +781,85 @@ class formatter:
         self.mail_garbage = []
         self.non_url_garbage = []
 
-        self.sm_platforms_re = "^(m\.|mobile\.)?(odysee|vk\.|instagram|twitter|facebook|fb\.watch|\
-youtube\.com|t\.me|tiktok\.|vm\.tiktok|bitchute|gettr\.com|reddit\.|rumble\.com|gab\.com|4chan\.org).*"
-        self.sm_filter = re.compile(self.sm_platforms_re)
-        self.sm_with_expansion = [i for i in self.raw_with_expansion if self.sm_filter.match(i)]
-
-        for link in self.raw_with_expansion:
-            if re.match("(css|photos|messages|#go_to_message|\)\[\^)", link): # this REGEX discards non-URLs typical of Telegram URL scrapes
-                self.non_url_garbage.append(link)
-            elif re.match("mailto", link):
-                self.mail_garbage.append(link)
-            elif link in self.sm_with_expansion:
-                continue
-            else:
-                self.non_sm_urls_list.append(re.sub("/.*", "", link))
+        # garbage bins declared by rules added to self.platform_rules / self.vk_rules
+        self.extra_garbage_bins = [
+            b for b in self.platform_rules.garbage_bins() + self.vk_rules.garbage_bins()
+            if b not in self.builtin_garbage_bins
+        ]
+        for garbage_bin in self.extra_garbage_bins:
+            setattr(self, garbage_bin, [])
+
+        self.platform_rules.compile()
+        self.vk_rules.compile()
+        self.sm_platforms_re = self.platform_rules.pattern
+        self.sm_filter = self.platform_rules.filter
+        self.sm_with_expansion = []
+
+        # with processes > 1 the routing tables are filled up front by a process pool, otherwise
+        # they are filled as links are met below
+        if processes > 1:
+            tables = route_parallel(
+                links, self.platform_rules, processes, strip_schemes=not self.unshorten_executed, pool=self.shard_pool
+            )
+        else:
+            tables = shard_routes()
+
+        # the distinct links missing from the tables are stripped, routed and normalized a column at a time (see shard.bulk_*)
+        routes = tables.routes
+        if self.unshorten_executed is False:
+            schemeless = tables.schemeless
+            missing = [link for link in dict.fromkeys(links) if link not in schemeless]
+            stripped = bulk_strip_scheme(missing)
+            schemeless.update(zip(missing, stripped))
+            routes.update(zip(stripped, bulk_route_raw_link(stripped, self.sm_filter)))
+            self.raw_with_expansion = [schemeless[i] for i in links]
+        else:
+            missing = [link for link in dict.fromkeys(self.raw_with_expansion) if link not in routes]
+            routes.update(zip(missing, bulk_route_raw_link(missing, self.sm_filter)))
+
+        appends = {
+            destination: getattr(self, destination).append
+            for destination in ("non_url_garbage", "mail_garbage", "sm_with_expansion", "non_sm_urls_list")
+        }
+        for destination, value in map(routes.__getitem__, self.raw_with_expansion):
+            appends[destination](value)
+        lap("route")
+
+        stripped = tables.stripped
+        for link in set(self.sm_with_expansion):
+            if link not in stripped:
+                stripped[link] = strip_sm_link(link)
+        self.sm_with_expansion = [stripped[i] for i in self.sm_with_expansion if stripped[i] is not None]
+        # each distinct link is routed once; repeats reuse the routing and the memoized _resolve() outcome
+        routes = tables.sm_routes
+        vk_routes = {}
+        lookups = []
+        for link in dict.fromkeys(self.sm_with_expansion):
+            if link not in routes:
+                routes[link] = self._route_sm_link(link)
+            destination, value = routes[link]
+            if destination == "resolve":
+                lookups.append((value[0], link, value[1]))
+            elif destination == "youtube_watch_list":
+                lookups.append(("youtube_watch", value, self._lookup_youtube_watch))
+            elif destination == "fb_watch_list":
+                lookups.append(("fb_watch", value, self._lookup_fb_watch))
+            elif destination == "vk_list" and value not in vk_routes:
+                vk_routes[value] = self._route_vk_link(value)
+                if vk_routes[value][0] == "resolve":
+                    lookups.append((vk_routes[value][1][0], value, vk_routes[value][1][1]))
+        lap("sm_route")
+        # every page lookup is made here, before the lists below are filled in order
+        yield from self._prefetch(lookups)
+        lap("lookups")
 
-        self.sm_with_expansion = [re.sub("^(m\.|mobile\.)", "", i) for i in self.sm_with_expansion
-                                  if not re.match("m\.tiktok\.com", i)]
         for link in self.sm_with_expansion:
-            if re.match("(instagram\.com/p/|instagram\.com/tv)", link): # these are discarded because usernames cannot be extracted from them
-                self.ig_garbage.append(link)
-            elif re.search(
-                "(twitter\.com/.*/status|facebook\.com/.*/posts|reddit\.com/r/.*/comments)", link):
-                link = re.sub("(/status.*|/posts.*|/comments.*)", "", link)
-                self.sm_urls_list.append(link)
-            elif re.match("twitter\.com/hashtag", link):
-                self.twitter_garbage.append(link)
-            elif re.search("facebook\.com/.*/videos", link):
-                link = re.sub("/videos.*", "", link)
-                self.sm_urls_list.append(link)
-            elif re.match("(facebook\.com/watch|fb\.watch)", link):
-                self.fb_watch_list.append(link) # place in a special list for later processing
-            elif re.match("facebook\.com/story", link):
-                self.facebook_garbage.append(link)
-            elif re.match("t\.me/", link):
-                link = re.findall("t\.me/[-+_a-zA-Z0-9]*", link)
-                self.sm_urls_list.append(link[0])
-            elif re.search("youtube\.com/c/", link):
-                link = re.sub("/c/", "/@", link)
-                self.sm_urls_list.append(link)
-            elif re.search("youtube\.com/channel", link):
-                try:
-                    page_content = requests.get("https://" + link, headers=self.headers).content
-                    if (len(re.findall('(?<="webCommandMetadata":{"url":"/).*(?=/featured)', str(page_content)))!= 0):
-                        link = re.findall('(?<="webCommandMetadata":{"url":"/).*(?=/featured)', str(page_content))
-                        link = "youtube.com/" + link[0]
-                        self.sm_urls_list.append(link)
-                    else:
-                        self.youtube_garbage.append(link)
-                except Exception as error:
-                    self.clean_errors_df.loc[len(self.clean_errors_df.index)] = [
-                        link,
-                        error,
-                        "youtube",
-                    ]
-                    self.youtube_garbage.append(link)
-            elif re.match("youtube\.com/results", link):
-                self.youtube_garbage.append(link)
-            elif re.match("(youtube\.com/watch|youtube\.com/live)", link):
-                self.youtube_watch_list.append(link) # place in a special list for later processing
-            elif re.match("odysee\.com/[^@]", link):
-                try:
-                    page_content = requests.get("https://" + link, headers=self.headers).content
-                    if (len(re.findall('(?<="og:url" content="https://)[\.@-_/a-zA-Z0-9]+', str(page_content)))!= 0):
-                        link = re.findall('(?<="og:url" content="https://)[\.@-_/a-zA-Z0-9]+', str(page_content))[0]
-                        self.sm_urls_list.append(link)
-                    else:
-                        self.odysee_garbage.append(link)
-                except Exception as error:
-                    link = re.sub("https://", "", link)
-                    self.clean_errors_df.loc[len(self.clean_errors_df.index)] = [
-                        link,
-                        error,
-                        "odysee",
-                    ]
-                    self.odysee_garbage.append(re.sub("https://", "", link))
-            elif re.match("odysee\.com/@", link):
-                link = re.sub(":.*", "", link)
-                self.sm_urls_list.append(link)
-            elif re.match("bitchute\.com", link):
-                try:
-                    page_content = requests.get("https://" + link, headers=self.headers).content
-                    link = re.findall('(?<=channel/)[-_a-zA-Z0-9]+(?=/")', str(page_content))
-                    link = "bitchute.com/" + str(link[0])
-                    self.sm_urls_list.append(link)
-                except Exception as error:
-                    self.clean_errors_df.loc[len(self.clean_errors_df.index)] = [
-                        link,
-                        error,
-                        "bitchute",
-                    ]
-                    self.bitchute_garbage.append(link)
-            elif re.match("vk\.com", link):
-                self.vk_list.append(link) # place in a special list for later processing
-            elif re.match("rumble\.com", link):
-                if re.match("(rumble\.com/user/|rumble\.com/c/)", link):
-                    self.sm_urls_list.append(link)
-                else:
-                    try:
-                        page_content = requests.get("https://" + link, headers=self.headers).content
-                        soup = BeautifulSoup(page_content, "html.parser")
-                        if soup.find("a", class_="media-by--a").get("href") != "":
-                            user_channel = soup.find("a", class_="media-by--a").get("href")
-                            link = "rumble.com" + user_channel
-                            self.sm_urls_list.append(link)
-                        else:
-                            self.rumble_garbage.append(link)
-                    except Exception as error:
-                        link = re.sub("https://", "", link)
-                        self.clean_errors_df.loc[len(self.clean_errors_df.index)] = [
-                            link,
-                            error,
-                            "rumble",
-                        ]
-                        self.rumble_garbage.append(link)
-            elif re.match("gettr\.com", link):
-                if re.match("gettr\.com/user/", link):
-                    self.sm_urls_list.append(link)
-                else:
-                    try:
-                        page_content = requests.get("https://" + link, headers=self.headers).content
-                        soup = BeautifulSoup(page_content, "html.parser")
-                        if (len(re.findall(".*(?= on GETTR)", soup.title.get_text()))!= 0):
-                            user = re.findall(".*(?= on GETTR)", soup.title.get_text())[0]
-                            link = "gettr.com/user/" + user
-                            self.sm_urls_list.append(link)
-                        else:
-                            self.gettr_garbage.append(link)
-                    except Exception as error:
-                        link = re.sub("https://", "", link)
-                        self.clean_errors_df.loc[len(self.clean_errors_df.index)] = [
-                            link,
-                            error,
-                            "gettr",
-                        ]
-                        self.gettr_garbage.append(link)
-            elif re.match("(vm\.tiktok|m\.tiktok|tiktok)", link):
-                if re.match("(vm\.|m\.)", link):
-                    link = requests.head("https://" + link, allow_redirects=True).url
-                    link = re.sub("https://www\.", "", link)
-                    link = re.sub("/video.*", "", link)
-                    if link != "tiktok.com/":
-                        self.sm_urls_list.append(link)
-                    else:
-                        self.tiktok_garbage.append(link)
-                elif link.startswith("tiktok.com/@"):
-                    link = re.sub("\?.*", "", link)
-                    self.sm_urls_list.append(link)
-                else:
-                    self.tiktok_garbage.append(link)
+            destination, value = routes[link]
+            if destination == "resolve":
+                platform, lookup, garbage = value
+                self._resolve(platform, link, lookup, getattr(self, garbage))
             else:
-                self.sm_other_urls_list.append(re.sub("/$", "", link))
+                getattr(self, destination).append(value)
 
         self.sm_other_urls_list = [re.sub("\?.*", "", i) for i in self.sm_other_urls_list]
         self.sm_urls_list = self.sm_urls_list + self.sm_other_urls_list
@@ -332,101 +867,44 @@ youtube\.com|t\.me|tiktok\.|vm\.tiktok|bitchute|gettr\.com|reddit\.|rumble\.com|
         # format yt_watch links
         self.yt_watch_garbage = []
         for link in self.youtube_watch_list:
-            try:
-                page = requests.get("https://" + link, headers=self.headers)
-                page_content = page.content
-                soup = BeautifulSoup(page_content, "html.parser")
-                content = soup.find("span", attrs={"itemprop": "author"})
-                if content.find("link", attrs={"href": re.compile("https?://")}) != "":
-                    link = content.find("link", attrs={"href": re.compile("https?://")})
-                    link = re.sub("https?://(www\.)?", "", link.get("href"))
-                    self.sm_urls_list.append(link)
-                else:
-                    self.yt_watch_garbage.append(link)
-            except Exception as error:
-                self.clean_errors_df.loc[len(self.clean_errors_df.index)] = [
-                    link,
-                    error,
-                    "youtube_watch",
-                ]
-                self.yt_watch_garbage.append(link)
+            self._resolve("youtube_watch", link, self._lookup_youtube_watch, self.yt_watch_garbage)
 
         # format fb_watch links
         self.fb_watch_garbage = []
         for link in self.fb_watch_list:
-            try:
-                page = requests.get("https://" + link, headers=self.headers)
-                page_content = page.content
-                soup = BeautifulSoup(page_content, "html.parser")
-                content = soup.find("link", attrs={"hreflang": "x-default"})
-                if content.get("href") != "":
-                    link = content.get("href")
-                    link = re.sub("https?://(www\.)?", "", link)
-                    link = re.sub("/videos.*", "", link)
-                    self.sm_urls_list.append(link)
-                else:
-                    self.fb_watch_garbage.append(re.sub("https://", "", link))
-            except Exception as error:
-                link = re.sub("https://", "", link)
-                self.clean_errors_df.loc[len(self.clean_errors_df.index)] = [
-                    link,
-                    error,
-                    "fb_watch",
-                ]
-                self.fb_watch_garbage.append(link)
+            self._resolve("fb_watch", link, self._lookup_fb_watch, self.fb_watch_garbage)
 
         # format vk links
         self.vk_garbage = []
+        routes = vk_routes
         for link in self.vk_list:
-            try:
-                if re.search("vk\.com/video/@", link):
-                    link = re.sub("/video/@", "/", link)
-                    link = re.sub("\?.*", "", link)
-                    self.sm_urls_list.append(link)
-                elif re.search("vk\.com/video", link):
-                    page_content = requests.get("https://" + link).content
-                    soup = BeautifulSoup(page_content, "html.parser")
-                    href_list = soup.find_all("a")
-                    if str(href_list[3].get("href")) != "":
-                        link = "vk.com" + str(href_list[3].get("href"))
-                        self.sm_urls_list.append(link)
-                    else:
-                        self.vk_garbage.append(link)
-                elif re.search("vk\.com/wall", link):
-                    page_content = requests.get("https://" + link).content
-                    soup = BeautifulSoup(page_content, "html.parser")
-                    soup_find = soup.find("a").get("href")
-                    link = "vk.com" + soup_find
-                    self.sm_urls_list.append(link)
-                elif re.search("vk\.com/.*\?\w(=photo|=wall)", link):
-                    link = re.sub("\?.*", "", link)
-                    self.sm_urls_list.append(link)
-                elif re.search("vk\.com/\w+$", link):
-                    page_content = requests.get("https://" + link).content
-                    soup = BeautifulSoup(page_content, "html.parser")
-                    soup_find = soup.find("link", attrs={"rel": "canonical"})
-                    if re.findall("vk\.com/[-_a-zA-Z0-9]+", str(soup_find))[0] != "":
-                        link = re.findall("vk\.com/[-_a-zA-Z0-9]+", str(soup_find))[0]
-                        self.sm_urls_list.append(link)
-                    else:
-                        self.vk_garbage.append(link)
-                elif re.search("vk\.com/[\w\.]+$", link):
-                    sm_urls_list.append(link)
-                else:
-                    self.vk_garbage.append(link)
-            except Exception as error:
-                self.clean_errors_df.loc[len(self.clean_errors_df.index)] = [
-                    link,
-                    error,
-                    "vk",
-                ]
-                self.vk_garbage.append(link)
-
-        # compile and sort final links list
-        self.formatted_links = self.sm_urls_list + self.non_sm_urls_list
-        self.formatted_links = [i.lower() for i in self.formatted_links]
-        self.formatted_links = [re.sub("^www\.", "", i) for i in self.formatted_links]
-        self.formatted_links.sort()
+            if link not in routes:
+                routes[link] = self._route_vk_link(link)
+            destination, value = routes[link]
+            if destination == "resolve":
+                platform, lookup, garbage = value
+                self._resolve(platform, link, lookup, getattr(self, garbage))
+            else:
+                getattr(self, destination).append(value)
+
+        lap("assemble")
+
+        # compile and sort final links list, or only count them
+        formatted_links = itertools.chain(self.sm_urls_list, self.non_sm_urls_list)
+        normalized = tables.normalized
+        missing = [link for link in dict.fromkeys(formatted_links) if link not in normalized]
+        normalized.update(zip(missing, bulk_normalize_link(missing)))
+        formatted_links = itertools.chain(self.sm_urls_list, self.non_sm_urls_list)
+        if counts:
+            self.link_counts = link_counts(map(normalized.__getitem__, formatted_links))
+            self.formatted_links = None
+            formatted_total = self.link_counts.total
+        else:
+            self.link_counts = None
+            self.formatted_links = [normalized[i] for i in formatted_links]
+            self.formatted_links.sort()
+            formatted_total = len(self.formatted_links)
+        lap("normalize")
 
         # compile garbage and print garbage stats
         self.final_sm_garbage = (
@@ -443,6 +921,8 @@ youtube\.com|t\.me|tiktok\.|vm\.tiktok|bitchute|gettr\.com|reddit\.|rumble\.com|
             + self.twitter_garbage
             + self.tiktok_garbage
         )
+        for garbage_bin in self.extra_garbage_bins:
+            self.final_sm_garbage = self.final_sm_garbage + getattr(self, garbage_bin)
 
         """ final_overall_garbage will tell us how many lines were put in a garbage
         list while converting raw_links to formatted_links. We want this to equal final_difference. """
@@ -463,77 +943,315 @@ youtube\.com|t\.me|tiktok\.|vm\.tiktok|bitchute|gettr\.com|reddit\.|rumble\.com|
 
         """ final_difference will tell us how many lines were discarded in the process
         of converting raw_links to formatted_links """
-        self.final_difference = len(self.raw_links) - len(self.formatted_links)
+        self.final_difference = len(self.raw_links) - formatted_total
 
         """ garbage_less_difference will tell us how many of the lines that were discarded
         in the process of converting raw_links to  formatted_links are unaccounted for
         by final_overall_garbage. We want this to equal zero. """
         self.garbage_less_difference = (self.final_overall_garbage - self.final_difference)
 
-        self.garbage_df = pd.DataFrame(
-            {
-                "type": [
-                    "non_url_garbage",
-                    "facebook",
-                    "instagram",
-                    "youtube",
-                    "yt_watch",
-                    "fb_watch",
-                    "vkontakte",
-                    "bitchute",
-                    "odysee",
-                    "rumble",
-                    "gettr",
-                    "tiktok",
-                    "shortened_urls",
-                ],
-                "count": [
-                    len(self.non_url_garbage),
-                    len(self.facebook_garbage),
-                    len(self.ig_garbage),
-                    len(self.youtube_garbage),
-                    len(self.yt_watch_garbage),
-                    len(self.fb_watch_garbage),
-                    len(self.vk_garbage),
-                    len(self.bitchute_garbage),
-                    len(self.odysee_garbage),
-                    len(self.rumble_garbage),
-                    len(self.gettr_garbage),
-                    len(self.tiktok_garbage),
-                    len(self.shortened_urls_garbage),
-                ],
-            }
+        self.garbage_counts = [(garbage_type, len(garbage)) for garbage_type, garbage in self.garbage_lists()]
+        self._garbage_df = None
+        lap("garbage")
+
+        if verbose:
+            print(
+                f"\n\n{formatted_total} URLs in total were successfully cleaned."
+                + "\n\n"
+                + f"{self.garbage_less_difference} URLs were lost and are unaccounted for by final_overall_garbage."
+                + "\n\n"
+                + f"{len(self.final_sm_garbage)} URLs are included in final_sm_garbage, which is "
+                + f"{round((len(self.final_sm_garbage) / (formatted_total + len(self.final_sm_garbage)))*100, 2)}% of "
+                + f"formatted_links + final_sm_garbage."
+                + "\n\n"
+                + f"{self.final_difference} lines in total were discarded in the cleaning process, "
+                + f"of which {len(self.non_url_garbage)} were non-URLs."
+                + "\n\n"
+                + f"{len(self.clean_errors)} errors were produced in the cleaning process."
+            )
+
+            if self.unshorten_executed is False:
+                print(
+                    f"\n{len(self.shortened_urls_list)} shortened_urls were identified, which were \
+not unshortened owing to formatter.unshorten() not having been executed."
+                )
+
+        self._report_cache(cache_counts, verbose)
+
+        if verbose:
+            print("\nThe number of lines included in each garbage bin are:\n\n {0}\n".format(
+                    self.garbage_df.to_string(index=False)))
+
+        self.clean_executed = True
+        self.lookup_cache.flush()
+        if self.error_sink is not None:
+            self.error_sink.flush()
+        lap("report")
+
+        return self.link_counts if counts else self.formatted_links
+
+    """ lists built by clean() that add() extends with the lists of each new batch, besides the garbage bins """
+    clean_lists = (
+        "sm_urls_list", "non_sm_urls_list", "sm_other_urls_list", "fb_watch_list", "youtube_watch_list", "vk_list",
+        "sm_with_expansion", "final_sm_garbage",
+    )
+
+    def add(self, links, workers=1, per_host_limit=None, timeout=None, processes=1, verbose=False):
+        """
+        Adds new raw links to an object that has already been run, processing only those links
+        and merging the results into the existing ones.
+        
+        The new links go through whichever of unshorten() and clean() have been executed, with the
+        same settings as those methods' arguments. Shortened URLs and page lookups already
+        resolved by this object are not requested again. Afterwards every attribute is as it would
+        be after running the methods on all links, except that the lists other than
+        formatted_links (e.g. sm_urls_list, the garbage bins and the error logs) hold the results
+        of each batch one after the other.
+        
+        Parameters
+        ----------
+        links: list of new raw links
+        
+        workers, per_host_limit, timeout, processes: see unshorten() and clean()
+        
+        verbose: if True the metrics of the new links are printed
+        
+        Returns
+        -------
+        self.formatted_links (or self.link_counts, if clean() counted the links) if clean() has
+        been executed, otherwise self.raw_with_expansion if unshorten() has been executed,
+        otherwise None
+        """
+        self._expand("add")
+        batch = self._spawn(links)
+        if self.unshorten_executed:
+            batch._run_steps(batch._unshorten_steps(timeout, verbose, self._unshortened), workers, per_host_limit)
+        if self.clean_executed:
+            batch._run_steps(batch._clean_steps(verbose, processes, self._resolved, self.link_counts is not None), workers)
+        return self._merge(batch)
+
+    async def aadd(self, links, concurrency=10, per_host_limit=None, timeout=None, processes=1, verbose=False):
+        """ asyncio counterpart of add(), see aunshorten() and aclean() """
+        self._expand("add")
+        batch = self._spawn(links)
+        if self.unshorten_executed:
+            await batch._arun_steps(batch._unshorten_steps(timeout, verbose, self._unshortened), concurrency, per_host_limit)
+        if self.clean_executed:
+            await batch._arun_steps(
+                batch._clean_steps(verbose, processes, self._resolved, self.link_counts is not None), concurrency
+            )
+        return self._merge(batch)
+
+    def _spawn(self, links):
+        """
+        formatter object for a batch of add(), sharing the fetcher, caches, rules and shorteners of
+        self; its errors reach self.error_sink when they are merged
+        """
+        return formatter(
+            links, http=self.http, cache=self.cache, platforms=self.platform_rules, journal=self.journal, stats=self.stats,
+            lookup_cache=self.lookup_cache, _parent=self,
         )
 
-        self.garbage_df = self.garbage_df.sort_values("count", ascending=False)
-
-        print(
-            f"\n\n{len(self.formatted_links)} URLs in total were successfully cleaned."
-            + "\n\n"
-            + f"{self.garbage_less_difference} URLs were lost and are unaccounted for by final_overall_garbage."
-            + "\n\n"
-            + f"{len(self.final_sm_garbage)} URLs are included in final_sm_garbage, which is "
-            + f"{round((len(self.final_sm_garbage) / len(self.formatted_links + self.final_sm_garbage))*100, 2)}% of "
-            + f"formatted_links + final_sm_garbage."
-            + "\n\n"
-            + f"{self.final_difference} lines in total were discarded in the cleaning process, "
-            + f"of which {len(self.non_url_garbage)} were non-URLs."
-            + "\n\n"
-            + f"{len(self.clean_errors_df)} errors were produced in the cleaning process."
+    def _merge(self, batch):
+        """ appends the results of batch to those of self; the cost depends on the size of batch only, apart from sorting """
+        if not getattr(self, "_owns_raw_links", False):
+            # raw_links is the caller's list until the first add()
+            self.raw_links = list(self.raw_links)
+            self._owns_raw_links = True
+        self.raw_links.extend(batch.raw_links)
+        self._short_links |= batch._short_links
+        self.shortened_urls_list.extend(batch.shortened_urls_list)
+
+        if self.unshorten_executed:
+            self.expanded_urls_list.extend(batch.expanded_urls_list)
+            self.shortened_urls_garbage.extend(batch.shortened_urls_garbage)
+            self.not_shortened_links.extend(batch.not_shortened_links)
+            self.unshorten_errors.extend(batch.unshorten_errors)
+            self.redirect_chains.update(batch.redirect_chains)
+        if self.unshorten_executed or self.clean_executed:
+            self.raw_with_expansion.extend(batch.raw_with_expansion)
+
+        if self.clean_executed:
+            for name in self.clean_lists + self.builtin_garbage_bins + tuple(self.extra_garbage_bins):
+                getattr(self, name).extend(getattr(batch, name))
+            self.clean_errors.extend(batch.clean_errors)
+
+            if self.link_counts is not None:
+                self.link_counts.update(batch.link_counts)
+                formatted_total = self.link_counts.total
+            else:
+                # both lists are sorted, which sort() merges in linear time
+                self.formatted_links.extend(batch.formatted_links)
+                self.formatted_links.sort()
+                formatted_total = len(self.formatted_links)
+
+            self.final_overall_garbage += batch.final_overall_garbage
+            self.final_difference = len(self.raw_links) - formatted_total
+            self.garbage_less_difference = self.final_overall_garbage - self.final_difference
+            counts = dict(self.garbage_counts)
+            for garbage_type, count in batch.garbage_counts:
+                counts[garbage_type] = counts.get(garbage_type, 0) + count
+            self.garbage_counts = list(counts.items())
+            self._garbage_df = None
+
+        if self.error_sink is not None:
+            self.error_sink.flush()
+        if self.clean_executed:
+            return self.formatted_links if self.link_counts is None else self.link_counts
+        if self.unshorten_executed:
+            return self.raw_with_expansion
+        return None
+
+    """ lists built by unshorten() and clean() on the way to formatted_links, which compact() can drop """
+    intermediate_lists = (
+        "raw_with_expansion", "not_shortened_links", "sm_with_expansion", "non_sm_urls_list", "sm_urls_list",
+        "sm_other_urls_list", "fb_watch_list", "youtube_watch_list", "vk_list",
+    )
+
+    def compact(self, drop_intermediates=False):
+        """
+        Reduces the memory held by the lists of links of the object: raw_links, the lists built by
+        unshorten() and clean(), formatted_links, final_sm_garbage and the garbage bins. They are
+        stored as arrays of indices into one table of distinct strings (see compact.string_table),
+        so that a link held by several lists, or by different string objects with the same value,
+        is kept once, and each entry takes 4 bytes.
+        
+        A list is rebuilt, as a new list object, each time its attribute is accessed, so changes
+        to it are not kept. unshorten(), clean() and add() restore the lists before running.
+        
+        Parameters
+        ----------
+        drop_intermediates: if True, the lists in intermediate_lists are deleted instead of
+        stored, once formatted_links and the garbage bins are final. unshorten(), clean() and add()
+        can then no longer be run on the object.
+        """
+        self._expand()
+        names = (
+            ("raw_links", "shortened_urls_list", "shortened_urls_garbage", "expanded_urls_list", "formatted_links")
+            + self.intermediate_lists + self.clean_lists + self.builtin_garbage_bins
+            + tuple(getattr(self, "extra_garbage_bins", ()))
         )
+        table = string_table()
+        compacted = {}
+        dropped = list(self.__dict__.get("_dropped", ()))
+        for name in dict.fromkeys(names):
+            if not isinstance(self.__dict__.get(name), list):
+                continue
+            if drop_intermediates and name in self.intermediate_lists:
+                dropped.append(name)
+            else:
+                compacted[name] = table.encode(self.__dict__[name])
+            del self.__dict__[name]
+        table.freeze()
+        self._strings = table
+        self._compacted = compacted
+        self._dropped = tuple(dropped)
+
+    def _expand(self, method=None):
+        """ turns the lists stored by compact() back into lists, before method (if any) changes them """
+        compacted = self.__dict__.get("_compacted")
+        if compacted is None:
+            return
+        if method is not None and self._dropped:
+            raise ValueError(f"{method}() cannot be run after compact(drop_intermediates=True)")
+        for name, codes in compacted.items():
+            setattr(self, name, self._strings.decode(codes))
+        self._owns_raw_links = True
+        self._compacted = None
+        self._strings = None
+
+    def __getattr__(self, name):
+        # only reached for attributes the object does not have, such as the lists stored by compact()
+        compacted = self.__dict__.get("_compacted")
+        if compacted is not None and name in compacted:
+            return self._strings.decode(compacted[name])
+        if name in self.__dict__.get("_dropped", ()):
+            raise AttributeError(f"{name} was dropped by compact(drop_intermediates=True)")
+        descriptor = getattr(type(self), name, None)
+        if isinstance(descriptor, property):
+            # the property itself raised AttributeError (e.g. links_df before clean()); run it again
+            # so that its own error, naming what is actually missing, reaches the caller
+            return descriptor.fget(self)
+        raise AttributeError(f"'formatter' object has no attribute '{name}'")
+
+    @property
+    def stats_df(self):
+        """ timings of self.stats as a dataframe (see stats.run_stats.to_df()), or None without stats """
+        if self.stats is None:
+            return None
+        return self.stats.to_df()
 
+    def garbage_lists(self):
+        """ list of (type, list) tuples for the garbage bins, in the order of garbage_counts """
+        return [
+            ("non_url_garbage", self.non_url_garbage),
+            ("facebook", self.facebook_garbage),
+            ("instagram", self.ig_garbage),
+            ("youtube", self.youtube_garbage),
+            ("yt_watch", self.yt_watch_garbage),
+            ("fb_watch", self.fb_watch_garbage),
+            ("vkontakte", self.vk_garbage),
+            ("bitchute", self.bitchute_garbage),
+            ("odysee", self.odysee_garbage),
+            ("rumble", self.rumble_garbage),
+            ("gettr", self.gettr_garbage),
+            ("tiktok", self.tiktok_garbage),
+            ("shortened_urls", self.shortened_urls_garbage),
+        ] + [(re.sub("_garbage$", "", b), getattr(self, b)) for b in self.extra_garbage_bins]
+
+    @property
+    def links_df(self):
+        """
+        dataframe of every line clean() kept or discarded, with columns "link", "platform" and
+        "bin": formatted_links in order, then the contents of each garbage bin, the mail links
+        ("mail") and, if unshorten() was not executed, the shortened URLs clean() left out
+        ("shortened_urls"). "platform" is the domain of social media links (e.g. "twitter.com"),
+        without "m."/"mobile.", and None for other links. "bin" is None for formatted links and the
+        garbage type, as in garbage_df, for the rest. Not available after clean(counts=True), which
+        does not keep formatted_links.
+        """
+        import pandas as pd
+
+        if self.formatted_links is None:
+            raise ValueError("links_df needs formatted_links, which clean(counts=True) does not keep")
+        links = list(self.formatted_links)
+        bins = [None] * len(links)
+        discarded = self.garbage_lists() + [("mail", self.mail_garbage)]
         if self.unshorten_executed is False:
-            print(
-                f"\n{len(self.shortened_urls_list)} shortened_urls were identified, which were \
-not unshortened owing to formatter.unshorten() not having been executed."
+            discarded.append(("shortened_urls", self.shortened_urls_list))
+        for garbage_type, garbage in discarded:
+            links.extend(garbage)
+            bins.extend([garbage_type] * len(garbage))
+        platforms = {}
+        for link in set(links):
+            platforms[link] = mobile_prefix_re.sub("", url_host(link)) if self.sm_filter.match(link.lower()) else None
+        return pd.DataFrame({"link": links, "platform": [platforms[link] for link in links], "bin": bins})
+
+    @property
+    def garbage_df(self):
+        if self._garbage_df is None:
+            import pandas as pd
+
+            self._garbage_df = pd.DataFrame(
+                {
+                    "type": [garbage_type for garbage_type, count in self.garbage_counts],
+                    "count": [count for garbage_type, count in self.garbage_counts],
+                }
             )
+            self._garbage_df = self._garbage_df.sort_values("count", ascending=False)
+        return self._garbage_df
 
-        print("\nThe number of lines included in each garbage bin are:\n\n {0}\n".format(
-                self.garbage_df.to_string(index=False)))
+    @property
+    def unshorten_errors_df(self):
+        return self.unshorten_errors.to_df()
 
-        self.clean_executed = True
+    @property
+    def clean_errors_df(self):
+        return self.clean_errors.to_df()
 
-        self.joined_errors_df = self.unshorten_errors_df._append(self.clean_errors_df, ignore_index=True)
+    @property
+    def joined_errors_df(self):
+        import pandas as pd
 
-        return self.formatted_links
+        return pd.concat([self.unshorten_errors_df, self.clean_errors_df], ignore_index=True)
 
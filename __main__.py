@@ -1,65 +1,393 @@
-import sys
+import contextlib
 import getopt
+import os
+import sys
+import tempfile
+
 import urlFormatter
+from urlFormatter import errors
+from urlFormatter.counts import link_counts
+from urlFormatter.files import expand_inputs, is_plain, open_input, open_output, split_suffix, table_writer, write_links
+from urlFormatter.journal import run_journal
+from urlFormatter.stream import external_sort, format_stream, stream_summary
+
+
+def open_journal(output_path, resume, errors_path):
+    """
+    Opens the journal of the run writing output_path. When resuming, the errors file is cut back
+    to the size it had at the last checkpoint, since what the run wrote after it is redone.
+    Returns (journal, checkpoint).
+    """
+    journal = run_journal(output_path + ".journal", resume=resume)
+    checkpoint = journal.checkpoint
+    if checkpoint is None:
+        errors_size = None
+        if errors_path is not None:
+            errors_size = os.path.getsize(errors_path) if os.path.exists(errors_path) else 0
+        checkpoint = {"offset": 0, "errors_size": errors_size}
+        journal.mark(**checkpoint)
+    elif checkpoint["errors_size"] is not None and errors_path is not None and os.path.exists(errors_path):
+        os.truncate(errors_path, checkpoint["errors_size"])
+    return journal, checkpoint
+
+
+def close_journal(journal):
+    """ a finished run leaves nothing to resume, so its journal is removed """
+    if journal is None:
+        return
+    journal.close()
+    os.remove(journal.path)
+
+
+def write_counts(counts, prefix, counts_format, top):
+    """ writes the top link and domain counts to prefix + "_link_counts." + counts_format and prefix + "_domain_counts." + counts_format """
+    for by in ["link", "domain"]:
+        counts.write(prefix + "_" + by + "_counts." + counts_format, n=top, by=by)
+
+
+def identifier_of(path):
+    """ identifier used to name the output of an input file: its name without directory, compression suffix and extension """
+    return os.path.splitext(os.path.basename(split_suffix(path)[0]))[0]
+
+
+def output_prefix(identifier, options):
+    """ start of the output filenames of identifier, which depends on the methods run """
+    if options["unshorten"] and options["clean"]:
+        return identifier + "_cleaned_unshortened"
+    elif options["unshorten"]:
+        return identifier + "_unshortened"
+    return identifier + "_cleaned"
+
+
+def output_name(identifier, options):
+    """ output filename of identifier, e.g. "scrape_cleaned_links.csv.gz" """
+    name = output_prefix(identifier, options) + "_links." + options["format"]
+    if options["compress"] is not None:
+        name += "." + options["compress"]
+    return name
+
+
+def read_links(in_file):
+    return [line.replace("\n", "") for line in in_file]
+
+
+def run_input(path, output_path, prefix, errors_path, options):
+    """
+    Processes one input file, or stdin if path is "-", and writes its results to output_path
+    (stdout if "-"), or with --counts its counts to files starting with prefix.
+    """
+    if options["counts"] is not None:
+        run_counts(path, prefix, errors_path, options)
+    elif options["stream"]:
+        run_stream(path, output_path, errors_path, options)
+    else:
+        run_whole(path, output_path, errors_path, options)
+
+
+def run_whole(path, output_path, errors_path, options):
+    """ reads the whole input into one formatter object """
+    with open_input(path) as in_file:
+        raw_links = read_links(in_file)
+    # a resumed run replays the journaled resolutions and redoes the offline work. runs writing
+    # to stdout keep no journal, as there is no output file to name it after
+    journal = None
+    if output_path != "-":
+        journal, _ = open_journal(output_path, options["resume"], errors_path)
+
+    # if options u and c are provided, first run unshorten() and then clean()
+    formatter_obj = urlFormatter.formatter(raw_links, error_sink=errors_path, journal=journal)
+    links = []
+    if options["unshorten"]:
+        links = formatter_obj.unshorten()
+    if options["clean"]:
+        links = formatter_obj.clean(processes=options["processes"])
+
+    if options["format"] == "txt":
+        with open_output(output_path) as file:
+            write_links(file, links)
+    else:
+        writer = table_writer(output_path, options["format"])
+        writer.write(formatter_obj.links_df)
+        writer.close()
+    close_journal(journal)
+
+
+def run_counts(path, prefix, errors_path, options):
+    """ counts the cleaned links of the input instead of writing them out """
+    counts_format = options["counts"]
+    journal, _ = open_journal(prefix + "_link_counts." + counts_format, options["resume"], errors_path)
+    summary = None
+    with open_input(path) as in_file:
+        if options["stream"]:
+            # counts are only written once the whole input has been read, so the journal is not
+            # checkpointed: a resumed run starts over, with every journaled resolution replayed
+            summary = stream_summary()
+            counts = link_counts()
+            sink = errors.error_sink(errors_path) if errors_path is not None else None
+            for _ in format_stream(
+                in_file, chunk_size=options["chunk_size"], unshorten=options["unshorten"], clean=True, summary=summary,
+                error_sink=sink, clean_kwargs={"processes": options["processes"]}, journal=journal, counts=counts,
+            ):
+                pass
+        else:
+            formatter_obj = urlFormatter.formatter(read_links(in_file), error_sink=errors_path, journal=journal)
+            if options["unshorten"]:
+                formatter_obj.unshorten()
+            counts = formatter_obj.clean(processes=options["processes"], counts=True)
+    write_counts(counts, prefix, counts_format, options["top"])
+    close_journal(journal)
+    if summary is not None:
+        summary.report()
+
+
+def run_stream(path, output_path, errors_path, options):
+    """ processes the input in chunks, writing the results of each chunk as it is finished """
+    table_format = None if options["format"] == "txt" else options["format"]
+    sort = options["sort"] and table_format is None
+    if not sort:
+        unsorted_path = output_path
+    elif output_path == "-":
+        fd, unsorted_path = tempfile.mkstemp(suffix=".unsorted", dir=".")
+        os.close(fd)
+    else:
+        unsorted_path = output_path + ".unsorted"
+
+    # results are written as each chunk is finished, so a crash keeps the work already done.
+    # the journal records how far the output got, and a resumed run picks up from there. only a
+    # plain file can be cut back to a checkpoint, so a resumed run writing a compressed or Parquet
+    # file starts over, with every journaled resolution replayed
+    summary = stream_summary()
+    journal, checkpoint = None, None
+    if output_path != "-":
+        journal, checkpoint = open_journal(output_path, options["resume"], errors_path)
+    resumable = journal is not None and is_plain(unsorted_path)
+    resumed = resumable and checkpoint["offset"] > 0
+    if resumed:
+        os.truncate(unsorted_path, checkpoint["output_size"])
+        vars(summary).update(checkpoint["summary"])
+    sink = errors.error_sink(errors_path) if errors_path is not None else None
+
+    writer, out_file = None, None
+    if table_format is not None:
+        writer = table_writer(unsorted_path, table_format, append=resumed)
+    else:
+        out_file = open_output(unsorted_path, append=resumed)
+    chunk_links = []
+
+    def write_chunk(formatter_obj):
+        writer.write(formatter_obj.links_df)
+
+    def mark(offset):
+        # the links of a chunk are written in one call, once all of them have been yielded, so
+        # that the offset recorded by the journal never runs ahead of the output
+        if out_file is not None and chunk_links:
+            out_file.write("\n".join(chunk_links) + "\n")
+            chunk_links.clear()
+        if not resumable:
+            return
+        if writer is not None:
+            output_size = writer.tell()
+        else:
+            out_file.flush()
+            output_size = out_file.tell()
+        if sink is not None:
+            sink.flush()
+        journal.mark(
+            offset=offset, output_size=output_size, summary=vars(summary),
+            errors_size=sink.file.tell() if sink is not None else None,
+        )
+
+    try:
+        with open_input(path) as in_file:
+            for link in format_stream(
+                in_file, chunk_size=options["chunk_size"], unshorten=options["unshorten"], clean=options["clean"],
+                summary=summary, error_sink=sink, clean_kwargs={"processes": options["processes"]}, journal=journal,
+                start=checkpoint["offset"] if resumed else 0, checkpoint=mark,
+                on_chunk=write_chunk if writer is not None else None,
+            ):
+                if out_file is not None:
+                    chunk_links.append(link)
+    finally:
+        if writer is not None:
+            writer.close()
+        if out_file is not None:
+            out_file.close()
+    close_journal(journal)
+    if sort:
+        external_sort(unsorted_path, output_path, opener=open_output)
+        os.remove(unsorted_path)
+    summary.report()
+
+
+def run_inputs(runs, jobs):
+    """
+    runs run_input() with each tuple of arguments in runs, on up to jobs processes at a time.
+    Returns the number of inputs that failed, whose errors are printed to stderr.
+    """
+    failures = 0
+    if jobs <= 1 or len(runs) == 1:
+        for run in runs:
+            try:
+                run_input(*run)
+            except Exception as error:
+                print(f"{run[0]}: {error}", file=sys.stderr)
+                failures += 1
+        return failures
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(run_input, *run): run[0] for run in runs}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as error:
+                print(f"{futures[future]}: {error}", file=sys.stderr)
+                failures += 1
+    return failures
 
 
 def main():
     help_menu = "\nBulk URL Formatter converts URLs to a format that is analytically useful."\
                 "\nFor detailed information on usage and additional features see the README."\
-                + "\n\nUsage: python3 url_formatter.py [OPTIONS]"\
+                + "\n\nUsage: python3 -m urlFormatter [OPTIONS] [INPUT ...]"\
+                + "\n\nINPUT: newline-separated links, as file paths or glob patterns (quoted, e.g. 'scrapes/*.gz')."\
+                + "\n\tgzip and zstd files are decompressed (zstd needs the zstandard package). With no INPUT,"\
+                + "\n\tor with -, links are read from stdin and results written to stdout. Each input file is"\
+                + "\n\twritten to <name>_cleaned_links.txt (or _unshortened_links, _cleaned_unshortened_links),"\
+                + "\n\twhere <name> is its filename without extensions"\
                 + "\n\nOptions:"\
                 + "\n\t--help/-h: display this help menu"\
                 + "\n\t--unshorten/-u: unshorten shortened URLs"\
-                + "\n\t--clean/-c: clean URLs\n"
+                + "\n\t--clean/-c: clean URLs"\
+                + "\n\t--output/-o PATH: output path for a single input, - for stdout; .gz and .zst paths are compressed"\
+                + "\n\t--identifier=NAME: name output files after NAME instead of the input filename"\
+                + "\n\t--output-dir=DIR: directory the output files are written to (default: the current directory)"\
+                + "\n\t--format=FORMAT: txt (default) for one URL per line, or csv or parquet for a table of every line"\
+                + "\n\t\twith its platform and the garbage bin it was discarded to, if any. csv and parquet need"\
+                + "\n\t\t--clean/-c, and parquet needs pyarrow"\
+                + "\n\t--compress=gz|zst: compress txt and csv output files"\
+                + "\n\t--jobs/-j N: number of input files processed in parallel, each by its own process (default 1)"\
+                + "\n\t--stream/-s: process the input file in chunks and write results as they are produced,"\
+                + "\n\t\tfor files too large to fit in memory"\
+                + "\n\t--chunk-size=N: number of lines per chunk in stream mode (default 10000)"\
+                + "\n\t--sort: in stream mode, sort the output file once processing has finished"\
+                + "\n\t--errors=PATH: append errors to a .jsonl or .csv file as they occur. With several inputs,"\
+                + "\n\t\teach input has its own file, named <name>_ followed by the filename of PATH"\
+                + "\n\t--processes=N: number of processes used by clean() for its offline string work"\
+                + "\n\t--counts=FORMAT: with --clean, write how often each cleaned URL and each domain occurs"\
+                + "\n\t\tto <name>_cleaned_link_counts and _domain_counts files instead of the list of"\
+                + "\n\t\tcleaned URLs. FORMAT is csv or parquet (parquet needs pyarrow)"\
+                + "\n\t--top=N: with --counts, write only the N most frequent URLs and domains"\
+                + "\n\t--resume: continue an interrupted run from its journal (the output filename + .journal)"\
+                + "\n\t\tinstead of starting over; nothing resolved before the interruption is fetched again\n"
 
     argv = sys.argv[1:]
     try:
-        opts, args = getopt.getopt(argv, "uch", ["unshorten", "clean", "help"])
+        opts, args = getopt.gnu_getopt(argv, "uchso:j:", [
+            "unshorten", "clean", "help", "stream", "sort", "chunk-size=", "errors=", "processes=", "resume", "counts=",
+            "top=", "output=", "identifier=", "output-dir=", "format=", "compress=", "jobs=",
+        ])
 
-        u = False
-        c = False
         h = False
+        output_path = None
+        identifier = None
+        output_dir = "."
+        errors_path = None
+        jobs = 1
+        options = {
+            "unshorten": False, "clean": False, "stream": False, "sort": False, "chunk_size": 10000, "processes": 1,
+            "resume": False, "counts": None, "top": None, "format": "txt", "compress": None,
+        }
         for opt, arg in opts:
             if opt in ["-u", "--unshorten"]:
-                u = True
+                options["unshorten"] = True
             if opt in ["-c", "--clean"]:
-                c = True
+                options["clean"] = True
             if opt in ["-h", "--help"]:
                 h = True
+            if opt in ["-s", "--stream"]:
+                options["stream"] = True
+            if opt == "--sort":
+                options["sort"] = True
+            if opt == "--chunk-size":
+                options["chunk_size"] = int(arg)
+            if opt == "--errors":
+                errors_path = arg
+            if opt == "--processes":
+                options["processes"] = int(arg)
+            if opt == "--resume":
+                options["resume"] = True
+            if opt == "--counts":
+                if arg not in ["csv", "parquet"]:
+                    raise getopt.GetoptError("--counts must be csv or parquet")
+                options["counts"] = arg
+            if opt == "--top":
+                options["top"] = int(arg)
+            if opt in ["-o", "--output"]:
+                output_path = arg
+            if opt == "--identifier":
+                identifier = arg
+            if opt == "--output-dir":
+                output_dir = arg
+            if opt == "--format":
+                if arg not in ["txt", "csv", "parquet"]:
+                    raise getopt.GetoptError("--format must be txt, csv or parquet")
+                options["format"] = arg
+            if opt == "--compress":
+                if arg not in ["gz", "zst"]:
+                    raise getopt.GetoptError("--compress must be gz or zst")
+                options["compress"] = arg
+            if opt in ["-j", "--jobs"]:
+                jobs = int(arg)
 
-        if h is True:
+        inputs = expand_inputs(args or ["-"])
+        if h is True or (options["unshorten"] is False and options["clean"] is False):
             print(help_menu)
-        else:
-            raw_links = []
-            raw_links_path = input("\nPlease enter path to raw links file: ")
-            identifier = input("\nPlease enter an identifier for the output filename: ")
-
-            with open(raw_links_path, "r") as file:
-                lines = file.readlines()
-                for line in lines:
-                    raw_links.append(line.replace("\n", ""))
-            # if options u and c are provided, first run unshorten() and then clean()
-            if u is True and c is True:
-                formatter_obj = formatter(raw_links)
-                formatter_obj.unshorten()
-                cleaned_links = formatter_obj.clean()
-                with open(identifier + "_cleaned_unshortened_links.txt", "w") as file:
-                    for link in cleaned_links:
-                        file.write(link + "\n")
-            elif u is True:
-                formatter_obj = formatter(raw_links)
-                expanded_links = formatter_obj.unshorten()
-                with open(identifier + "_unshortened_links.txt", "w") as file:
-                    for link in expanded_links:
-                        file.write(link + "\n")
-            elif c is True:
-                formatter_obj = formatter(raw_links)
-                cleaned_links = formatter_obj.clean()
-                with open(identifier + "_cleaned_links.txt", "w") as file:
-                    for link in cleaned_links:
-                        file.write(link + "\n")
+            return 0
+        if options["counts"] is not None and options["clean"] is False:
+            raise getopt.GetoptError("--counts requires --clean/-c")
+        if options["format"] != "txt" and options["clean"] is False:
+            raise getopt.GetoptError("--format=" + options["format"] + " requires --clean/-c")
+        if options["format"] == "parquet" and options["compress"] is not None:
+            raise getopt.GetoptError("parquet files are already compressed; --compress applies to txt and csv")
+        if not inputs:
+            raise getopt.GetoptError("no input files match " + " ".join(args))
+        if len(inputs) > 1 and (output_path is not None or identifier is not None or "-" in inputs):
+            raise getopt.GetoptError("--output, --identifier and stdin (-) can only be used with a single input")
+
+        runs = []
+        outputs = set()
+        for path in inputs:
+            name = identifier if identifier is not None else (None if path == "-" else identifier_of(path))
+            if name is None and options["counts"] is not None:
+                raise getopt.GetoptError("--counts needs --identifier when reading stdin")
+            prefix = os.path.join(output_dir, output_prefix(name, options)) if name is not None else None
+            if output_path is not None:
+                path_out = output_path
+            elif name is not None:
+                path_out = os.path.join(output_dir, output_name(name, options))
+            else:
+                path_out = "-"
+            if path_out == "-" and options["resume"] and options["counts"] is None:
+                raise getopt.GetoptError("--resume needs an output file; runs writing to stdout keep no journal")
+            if path_out in outputs:
+                raise getopt.GetoptError("several inputs would be written to " + path_out)
+            outputs.add(path_out)
+            path_errors = errors_path
+            if errors_path is not None and len(inputs) > 1:
+                path_errors = os.path.join(os.path.dirname(errors_path), name + "_" + os.path.basename(errors_path))
+            runs.append((path, path_out, prefix, path_errors, options))
+
+        # metrics are printed to stderr when the results go to stdout, so that they can be piped
+        stdout = "-" in outputs and options["counts"] is None
+        with contextlib.redirect_stdout(sys.stderr) if stdout else contextlib.nullcontext():
+            failures = run_inputs(runs, jobs)
+        return 1 if failures else 0
     except Exception as error:
-        print(error)
+        print(error, file=sys.stderr)
+        return 1
 
 
-main()
+if __name__ == "__main__":
+    sys.exit(main())
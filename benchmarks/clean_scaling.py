@@ -0,0 +1,63 @@
+""" 
+Measures how the offline part of formatter.clean() scales with input size.
+
+Builds a synthetic Telegram-style scrape containing only links that clean() formats without
+network requests (news domains, twitter/facebook/reddit posts, t.me channels, instagram, non-URL
+noise and shortened URLs), then times clean() on it at several sizes. Time per link should stay
+roughly flat from 10k to 1M lines.
+
+Usage: python3 -m urlFormatter.benchmarks.clean_scaling [--processes=N] [SIZE ...]
+
+With --processes=N, clean(processes=N) is timed as well, next to the single-process run.
+"""
+
+import contextlib
+import io
+import sys
+import time
+
+import urlFormatter
+
+
+TEMPLATES = [
+    "https://www.site{n}.com/2023/05/article-{i}.html",
+    "http://news{n}.org/world/{i}?utm_source=telegram",
+    "https://twitter.com/user{n}/status/{i}",
+    "facebook.com/page{n}/posts/{i}",
+    "reddit.com/r/sub{n}/comments/{i}",
+    "https://t.me/channel{n}/{i}",
+    "instagram.com/p/{i}",
+    "instagram.com/user{n}/",
+    "photos/{i}.jpg",
+    "bit.ly/{n}x{i}",
+]
+
+
+def corpus(size):
+    """ returns size links; about one in five is a repeat, as is typical of channel scrapes """
+    return [TEMPLATES[i % len(TEMPLATES)].format(n=i % 997, i=i - i % 5) for i in range(size)]
+
+
+def time_clean(size, processes=1):
+    links = corpus(size)
+    with contextlib.redirect_stdout(io.StringIO()):
+        formatter_obj = urlFormatter.formatter(links)
+        start = time.perf_counter()
+        formatter_obj.clean(processes=processes)
+        elapsed = time.perf_counter() - start
+    return elapsed
+
+
+def main():
+    args = sys.argv[1:]
+    processes = [int(arg.split("=")[1]) for arg in args if arg.startswith("--processes=")]
+    sizes = [int(arg) for arg in args if not arg.startswith("--")] or [10000, 100000, 1000000]
+    print(f"\n{'lines':>10}  {'processes':>9}  {'seconds':>8}  {'us/line':>8}")
+    for size in sizes:
+        for n in [1] + processes:
+            elapsed = time_clean(size, n)
+            print(f"{size:>10}  {n:>9}  {elapsed:>8.2f}  {elapsed / size * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
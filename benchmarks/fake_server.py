@@ -0,0 +1,207 @@
+"""
+Local stand-in for the sites formatter talks to, so that benchmarks can run unshorten() and every
+network branch of clean() without leaving the machine.
+
+fake_server answers shorteners with canned redirects and youtube, rumble, gettr, bitchute,
+odysee, vk, facebook and tiktok links with canned pages shaped like the real ones, on
+127.0.0.1. route_to() mounts a local_adapter on a fetcher so that all of its requests go to the
+server instead of the real hosts. The server is reached over a real keep-alive connection, and
+responses carry the URLs formatter asked for, so redirects and response.url look as they would
+online.
+
+Links containing "none" in their path get a page without the element formatter looks for, to
+exercise the garbage bins.
+"""
+
+import collections
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests.adapters import HTTPAdapter
+
+
+SHORTENERS = {"bit.ly", "t.co", "tinyurl.com", "ow.ly", "buff.ly", "is.gd", "youtu.be"}
+
+""" where shortened links lead, picked by a hash of the shortened link """
+REDIRECT_TARGETS = [
+    "https://www.nytimes.com/2023/05/{n}/world/story-{n}.html",
+    "https://www.theguardian.com/politics/2023/may/{n}/article",
+    "https://twitter.com/user{n}/status/{n}",
+    "https://www.youtube.com/watch?v=vid{n}",
+    "https://rumble.com/v{n}-video.html",
+    "https://t.me/channel{n}/{n}",
+    "https://bit.ly/chain{n}",
+]
+
+
+def filler(size):
+    """ size bytes of markup without any element the lookups look for """
+    block = '<div class="row"><p>lorem ipsum dolor sit amet</p><span data-x="1">consectetur</span></div>\n'
+    return block * (size // len(block) + 1)
+
+
+def page_for(host, path, page_size):
+    """ returns (status, headers, body) for a GET or HEAD of host + path """
+    number = zlib.crc32((host + path).encode()) % 100000
+    missing = "none" in path
+    half = filler(page_size // 2)
+
+    def html(head, body):
+        return 200, {}, "<!DOCTYPE html><html><head>{0}</head><body>{1}{2}{1}</body></html>".format(head, half, body)
+
+    if host in SHORTENERS:
+        if path.startswith("/chain"):
+            target = REDIRECT_TARGETS[0]
+        elif host == "youtu.be":
+            target = "https://www.youtube.com/watch?v=" + path.strip("/")
+        else:
+            target = REDIRECT_TARGETS[number % len(REDIRECT_TARGETS)]
+        return 301, {"Location": target.format(n=number)}, ""
+    if host == "vm.tiktok.com":
+        target = "https://www.tiktok.com/" if missing else "https://www.tiktok.com/@tiktoker{0}/video/{0}".format(number)
+        return 301, {"Location": target}, ""
+    if host == "youtube.com" and path.startswith("/channel"):
+        data = "" if missing else '"webCommandMetadata":{"url":"/@channel%d/featured"' % number
+        return html("<title>YouTube</title>", '<script>var ytInitialData = {%s};</script>' % data)
+    if host == "youtube.com":
+        author = "" if missing else '<link itemprop="url" href="http://www.youtube.com/@author%d">' % number
+        return html("<title>video - YouTube</title>", '<span itemprop="author">%s</span>' % author)
+    if host == "rumble.com":
+        link = "" if missing else '<a class="media-by--a" href="/c/rumbler%d">channel</a>' % number
+        return html("<title>video</title>", link)
+    if host == "gettr.com":
+        title = "Post" if missing else "gettrer%d on GETTR" % number
+        return html("<title>%s</title>" % title, "")
+    if host == "bitchute.com":
+        link = "" if missing else '<a href="/channel/chuter%d/">channel</a>' % number
+        return html("<title>video</title>", link)
+    if host == "odysee.com":
+        meta = "" if missing else '<meta property="og:url" content="https://odysee.com/@odyseer%d:1/video:2">' % number
+        return html(meta, "")
+    if host == "vk.com" and path.startswith("/video"):
+        links = "".join('<a href="/nav%d">nav</a>' % i for i in range(3))
+        return html("", links + ("" if missing else '<a href="/vkowner%d">owner</a>' % number))
+    if host == "vk.com" and path.startswith("/wall"):
+        return html("", '<a href="/wallowner%d">owner</a>' % number)
+    if host == "vk.com":
+        return html('<link rel="canonical" href="https://vk.com/club%d">' % number, "")
+    if host in ("facebook.com", "fb.watch"):
+        link = "" if missing else '<link hreflang="x-default" href="https://www.facebook.com/page%d/videos/%d">' % (number, number)
+        return html(link, "")
+    return 200, {}, "<html><body>ok</body></html>"
+
+
+class quiet_server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # stream_find() closes a response once it has what it needs, which resets the connection
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class fake_server:
+    """
+    Serves the canned responses of page_for() from a background thread.
+
+    Parameters
+    ----------
+    latency: seconds each response is held back, to imitate the network
+
+    page_size: approximate size in bytes of each canned platform page. The element a lookup needs
+    sits in the middle of it.
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.url: base URL to give route_to()
+
+    self.hits: Counter of requests received per host
+    """
+
+    def __init__(self, latency=0.0, page_size=65536):
+        hits = self.hits = collections.Counter()
+        lock = threading.Lock()
+
+        class handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def respond(self, send_body):
+                host, _, path = self.path.lstrip("/").partition("/")
+                host = re.sub("^(www\.|m\.)", "", host)
+                with lock:
+                    hits[host] += 1
+                if latency:
+                    time.sleep(latency)
+                status, headers, body = page_for(host, "/" + path, page_size)
+                body = body.encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self.respond(True)
+
+            def do_HEAD(self):
+                self.respond(False)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = quiet_server(("127.0.0.1", 0), handler)
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class local_adapter(HTTPAdapter):
+    """
+    Transport adapter sending every request to base_url instead of its own host. The original
+    URL, without its scheme, becomes the path, and responses get the original URL back.
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.requests: number of requests sent
+    """
+
+    def __init__(self, base_url, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests += 1
+        local = request.copy()
+        local.url = self.base_url + "/" + re.sub("^https?://", "", request.url)
+        response = super().send(local, **kwargs)
+        response.url = request.url
+        response.request = request
+        return response
+
+
+def route_to(http, base_url):
+    """ mounts a local_adapter on fetcher http for every URL, keeping its pool size and retries; returns the adapter """
+    current = http.session.get_adapter("https://")
+    adapter = local_adapter(
+        base_url,
+        pool_connections=current._pool_connections,
+        pool_maxsize=current._pool_maxsize,
+        max_retries=current.max_retries,
+    )
+    for prefix in list(http.session.adapters):
+        http.session.mount(prefix, adapter)
+    return adapter
@@ -0,0 +1,231 @@
+"""
+End-to-end throughput benchmark of formatter against a local fake server.
+
+Builds a synthetic Telegram-style scrape at each size (news links, shortened URLs, and posts from
+every platform clean() handles, including the ones it resolves by fetching a page), then times
+formatter(), unshorten() and clean() on it with every request answered by
+benchmarks.fake_server. Reports links per second, the time of each stage, peak RSS and the
+number of requests made.
+
+Each size runs in its own process, so peak RSS is that of a single run. The corpus only depends
+on its size, so runs on different commits see the same input; use --save to append the results
+to a JSON lines file and --compare to print the change against the last matching record of one.
+
+Usage: python3 -m urlFormatter.benchmarks.suite [OPTIONS] [SIZE ...]
+
+Options:
+    --latency=MS: delay added to every response of the fake server (default 0)
+    --page-kb=N: size of the canned platform pages (default 64)
+    --workers=N: workers passed to unshorten() and clean() (default 1)
+    --save=PATH: append the results to a JSON lines file
+    --compare=PATH: compare with the last record of PATH run with the same options
+"""
+
+import contextlib
+import getopt
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import urlFormatter
+
+
+""" (weight, template, pool) making up a scrape. {i} is drawn from a pool of about size / pool
+distinct values, so that links repeat as they do across channels; None draws from the whole size.
+Platform links whose {i} is a multiple of ten get a page without the account (see fake_server). """
+MIX = [
+    (30, "https://www.site{n}.com/2023/05/article-{i}.html", None),
+    (6, "http://news{n}.org/world/{i}?utm_source=telegram", None),
+    (5, "https://bit.ly/{i}", 200),
+    (3, "https://t.co/{i}", 200),
+    (2, "tinyurl.com/{i}", 200),
+    (2, "https://youtu.be/vid{i}", 200),
+    (1, "ow.ly/{i}", 200),
+    (9, "https://twitter.com/user{n}/status/{i}", None),
+    (1, "twitter.com/hashtag/tag{n}", None),
+    (1, "mobile.twitter.com/user{n}", None),
+    (8, "https://t.me/channel{n}/{i}", None),
+    (6, "https://www.youtube.com/watch?v=vid{i}", 200),
+    (1, "youtube.com/live/vid{i}", 200),
+    (1, "youtube.com/channel/UC{i}", 200),
+    (1, "youtube.com/c/chan{n}", None),
+    (1, "youtube.com/results?search_query=q{n}", None),
+    (2, "facebook.com/page{n}/posts/{i}", None),
+    (1, "https://m.facebook.com/page{n}/videos/{i}", None),
+    (1, "facebook.com/watch/?v={i}", 200),
+    (1, "fb.watch/{i}/", 200),
+    (1, "facebook.com/story.php?story_fbid={i}", None),
+    (2, "instagram.com/p/{i}", None),
+    (1, "instagram.com/user{n}/", None),
+    (2, "rumble.com/v{i}-video.html", 200),
+    (1, "rumble.com/c/rumbler{n}", None),
+    (1, "gettr.com/post/p{i}", 200),
+    (1, "gettr.com/user/gettrer{n}", None),
+    (1, "bitchute.com/video/{i}/", 200),
+    (1, "odysee.com/video{i}:1", 200),
+    (1, "odysee.com/@odyseer{n}:1/video:2", None),
+    (1, "vk.com/video-{i}_1", 200),
+    (1, "vk.com/wall-{i}_2", 200),
+    (1, "vk.com/club{i}", 200),
+    (1, "vk.com/album?z=photo-{i}", None),
+    (1, "vm.tiktok.com/{i}/", 200),
+    (1, "tiktok.com/@tiktoker{n}?lang=en", None),
+    (1, "reddit.com/r/sub{n}/comments/{i}", None),
+    (1, "mailto:user{n}@mail.com", None),
+    (3, "photos/{i}.jpg", None),
+]
+
+
+def corpus(size, seed=0):
+    """ returns size links mixed according to MIX; the same size always gives the same links """
+    rng = random.Random(seed)
+    weights = [weight for weight, _, _ in MIX]
+    links = []
+    for _, template, pool in rng.choices(MIX, weights=weights, k=size):
+        i = rng.randrange(max(50, size // pool) if pool else size)
+        token = "none%d" % i if pool and i % 10 == 0 else i
+        links.append(template.format(n=rng.randrange(997), i=token))
+    return links
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_one(size, server_url, workers=1):
+    """ times one formatter run over corpus(size) with requests sent to server_url; returns a dict of results """
+    from urlFormatter.benchmarks.fake_server import route_to
+    from urlFormatter.fetch import fetcher
+
+    links = corpus(size)
+    http = fetcher(retries=0)
+    adapter = route_to(http, server_url)
+    stages = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        formatter_obj = urlFormatter.formatter(links, http=http)
+        stages["init"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        formatter_obj.unshorten(workers=workers, verbose=False)
+        stages["unshorten"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        formatter_obj.clean(workers=workers, verbose=False)
+        stages["clean"] = time.perf_counter() - start
+    total = sum(stages.values())
+    return {
+        "size": size,
+        "stages": stages,
+        "seconds": total,
+        "links_per_sec": size / total,
+        "peak_rss_mb": peak_rss_mb(),
+        "requests": adapter.requests,
+        "formatted": len(formatter_obj.formatted_links),
+    }
+
+
+def run_in_subprocess(size, server_url, workers):
+    # the child imports urlFormatter from the same place as this process
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(urlFormatter.__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([package_parent] + [p for p in [env.get("PYTHONPATH")] if p])
+    command = [
+        sys.executable, "-m", "urlFormatter.benchmarks.suite", "--child",
+        "--server=" + server_url, "--workers=%d" % workers, str(size),
+    ]
+    output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        here = os.path.dirname(os.path.abspath(urlFormatter.__file__))
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=here, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def last_record(path, settings):
+    record = None
+    with open(path, "r") as file:
+        for line in file:
+            candidate = json.loads(line)
+            if candidate["settings"] == settings:
+                record = candidate
+    return record
+
+
+def report(results, baseline=None):
+    previous = {result["size"]: result for result in (baseline or {}).get("results", [])}
+    header = f"\n{'lines':>9}  {'links/s':>9}  {'init s':>7}  {'unshort s':>9}  {'clean s':>8}  {'peak MB':>8}  {'requests':>8}"
+    print(header + (f"  {'vs ' + str(baseline['commit']):>12}" if baseline else ""))
+    for result in results:
+        stages = result["stages"]
+        rss = result["peak_rss_mb"]
+        line = (
+            f"{result['size']:>9}  {result['links_per_sec']:>9.0f}  {stages['init']:>7.2f}  {stages['unshorten']:>9.2f}"
+            f"  {stages['clean']:>8.2f}  {rss if rss is not None else float('nan'):>8.1f}  {result['requests']:>8}"
+        )
+        if result["size"] in previous:
+            change = result["links_per_sec"] / previous[result["size"]]["links_per_sec"] - 1
+            line += f"  {change:>+11.1%}"
+        print(line)
+    print()
+
+
+def main():
+    opts, args = getopt.getopt(
+        sys.argv[1:], "", ["latency=", "page-kb=", "workers=", "save=", "compare=", "child", "server="]
+    )
+    opts = dict(opts)
+    sizes = [int(arg) for arg in args] or [10000, 100000, 1000000]
+    workers = int(opts.get("--workers", 1))
+
+    if "--child" in opts:
+        print(json.dumps(run_one(sizes[0], opts["--server"], workers)))
+        return
+
+    from urlFormatter.benchmarks.fake_server import fake_server
+
+    settings = {
+        "latency_ms": float(opts.get("--latency", 0)),
+        "page_kb": int(opts.get("--page-kb", 64)),
+        "workers": workers,
+    }
+    server = fake_server(latency=settings["latency_ms"] / 1000, page_size=settings["page_kb"] * 1024)
+    try:
+        results = [run_in_subprocess(size, server.url, workers) for size in sizes]
+    finally:
+        server.close()
+
+    baseline = last_record(opts["--compare"], settings) if "--compare" in opts else None
+    report(results, baseline)
+    if "--save" in opts:
+        record = {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "settings": settings,
+            "results": results,
+        }
+        with open(opts["--save"], "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
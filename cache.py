@@ -0,0 +1,139 @@
+import re
+import sqlite3
+import threading
+import time
+
+
+def normalize_url(url):
+    """ key used for cache lookups: scheme and leading 'www.' removed, host lowercased, trailing '/' dropped """
+    url = re.sub("^https?://(www\.)?", "", url.strip())
+    host, sep, rest = url.partition("/")
+    return (host.lower() + sep + rest).rstrip("/")
+
+
+class resolution_cache:
+    """
+    Persistent on-disk cache of network resolutions, stored in a SQLite file so that it survives
+    between runs. Used by formatter to skip the HEAD request in unshorten() and the page lookups in
+    clean() for URLs that were already resolved by a previous run.
+
+    Entries are grouped by namespace (e.g. "unshorten", "youtube_watch", "rumble") and keyed by the
+    normalized input URL. An entry is either a resolved link or a failure, in which case it holds
+    the error message (or None if the page simply did not contain the target information).
+
+    Parameters
+    ----------
+    path: path to the SQLite file. Created if it does not exist.
+
+    ttl: seconds a resolved link stays valid. None keeps resolved links indefinitely.
+
+    negative_ttl: seconds a failure stays valid, after which the URL is retried. Defaults to six hours.
+
+    max_entries: maximum number of entries kept. When exceeded, the least recently used entries are
+    evicted.
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.hits / self.misses: running counts of lookups answered and not answered by the cache.
+    """
+
+    def __init__(self, path, ttl=None, negative_ttl=6 * 60 * 60, max_entries=1000000):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS resolutions ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, ok INTEGER NOT NULL, value TEXT, "
+            "created REAL NOT NULL, accessed REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS resolutions_accessed ON resolutions (accessed)")
+        self._conn.commit()
+
+    def get(self, namespace, url):
+        """
+        Returns None on a miss, otherwise a tuple (ok, value): (True, resolved_link) for a resolved
+        URL, or (False, error_message) for a failure.
+        """
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ok, value, created FROM resolutions WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is not None:
+                ok, value, created = row
+                ttl = self.ttl if ok else self.negative_ttl
+                if ttl is not None and now - created > ttl:
+                    row = None
+                else:
+                    self._conn.execute(
+                        "UPDATE resolutions SET accessed = ? WHERE namespace = ? AND key = ?", (now, namespace, key)
+                    )
+                    self._written()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return bool(ok), value
+
+    def set(self, namespace, url, value):
+        """ stores a resolved link """
+        self._put(namespace, url, True, value)
+
+    def set_failure(self, namespace, url, error=None):
+        """ stores a failure; error is the error message, or None if no target information was found """
+        self._put(namespace, url, False, None if error is None else str(error))
+
+    def _put(self, namespace, url, ok, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO resolutions (namespace, key, ok, value, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, normalize_url(url), int(ok), value, now, now),
+            )
+            self._written()
+
+    def _written(self):
+        # commit in batches; committing after every write would dominate the cost of a lookup
+        self._pending_writes += 1
+        if self._pending_writes >= 500:
+            self._commit()
+
+    def _commit(self):
+        self._conn.commit()
+        self._pending_writes = 0
+        self._evict()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM resolutions").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM resolutions WHERE rowid IN "
+                "(SELECT rowid FROM resolutions ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,),
+            )
+            self._conn.commit()
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM resolutions").fetchone()[0]
@@ -0,0 +1,36 @@
+import array
+
+
+class string_table:
+    """
+    Table of distinct strings that lists of links are stored against as arrays of indices, used by
+    formatter.compact(). Each distinct link is kept once, however many lists hold it and whether or
+    not they hold the same string object, and each entry of a list costs 4 bytes instead of an
+    8-byte reference.
+
+    Strings are added with encode() until freeze() is called, which drops the dict used to find
+    their indices; after that the table can only decode().
+    """
+
+    typecode = "I"
+
+    def __init__(self):
+        self.strings = ()
+        self._indices = {}
+
+    def encode(self, strings):
+        """ returns an array of the indices of strings, adding the strings the table does not have yet """
+        indices = self._indices
+        # setdefault() reads len(indices) before inserting, so a new string gets the next index
+        return array.array(self.typecode, [indices.setdefault(string, len(indices)) for string in strings])
+
+    def freeze(self):
+        self.strings = tuple(self._indices)
+        self._indices = None
+
+    def decode(self, codes):
+        """ returns a new list of the strings at the indices of codes """
+        return list(map(self.strings.__getitem__, codes))
+
+    def __len__(self):
+        return len(self.strings) if self._indices is None else len(self._indices)
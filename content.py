@@ -0,0 +1,121 @@
+import collections
+import re
+import threading
+
+from .cache import resolution_cache
+
+
+# the platform page lookups of formatter.clean() depend only on the video or post a link points
+# to, not on its query string or title, so their outcomes are shared by every link to the same content
+
+""" for each lookup namespace, a pattern capturing the content ID of a link and the canonical link built from it """
+content_patterns = {
+    "youtube_watch": (re.compile("youtube\.com/(?:watch\?(?:.*&)?v=|live/)([-\w]{11})"), "youtube.com/watch?v=\\1"),
+    "rumble": (re.compile("rumble\.com/(v\d[0-9a-z]*)(?=[-./?#]|$)"), "rumble.com/\\1"),
+    "gettr": (re.compile("gettr\.com/(post|comment)/(\w+)"), "gettr.com/\\1/\\2"),
+    "bitchute": (re.compile("bitchute\.com/(?:video|embed)/([-\w]+)"), "bitchute.com/video/\\1"),
+    "odysee": (re.compile("odysee\.com/([^?#]+?)/?(?:[?#]|$)"), "odysee.com/\\1"),
+    "vk": (re.compile("vk\.com/.*?((?:video|wall)-?\d+_\d+)"), "vk.com/\\1"),
+}
+
+
+def content_key(platform, link):
+    """
+    returns the canonical link of the video or post link points to, e.g. "youtube.com/watch?v=ID"
+    for "youtube.com/watch?v=ID&t=10s" or "youtube.com/live/ID?si=x", so that all links to the same
+    content have the same key. Returns link itself if no content ID can be found in it.
+    """
+    pattern = content_patterns.get(platform)
+    match = pattern[0].search(link) if pattern is not None else None
+    return match.expand(pattern[1]) if match is not None else link
+
+
+class content_cache:
+    """
+    In-memory LRU of the outcomes of platform lookups, keyed by content_key(). Used by formatter
+    in front of its journal and resolution cache, so that links that differ only by their query
+    string, and repeat posts in later chunks of a stream, cost a dict lookup instead of a request.
+    One object can be shared by several formatter objects (format_stream() shares it between chunks).
+
+    Parameters
+    ----------
+    max_entries: maximum number of outcomes kept in memory. When exceeded, the least recently used
+    are evicted.
+
+    store: optional path to a SQLite file, or a resolution_cache object, backing the LRU: outcomes
+    are written through to it and read from it on a miss, so that they last between runs. Failures
+    are kept there for its negative_ttl.
+
+    Lookups that raised an error (a timeout, a reset connection, etc.) are not kept in the LRU,
+    since they may succeed when retried; they are only answered by the store, until its
+    negative_ttl runs out. Pages that were fetched but did not contain the account are kept.
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.hits / self.misses: running counts of lookups answered and not answered by the LRU or its store
+    """
+
+    def __init__(self, max_entries=100000, store=None):
+        self.max_entries = max_entries
+        if isinstance(store, str):
+            store = resolution_cache(store)
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, platform, key):
+        """ returns None on a miss, otherwise a tuple (ok, value): (True, account_link) or (False, error) """
+        with self._lock:
+            entry = self._entries.get((platform, key))
+            if entry is not None:
+                self._entries.move_to_end((platform, key))
+                self.hits += 1
+                return entry
+        if self.store is not None:
+            entry = self.store.get(platform, key)
+            if entry is not None:
+                with self._lock:
+                    self.hits += 1
+                    if entry[0] or entry[1] is None:
+                        self._put(platform, key, entry)
+                return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, platform, key, value, persist=True):
+        """
+        stores a resolved account link. With persist=False it is only kept in memory, e.g. for an
+        outcome recalled from elsewhere whose age the store should not reset.
+        """
+        with self._lock:
+            self._put(platform, key, (True, value))
+        if persist and self.store is not None:
+            self.store.set(platform, key, value)
+
+    def set_failure(self, platform, key, error=None, persist=True):
+        """ stores a failure; error is the error, or None if the page did not contain the account. persist as in set(). """
+        if error is None:
+            with self._lock:
+                self._put(platform, key, (False, None))
+        if persist and self.store is not None:
+            self.store.set_failure(platform, key, error)
+
+    def _put(self, platform, key, entry):
+        self._entries[(platform, key)] = entry
+        self._entries.move_to_end((platform, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def flush(self):
+        if self.store is not None:
+            self.store.flush()
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,95 @@
+import collections
+import heapq
+
+
+def order(item):
+    """ sort key of a (key, count) tuple: most frequent first, then alphabetical """
+    return -item[1], item[0]
+
+
+class link_counts:
+    """
+    Frequency counts of cleaned links, kept by formatter.clean(counts=True) instead of the sorted
+    formatted_links list. Only one entry per distinct link is held, so memory depends on how many
+    domains and accounts there are rather than on the number of lines, and nothing is sorted
+    unless the counts are listed.
+
+    Parameters
+    ----------
+    links: optional iterable of cleaned links to count
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.links: Counter mapping each cleaned link (a domain, or a social media account) to the
+    number of lines it was produced from
+
+    self.domains: Counter mapping each domain, the part of a cleaned link before its first "/"
+    (e.g. "twitter.com" for "twitter.com/jack"), to its number of lines. It is aggregated from
+    self.links when accessed.
+    """
+
+    def __init__(self, links=None):
+        self.links = collections.Counter()
+        self._domains = None
+        self._total = 0
+        if links is not None:
+            self.add(links)
+
+    def add(self, links):
+        """ counts an iterable of cleaned links """
+        self.links.update(links)
+        self._domains = None
+        self._total = None
+
+    def update(self, other):
+        """ adds the counts of another link_counts object """
+        total = self.total + other.total
+        self.links.update(other.links)
+        self._domains = None
+        self._total = total
+
+    @property
+    def domains(self):
+        if self._domains is None:
+            domains = collections.Counter()
+            for link, count in self.links.items():
+                domains[link.partition("/")[0]] += count
+            self._domains = domains
+        return self._domains
+
+    @property
+    def total(self):
+        """ number of lines counted, i.e. the length formatted_links would have had """
+        if self._total is None:
+            self._total = sum(self.links.values())
+        return self._total
+
+    def __len__(self):
+        return len(self.links)
+
+    def top(self, n=None, by="link"):
+        """
+        list of (link, count) tuples, or (domain, count) if by is "domain", most frequent first and
+        alphabetically among equal counts; all of them if n is None
+        """
+        counter = self.domains if by == "domain" else self.links
+        if n is None:
+            return sorted(counter.items(), key=order)
+        return heapq.nsmallest(n, counter.items(), key=order)
+
+    def to_df(self, n=None, by="link"):
+        """ dataframe of top(n, by) with columns [by, "count"] """
+        import pandas as pd
+
+        return pd.DataFrame(self.top(n, by), columns=[by, "count"])
+
+    def write(self, path, n=None, by="link"):
+        """
+        writes top(n, by) to path, as Parquet if path ends with ".parquet" (which needs pyarrow or
+        fastparquet) and as CSV otherwise
+        """
+        df = self.to_df(n, by)
+        if path.endswith(".parquet"):
+            df.to_parquet(path, index=False)
+        else:
+            df.to_csv(path, index=False)
@@ -0,0 +1,358 @@
+"""
+Coordinator/worker mode, for spreading the requests of unshorten() and clean() over several
+machines (and so several outbound IPs and per-IP platform limits).
+
+The coordinator puts the distinct shortened URLs, and then the distinct social media links whose
+account needs a page lookup, on a task queue in batches. Workers, on any machine that can reach
+the queue, take batches and resolve them with the ordinary unshorten() and clean() code, and send
+back the outcome of every URL: the link it resolved to, or its error. The coordinator then runs
+unshorten() and clean() itself with these outcomes in place of requests, the way a journal is
+replayed, so formatted_links, the garbage bins, garbage_df and the error logs are exactly those of
+a single-node run.
+
+A worker that dies keeps its batch only until its lease expires; the batch is then handed to
+another worker. A batch that fails max_attempts times, or that no worker finishes before the
+coordinator's timeout, is left to the coordinator, which resolves whatever is missing itself.
+
+Usage: python3 -m urlFormatter.distributed QUEUE [--lease=SECONDS] [--cache=PATH]
+
+runs a worker on the SQLite queue file QUEUE until the coordinator closes it.
+"""
+
+import getopt
+import json
+import os
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+
+
+class sqlite_queue:
+    """
+    Task queue kept in a SQLite file, the default queue of coordinator and worker. Every process
+    opens the file itself, so several worker processes on one machine, or machines sharing the
+    file over a network filesystem that supports SQLite locking, can use it at once.
+
+    Tasks are put in batches, one per call of put(), and counts(), results() and cancel() only
+    see the tasks of the batch they are given, so a queue file can be reused by later runs.
+
+    Any object with the same methods (put, claim, complete, fail, counts, results, cancel,
+    close_queue, closed) can be used instead, e.g. one backed by a message broker.
+
+    Parameters
+    ----------
+    path: path of the SQLite file. Created if it does not exist.
+
+    lease: seconds a claimed task belongs to its worker. If it has not been completed by then, the
+    worker is presumed dead and the task can be claimed again. Should be well above the time a
+    worker takes for one task.
+
+    max_attempts: number of claims after which a task that keeps failing or timing out is marked failed
+    """
+
+    def __init__(self, path, lease=600, max_attempts=3):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        # isolation_level=None leaves transactions to the BEGIN IMMEDIATE of each write below
+        self._conn = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id INTEGER PRIMARY KEY, batch TEXT NOT NULL, phase TEXT NOT NULL, payload TEXT NOT NULL, "
+            "state TEXT NOT NULL, worker TEXT, lease_until REAL, attempts INTEGER NOT NULL DEFAULT 0, result TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tasks_batch ON tasks (batch, state)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _write(self, *statements):
+        """ runs (sql, parameters) statements in one transaction; returns the cursor of the last one """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql, parameters in statements:
+                cursor = self._conn.execute(sql, parameters)
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return cursor
+
+    def put(self, phase, payloads):
+        """
+        adds one pending task of phase for each JSON-serializable payload, as a new batch, and
+        reopens the queue if it was closed; returns the id of the batch
+        """
+        batch = uuid.uuid4().hex
+        self._write(("DELETE FROM meta WHERE key = 'closed'", ()), *[
+            ("INSERT INTO tasks (batch, phase, payload, state) VALUES (?, ?, ?, 'pending')", (batch, phase, json.dumps(payload)))
+            for payload in payloads
+        ])
+        return batch
+
+    def claim(self, worker_id):
+        """
+        returns (task_id, phase, payload) of the oldest pending task, or of a task whose lease has
+        expired, after leasing it to worker_id; None if there is none
+        """
+        now = time.time()
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._conn.execute(
+                "UPDATE tasks SET state = 'failed' WHERE state = 'claimed' AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            row = self._conn.execute(
+                "SELECT id, phase, payload FROM tasks WHERE state = 'pending' "
+                "OR (state = 'claimed' AND lease_until < ?) ORDER BY id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(
+                    "UPDATE tasks SET state = 'claimed', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                    (worker_id, now + self.lease, row[0]),
+                )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def complete(self, task_id, result):
+        """ stores the result of a task. A late result of a worker presumed dead is kept if the task is not done yet. """
+        self._write((
+            "UPDATE tasks SET state = 'done', result = ? WHERE id = ? AND state != 'done'", (json.dumps(result), task_id)
+        ))
+
+    def fail(self, task_id):
+        """ returns a task whose worker could not process it to the queue, or marks it failed after max_attempts """
+        self._write((
+            "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, lease_until = NULL "
+            "WHERE id = ? AND state = 'claimed'",
+            (self.max_attempts, task_id),
+        ))
+
+    def counts(self, batch):
+        """ dict mapping each state (pending, claimed, done, failed) to the number of tasks of batch in it """
+        now = time.time()
+        # expired leases that cannot be claimed again are failed, as claim() would mark them
+        rows = self._conn.execute(
+            "SELECT CASE WHEN state = 'claimed' AND lease_until < ? AND attempts >= ? THEN 'failed' ELSE state END, "
+            "COUNT(*) FROM tasks WHERE batch = ? GROUP BY 1",
+            (now, self.max_attempts, batch),
+        ).fetchall()
+        counts = {"pending": 0, "claimed": 0, "done": 0, "failed": 0}
+        counts.update(rows)
+        return counts
+
+    def results(self, batch):
+        """ yields the result of every done task of batch """
+        for (result,) in self._conn.execute("SELECT result FROM tasks WHERE batch = ? AND state = 'done'", (batch,)):
+            yield json.loads(result)
+
+    def cancel(self, batch):
+        """ marks the tasks of batch that are not done failed, so that no worker claims them any more """
+        self._write(("UPDATE tasks SET state = 'failed' WHERE batch = ? AND state IN ('pending', 'claimed')", (batch,)))
+
+    def close_queue(self):
+        """ tells the workers that no more tasks will be added, so that they stop once the queue is empty """
+        self._write(("INSERT OR REPLACE INTO meta (key, value) VALUES ('closed', '1')", ()))
+
+    def closed(self):
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'closed'").fetchone() is not None
+
+    def close(self):
+        self._conn.close()
+
+
+def open_queue(queue, **kwargs):
+    """ returns queue, or an sqlite_queue of it if it is a path """
+    if isinstance(queue, str):
+        return sqlite_queue(queue, **kwargs)
+    return queue
+
+
+def error_message(error):
+    return None if error is None else str(error)
+
+
+class worker:
+    """
+    Takes tasks from a queue and resolves them until the queue is closed and empty.
+
+    Parameters
+    ----------
+    queue: sqlite_queue (or compatible object), or path to the SQLite file of one
+
+    worker_id: name recorded with the tasks the worker claims. Defaults to host name and process id.
+
+    poll: seconds to wait before asking again when the queue has no task
+
+    **kwargs: passed to formatter (http, cache, journal, stats, platforms, lookup_cache). Custom
+    platform registries must be the same as the coordinator's.
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.tasks: number of tasks completed
+    """
+
+    def __init__(self, queue, worker_id=None, poll=1.0, **kwargs):
+        self.queue = open_queue(queue)
+        self.worker_id = worker_id or "%s:%d" % (socket.gethostname(), os.getpid())
+        self.poll = poll
+        self.kwargs = kwargs
+        self.tasks = 0
+
+    def run(self, workers=1, per_host_limit=None, timeout=None):
+        """ processes tasks until the queue is closed and has none left; workers, per_host_limit and timeout as in unshorten() """
+        while True:
+            claimed = self.queue.claim(self.worker_id)
+            if claimed is None:
+                if self.queue.closed():
+                    return
+                time.sleep(self.poll)
+                continue
+            task_id, phase, payload = claimed
+            try:
+                result = self.process(phase, payload["links"], workers, per_host_limit, timeout)
+            except Exception:
+                self.queue.fail(task_id)
+                continue
+            self.queue.complete(task_id, result)
+            self.tasks += 1
+
+    def process(self, phase, links, workers=1, per_host_limit=None, timeout=None):
+        """ resolves the links of a task; returns the outcome of each as JSON-serializable lists """
+        from . import formatter
+
+        formatter_obj = formatter(links, **self.kwargs)
+        # the fetcher, cache and lookup cache of the first task are reused by the following ones
+        self.kwargs.update(http=formatter_obj.http, cache=formatter_obj.cache, lookup_cache=formatter_obj.lookup_cache)
+        if phase == "unshorten":
+            formatter_obj.unshorten(workers=workers, per_host_limit=per_host_limit, timeout=timeout, verbose=False)
+            return [
+                [url, full_url, unshortened_url, error_message(error)]
+                for url, (full_url, unshortened_url, error) in formatter_obj._unshortened.items()
+            ]
+        # the coordinator sends links as clean() sees them after unshorten(): without their
+        # scheme, and never discarded as shortened URLs
+        formatter_obj.unshorten_executed = True
+        formatter_obj.raw_with_expansion = list(links)
+        formatter_obj.clean(verbose=False, workers=workers)
+        return [
+            [platform, key, resolved, error_message(error)]
+            for (platform, key), (resolved, error) in formatter_obj._resolved.items()
+        ]
+
+
+class coordinator:
+    """
+    Runs unshorten() and clean() on a formatter object with their requests made by workers.
+
+    Parameters
+    ----------
+    queue: sqlite_queue (or compatible object), or path to the SQLite file of one. The queue is
+    closed at the end of run(), which stops the workers.
+
+    task_size: number of distinct links per task
+
+    poll: seconds between checks of the progress of the workers
+
+    timeout: seconds the coordinator waits while no task of the current batch finishes, e.g.
+    because no worker is running. The tasks left are then cancelled and their links resolved by
+    the coordinator. None waits as long as it takes.
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.failed: number of tasks that failed on every attempt, or were cancelled after timeout,
+    and whose links the coordinator resolved itself
+    """
+
+    def __init__(self, queue, task_size=500, poll=1.0, timeout=1800):
+        self.queue = open_queue(queue)
+        self.task_size = task_size
+        self.poll = poll
+        self.timeout = timeout
+        self.failed = 0
+
+    def run(self, formatter_obj, unshorten=True, clean=True, verbose=True, processes=1, counts=False, close=True):
+        """
+        Runs unshorten() (if unshorten is True) and then clean() (if clean is True) on
+        formatter_obj, with the shortened URLs and page lookups resolved by the workers. Returns
+        what the last method run returns. verbose, processes and counts are those of clean().
+
+        close: if True the queue is closed afterwards, which stops the workers once they are idle
+        """
+        from .shard import bulk_strip_scheme
+
+        results = None
+        if unshorten:
+            memo = {}
+            for url, full_url, unshortened_url, error in self._distribute("unshorten", formatter_obj.shortened_urls_list):
+                memo[url] = (full_url, unshortened_url, error)
+            results = formatter_obj._run_steps(formatter_obj._unshorten_steps(verbose=verbose, memo=memo))
+        if clean:
+            if formatter_obj.unshorten_executed:
+                links = formatter_obj.raw_with_expansion
+            else:
+                links = bulk_strip_scheme([link for link in dict.fromkeys(formatter_obj.raw_links) if link not in formatter_obj._short_links])
+            formatter_obj.platform_rules.compile()
+            sm_filter = formatter_obj.platform_rules.filter
+            # only social media links can need a page lookup; the rest is offline work left to the coordinator
+            links = [link for link in dict.fromkeys(links) if sm_filter.match(link)]
+            memo = {}
+            for platform, key, resolved, error in self._distribute("clean", links):
+                memo[(platform, key)] = (resolved, error)
+            results = formatter_obj._run_steps(formatter_obj._clean_steps(verbose, processes, memo, counts))
+        if close:
+            self.queue.close_queue()
+        return results
+
+    def _distribute(self, phase, links):
+        """ puts the distinct links on the queue in tasks of task_size, waits for the workers and yields the outcomes they return """
+        links = list(dict.fromkeys(links))
+        batch = self.queue.put(phase, [{"links": links[i:i + self.task_size]} for i in range(0, len(links), self.task_size)])
+        finished = 0
+        progress = time.monotonic()
+        while True:
+            counts = self.queue.counts(batch)
+            if counts["pending"] == 0 and counts["claimed"] == 0:
+                break
+            if counts["done"] + counts["failed"] > finished:
+                finished = counts["done"] + counts["failed"]
+                progress = time.monotonic()
+            elif self.timeout is not None and time.monotonic() - progress > self.timeout:
+                self.queue.cancel(batch)
+                counts = self.queue.counts(batch)
+                break
+            time.sleep(self.poll)
+        self.failed += counts["failed"]
+        for result in self.queue.results(batch):
+            yield from result
+
+
+def main():
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "", ["lease=", "cache="])
+        if len(args) != 1:
+            raise getopt.GetoptError("usage: python3 -m urlFormatter.distributed QUEUE [--lease=SECONDS] [--cache=PATH]")
+        kwargs = {}
+        lease = 600
+        for opt, arg in opts:
+            if opt == "--lease":
+                lease = float(arg)
+            if opt == "--cache":
+                kwargs["cache"] = arg
+        worker(sqlite_queue(args[0], lease=lease), **kwargs).run()
+    except Exception as error:
+        print(error, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
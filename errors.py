@@ -0,0 +1,85 @@
+import csv
+import json
+
+
+class error_sink:
+    """
+    Writes error records to a file as they are produced, so that errors from long runs can be
+    inspected (or tailed) without keeping them in memory or waiting for the run to finish.
+
+    Parameters
+    ----------
+    path: path of the output file, opened in append mode
+
+    format: "jsonl" (one JSON object per line) or "csv". If not given it is inferred from the
+    file extension, defaulting to jsonl.
+    """
+
+    def __init__(self, path, format=None):
+        self.path = path
+        if format is None:
+            format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        self.format = format
+        self.file = open(path, "a", newline="")
+        if self.format == "csv":
+            self._writer = csv.writer(self.file)
+            if self.file.tell() == 0:
+                self._writer.writerow(error_log.columns)
+
+    def write(self, url, error, platform):
+        if self.format == "csv":
+            self._writer.writerow([url, str(error), platform])
+        else:
+            self.file.write(json.dumps({"url": url, "error_message": str(error), "platform": platform}) + "\n")
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class error_log:
+    """
+    Append-only record of the errors produced by unshorten() or clean(). Records are stored as
+    three column lists, which makes an append O(1); the pandas DataFrame exposed by formatter
+    (unshorten_errors_df, clean_errors_df, joined_errors_df) is only built, and pandas only
+    imported, when it is accessed.
+
+    Parameters
+    ----------
+    sink: optional error_sink each record is also written to as it is appended
+    """
+
+    columns = ["url", "error_message", "platform"]
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.urls = []
+        self.errors = []
+        self.platforms = []
+        self._df = None
+
+    def append(self, url, error, platform):
+        self.urls.append(url)
+        self.errors.append(error)
+        self.platforms.append(platform)
+        self._df = None
+        if self.sink is not None:
+            self.sink.write(url, error, platform)
+
+    def extend(self, other):
+        """ appends every record of another error_log """
+        for record in zip(other.urls, other.errors, other.platforms):
+            self.append(*record)
+
+    def __len__(self):
+        return len(self.urls)
+
+    def to_df(self):
+        """ returns the records as a DataFrame with columns url, error_message and platform """
+        if self._df is None:
+            import pandas as pd
+
+            self._df = pd.DataFrame({"url": self.urls, "error_message": self.errors, "platform": self.platforms})
+        return self._df
@@ -0,0 +1,230 @@
+import codecs
+import re
+from html import escape
+from html.parser import HTMLParser
+
+
+# attributes BeautifulSoup splits into lists of values (on any tag, or on the tags listed), the
+# elements it never expects a closing tag for, and those whose strings get_text() leaves out
+multi_valued_attributes = {
+    "*": {"class", "accesskey", "dropzone"},
+    "a": {"rel", "rev"},
+    "link": {"rel", "rev"},
+    "td": {"headers"},
+    "th": {"headers"},
+    "form": {"accept-charset"},
+    "object": {"archive"},
+    "area": {"rel"},
+    "icon": {"sizes"},
+    "iframe": {"sandbox"},
+    "output": {"for"},
+}
+void_elements = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem", "meta", "param",
+    "source", "track", "wbr", "basefont", "bgsound", "command", "frame", "image", "isindex", "nextid", "spacer",
+}
+non_text_elements = {"script", "style", "template"}
+charset_re = re.compile("charset=[\"']?([-\w.:]+)", re.I)
+
+
+class element:
+    """
+    The parts of a BeautifulSoup Tag that formatter's page lookups use (get(), get_text() and
+    str()), for an element found by stream_find(). Attributes are stored as BeautifulSoup stores
+    them: the last of duplicated attributes wins, valueless attributes are "" and the values of
+    multi-valued attributes such as class and rel are lists.
+    """
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.strings = []
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+    def get_text(self):
+        return "".join(self.strings)
+
+    def __str__(self):
+        attrs = "".join(
+            ' {0}="{1}"'.format(key, escape(" ".join(value) if isinstance(value, list) else value))
+            for key, value in self.attrs.items()
+        )
+        if self.name in void_elements:
+            return "<{0}{1}/>".format(self.name, attrs)
+        return "<{0}{1}>{2}</{0}>".format(self.name, attrs, escape(self.get_text(), quote=False))
+
+
+def attribute_dict(tag, attrs):
+    result = {}
+    for key, value in attrs:
+        if value is None:
+            value = ""
+        if key in multi_valued_attributes["*"] or key in multi_valued_attributes.get(tag, ()):
+            value = value.split()
+        result[key] = value
+    return result
+
+
+def attributes_match(attrs, wanted):
+    """ BeautifulSoup's attrs={...} test: a string equals the value (or one value of a list), a regex searches it """
+    for key, pattern in (wanted or {}).items():
+        value = attrs.get(key)
+        if value is None:
+            return False
+        candidates = value + [" ".join(value)] if isinstance(value, list) else [value]
+        if isinstance(pattern, str):
+            if pattern not in candidates:
+                return False
+        elif not any(pattern.search(candidate) for candidate in candidates):
+            return False
+    return True
+
+
+class element_finder(HTMLParser):
+    """
+    Incremental parser that watches the tags of a page as it is fed and stops at the element
+    BeautifulSoup's find() would return. Open elements are tracked the way BeautifulSoup's
+    html.parser tree builder tracks them, so "inside" means the same thing for both.
+
+    Parameters
+    ----------
+    name: tag name of the element
+
+    attrs: optional dict of attributes the element must have (see attributes_match())
+
+    within: optional (name, attrs) of the element the match must be inside of. Only the first
+    such element is searched, as in soup.find(name, attrs).find(...).
+
+    index: number of earlier matches to skip, as in soup.find_all(name)[index]
+
+    text: if True the element's text is collected, and it is only complete once the element closes
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.found: the element once it is complete, otherwise None
+
+    self.done: True once the page can not change the result, whether or not an element was found
+    """
+
+    def __init__(self, name, attrs=None, within=None, index=0, text=False):
+        super().__init__(convert_charrefs=True)
+        self.name = name
+        self.attrs = attrs
+        self.within = within
+        self.index = index
+        self.text = text
+
+        self.found = None
+        self.done = False
+        self._matches = 0
+        self._open = []
+        self._already_closed = []
+        self._within_at = None if within is not None else 0
+        self._text_at = None
+        self._candidate = None
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs, True)
+
+    def handle_startendtag(self, tag, attrs):
+        candidate = self._candidate
+        self._start(tag, attrs, False)
+        self.handle_endtag(tag)
+        if self._candidate is not candidate and not self.done and not self.text:
+            if self._open[-1:] == [tag]:
+                # BeautifulSoup left this element open and renders what follows as its children,
+                # which a partial read can not reproduce
+                self._finish(None)
+            else:
+                self._finish(self._candidate)
+
+    def _start(self, tag, attrs, close_void_element):
+        if self.done:
+            return
+        attrs = attribute_dict(tag, attrs)
+        if self._within_at is None and tag == self.within[0] and attributes_match(attrs, self.within[1]):
+            self._within_at = len(self._open)
+        elif self._within_at is not None and self._candidate is None and tag == self.name and attributes_match(attrs, self.attrs):
+            self._matches += 1
+            if self._matches > self.index:
+                self._candidate = element(tag, attrs)
+                if not self.text and (close_void_element or tag not in void_elements):
+                    self._finish(self._candidate)
+                else:
+                    self._text_at = len(self._open)
+        # a void element is closed at once; BeautifulSoup then ignores its next end tag
+        if tag in void_elements and close_void_element:
+            self._already_closed.append(tag)
+        else:
+            self._open.append(tag)
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if tag in self._already_closed:
+            self._already_closed.remove(tag)
+            return
+        if tag not in self._open:
+            return
+        # like BeautifulSoup, an end tag closes every element opened after the one it matches
+        del self._open[len(self._open) - 1 - self._open[::-1].index(tag):]
+        if self._text_at is not None and len(self._open) <= self._text_at:
+            self._finish(self._candidate)
+        elif self.within is not None and self._within_at is not None and len(self._open) <= self._within_at:
+            self._finish(None)
+
+    def handle_data(self, data):
+        if self._text_at is not None and not self.done and self._open[-1] not in non_text_elements:
+            self._candidate.strings.append(data)
+
+    def _finish(self, found):
+        self.found = found
+        self.done = True
+
+
+def response_encoding(response):
+    """ charset declared in the Content-Type header, or utf-8 """
+    match = charset_re.search(response.headers.get("content-type", ""))
+    encoding = match.group(1) if match else "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = "utf-8"
+    return encoding
+
+
+def stream_find(response, name, attrs=None, within=None, index=0, text=False, chunk_size=16384):
+    """
+    Reads a response requested with stream=True chunk by chunk, parsing as it goes, and stops
+    downloading as soon as the element BeautifulSoup's find() would return has been read. The
+    response is then closed, which drops the rest of the body and its connection.
+
+    Parameters
+    ----------
+    response: requests.Response obtained with stream=True
+
+    name, attrs, within, index, text: see element_finder
+
+    chunk_size: number of bytes read at a time
+
+    Returns
+    -------
+    (element, None) if the element was found. Otherwise (None, page_content) with the whole body
+    as bytes, so that the caller can repeat the lookup with a full BeautifulSoup parse and fail in
+    exactly the same way as before.
+    """
+    finder = element_finder(name, attrs=attrs, within=within, index=index, text=text)
+    decoder = codecs.getincrementaldecoder(response_encoding(response))(errors="replace")
+    chunks = []
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            chunks.append(chunk)
+            if not finder.done:
+                finder.feed(decoder.decode(chunk))
+            if finder.found is not None:
+                return finder.found, None
+    finally:
+        response.close()
+    return None, b"".join(chunks)
@@ -0,0 +1,216 @@
+import contextlib
+import threading
+
+from .ratelimit import host_key, host_throttled, parse_retry_after, rate_limiter
+
+
+class fetcher:
+    """
+    Shared HTTP layer used by formatter for every request made by unshorten() and clean().
+    Connections are kept alive and pooled per host, so repeated requests against the same
+    platform (youtube.com, rumble.com, bit.ly, etc.) reuse an open TCP/TLS connection
+    instead of paying for a new handshake each time.
+
+    Parameters
+    ----------
+    headers: dict of headers sent with every request (formatter passes its user-agent)
+
+    timeout: default number of seconds to wait for a response when a call does not give its own
+
+    retries: number of times a request is retried after a connection error or a 429/5xx response
+
+    backoff_factor: controls the sleep between retries ({backoff_factor} * 2 ** (retry - 1) seconds).
+    For 429/5xx responses the host's Retry-After header is used when it has one.
+
+    pool_connections: number of per-host connection pools kept open at once
+
+    pool_maxsize: number of keep-alive connections kept in each host's pool. Should be at least
+    the number of threads making requests concurrently.
+
+    pool_sizes: optional dict mapping a host (e.g. "youtube.com") to its own pool_maxsize, for
+    hosts that receive most of the traffic
+
+    rate: default maximum number of requests per second sent to any one host. None does not limit
+    hosts until they throttle.
+
+    host_rates: optional dict mapping a host (e.g. "rumble.com") to its own maximum requests per second
+
+    limiter: optional rate_limiter to use instead of one built from rate, host_rates and
+    backoff_factor, e.g. to share limits between fetchers
+
+    requests is imported when the first fetcher is created rather than with the package.
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.limiter: rate_limiter every request waits on. 429 and 5xx responses are retried here
+    rather than by urllib3, so that each retry also waits for the host's cooldown and slows the
+    host down for every other thread.
+    """
+
+    throttle_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        headers=None,
+        timeout=30,
+        retries=2,
+        backoff_factor=0.5,
+        pool_connections=32,
+        pool_maxsize=16,
+        pool_sizes=None,
+        rate=None,
+        host_rates=None,
+        limiter=None,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        if limiter is None:
+            limiter = rate_limiter(rate, host_rates=host_rates, backoff_factor=backoff_factor)
+        self.limiter = limiter
+        self._local = threading.local()
+        self._slots = None
+
+        import requests
+
+        self.session = requests.Session()
+        if headers is not None:
+            self.session.headers.update(headers)
+
+        adapter = self._adapter(pool_connections, pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # requests picks the adapter with the longest matching prefix, so these override the default pool
+        for host, size in (pool_sizes or {}).items():
+            adapter = self._adapter(1, size)
+            for prefix in ["http://", "https://", "http://www.", "https://www."]:
+                self.session.mount(prefix + host, adapter)
+
+    def _adapter(self, pool_connections, pool_maxsize):
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # only connection and read errors are retried by urllib3; throttling is handled by _request()
+        retry = Retry(
+            total=self.retries,
+            connect=self.retries,
+            read=self.retries,
+            status=0,
+            backoff_factor=self.backoff_factor,
+            allowed_methods=["HEAD", "GET"],
+            raise_on_status=False,
+        )
+        return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", True)
+        return self._request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault("allow_redirects", False)
+        return self._request("HEAD", url, **kwargs)
+
+    def redirects(self, url, max_redirects=10, **kwargs):
+        """
+        yields the targets of the redirects starting at url, one hop at a time. Each hop is a HEAD
+        request whose Location header is read without fetching a body, and the next hop is only
+        requested when the caller asks for it, so following can stop at the first target the caller
+        can use. Stops when a response is not a redirect; raises requests.TooManyRedirects, as
+        requests does, when the target of the max_redirects-th hop redirects again.
+        """
+        from urllib.parse import urljoin
+
+        import requests
+
+        for hop in range(max_redirects + 1):
+            response = self.head(url, allow_redirects=False, **kwargs)
+            response.close()
+            if not response.is_redirect:
+                return
+            if hop == max_redirects:
+                raise requests.TooManyRedirects("Exceeded %d redirects." % max_redirects, response=response)
+            url = urljoin(url, response.headers["location"])
+            yield url
+
+    def _request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        host = host_key(url)
+        attempt = 0
+        while True:
+            with self._slot(host):
+                self.limiter.acquire(host)
+                response = self.session.request(method, url, **kwargs)
+            recorded = getattr(self._local, "responses", None)
+            if recorded is not None:
+                recorded.extend(response.history)
+                recorded.append(response)
+            if response.status_code not in self.throttle_statuses:
+                self.limiter.succeeded(host)
+                return response
+            self.limiter.throttled(host, parse_retry_after(response.headers.get("Retry-After")))
+            if getattr(self._local, "defer", False):
+                response.close()
+                raise host_throttled(host)
+            if attempt >= self.retries:
+                return response
+            attempt += 1
+            response.close()
+
+    def _slot(self, host):
+        """ the semaphore a request to host holds while in flight within host_slots(), or a no-op context """
+        slots = self._slots
+        if slots is None:
+            return contextlib.nullcontext()
+        limit, semaphores, lock = slots
+        with lock:
+            semaphore = semaphores.get(host)
+            if semaphore is None:
+                semaphore = semaphores[host] = threading.BoundedSemaphore(limit)
+        return semaphore
+
+    @contextlib.contextmanager
+    def host_slots(self, limit):
+        """
+        within this block no more than limit requests are in flight at once against any one host,
+        from any thread. The scheduler caps jobs by the host of their first URL; this also covers
+        the requests a job makes to other hosts, such as the hops of a redirect chain.
+        """
+        previous = self._slots
+        self._slots = (limit, {}, threading.Lock())
+        try:
+            yield
+        finally:
+            self._slots = previous
+
+    @contextlib.contextmanager
+    def deferred(self):
+        """ within this block a throttled request raises host_throttled instead of waiting to be retried """
+        self._local.defer = True
+        try:
+            yield
+        finally:
+            self._local.defer = False
+
+    @contextlib.contextmanager
+    def recording(self):
+        """ within this block the responses received by the calling thread, redirects included, are collected in the list yielded """
+        self._local.responses = []
+        try:
+            yield self._local.responses
+        finally:
+            self._local.responses = None
+
+    def close(self):
+        self.session.close()
+
+
+def received_bytes(responses):
+    """ number of body bytes read over the wire for responses, which may have been streamed and closed early """
+    total = 0
+    for response in responses:
+        try:
+            total += response.raw.tell()
+        except (AttributeError, TypeError):
+            pass
+    return total
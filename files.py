@@ -0,0 +1,149 @@
+import glob
+import gzip
+import io
+import sys
+
+from .stream import chunked
+
+
+# input and output files of the command line, which may be stdin/stdout ("-") or compressed
+
+""" magic numbers by which open_input() recognizes compressed data """
+gzip_magic = b"\x1f\x8b"
+zstd_magic = b"\x28\xb5\x2f\xfd"
+
+compressed_suffixes = (".gz", ".zst")
+
+""" size of the write buffer of output files """
+write_buffer = 1 << 20
+
+
+def zstandard():
+    """ the zstandard package, which is only needed for .zst files """
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd-compressed files need the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def expand_inputs(patterns):
+    """
+    returns the paths matched by each glob pattern, in order and sorted within each pattern.
+    "-" (stdin) and paths without wildcards are kept as they are, so that a missing file is
+    reported when it is opened.
+    """
+    paths = []
+    for pattern in patterns:
+        if pattern != "-" and glob.has_magic(pattern):
+            paths.extend(sorted(glob.glob(pattern)))
+        else:
+            paths.append(pattern)
+    return paths
+
+
+def split_suffix(path):
+    """ returns (path without its compression suffix, the suffix or "") """
+    for suffix in compressed_suffixes:
+        if path.endswith(suffix):
+            return path[:-len(suffix)], suffix
+    return path, ""
+
+
+def open_input(path):
+    """
+    opens path, or stdin if path is "-", for reading text. gzip and zstd data is decompressed,
+    recognized by its magic number rather than by the file name.
+    """
+    binary = sys.stdin.buffer if path == "-" else open(path, "rb")
+    magic = binary.peek(4)[:4]
+    if magic.startswith(gzip_magic) or magic.startswith(zstd_magic):
+        # opened by name, the decompressing file closes the file it reads from
+        if path != "-":
+            binary.close()
+            binary = path
+        if magic.startswith(gzip_magic):
+            return gzip.open(binary, "rt", encoding="utf-8")
+        return zstandard().open(binary, "rt", encoding="utf-8")
+    return io.TextIOWrapper(binary, encoding="utf-8")
+
+
+def open_output(path, append=False):
+    """
+    opens path, or stdout if path is "-", for writing text through a large buffer. Paths ending
+    with .gz or .zst are compressed with gzip or zstd instead. If append is True a plain file is
+    appended to rather than overwritten.
+
+    stdout is the process's own (sys.__stdout__), so that the command line can redirect printed
+    metrics to stderr without them ending up in the output.
+    """
+    if path == "-":
+        return open(sys.__stdout__.fileno(), "w", encoding="utf-8", buffering=write_buffer, closefd=False)
+    if append:
+        return open(path, "a", encoding="utf-8", buffering=write_buffer)
+    suffix = split_suffix(path)[1]
+    if suffix == ".gz":
+        return gzip.open(path, "wt", encoding="utf-8")
+    if suffix == ".zst":
+        return zstandard().open(path, "wt", encoding="utf-8")
+    return open(path, "w", encoding="utf-8", buffering=write_buffer)
+
+
+def is_plain(path):
+    """ True if path is an uncompressed file, which can be truncated and appended to when a run is resumed """
+    return path != "-" and split_suffix(path)[1] == "" and not path.endswith(".parquet")
+
+
+def write_links(file, links, batch_size=65536):
+    """ writes links one per line, batch_size lines per write() call """
+    for batch in chunked(links, batch_size):
+        file.write("\n".join(batch) + "\n")
+
+
+class table_writer:
+    """
+    Writes dataframes with the same string columns (e.g. formatter.links_df) one after the other to
+    a single CSV or Parquet file, so that a stream can write each chunk as it is finished.
+
+    Parameters
+    ----------
+    path: output path, or "-" for stdout. CSV files ending with .gz or .zst are compressed.
+
+    table_format: "csv" or "parquet". Parquet needs pyarrow.
+
+    append: if True a CSV file is appended to, without a header
+    """
+
+    def __init__(self, path, table_format, append=False):
+        self.path = path
+        self.format = table_format
+        self.file = None
+        self._parquet = None
+        self._header = not append
+        if table_format == "csv":
+            self.file = open_output(path, append=append)
+
+    def write(self, df):
+        if self.format == "csv":
+            df.to_csv(self.file, index=False, header=self._header)
+            self._header = False
+            return
+        import pyarrow
+        import pyarrow.parquet
+
+        schema = pyarrow.schema([(column, pyarrow.string()) for column in df.columns])
+        if self._parquet is None:
+            sink = sys.__stdout__.buffer if self.path == "-" else self.path
+            self._parquet = pyarrow.parquet.ParquetWriter(sink, schema)
+        self._parquet.write_table(pyarrow.Table.from_pandas(df, schema=schema, preserve_index=False))
+
+    def tell(self):
+        """ size of a CSV file written so far """
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+        if self._parquet is not None:
+            self._parquet.close()
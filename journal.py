@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+
+from .cache import normalize_url
+
+
+class run_journal:
+    """
+    Append-only checkpoint file of a run, so that a run stopped by a crash or Ctrl-C can be
+    resumed without fetching anything again.
+
+    Every network resolution made by unshorten() and clean() (shortened URLs and platform page
+    lookups) is appended as one JSON line as soon as it completes. Everything else formatter
+    produces, i.e. the formatted links, garbage bins and errors, is computed from the raw links
+    and these resolutions, so replaying the journal reproduces them. Stream runs also write
+    checkpoint lines recording how much of the input has been processed (see mark()).
+
+    Lines are flushed to disk every flush_every records or flush_interval seconds, and at every
+    checkpoint; a line cut off by a crash is dropped when the journal is resumed.
+
+    Parameters
+    ----------
+    path: path of the journal file
+
+    resume: if True and the file exists, its records are loaded and new records are appended to
+    it. Otherwise the file is started afresh.
+
+    flush_every / flush_interval: how often pending lines are written to disk
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.outcomes: dict mapping (namespace, normalized URL) to (ok, value), as returned by get()
+
+    self.checkpoint: dict passed to the last mark() call of the resumed journal, or None
+    """
+
+    def __init__(self, path, resume=False, flush_every=100, flush_interval=1.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.outcomes = {}
+        self.checkpoint = None
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._flushed = time.monotonic()
+        if resume and os.path.exists(path):
+            self._load()
+            self.file = open(path, "a")
+        else:
+            self.file = open(path, "w")
+
+    def _load(self):
+        good_size = 0
+        with open(self.path, "rb") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                good_size += len(line)
+                if "checkpoint" in record:
+                    self.checkpoint = record["checkpoint"]
+                else:
+                    self.outcomes[(record["namespace"], record["key"])] = (record["ok"], record["value"])
+        # drop a partially written last line so that appended records start on a line of their own
+        with open(self.path, "r+b") as file:
+            file.truncate(good_size)
+
+    def get(self, namespace, url):
+        """ returns None if url was not resolved in namespace, otherwise (ok, value) like resolution_cache.get() """
+        return self.outcomes.get((namespace, normalize_url(url)))
+
+    def set(self, namespace, url, value):
+        """ records a resolved link """
+        self._write(namespace, url, True, value)
+
+    def set_failure(self, namespace, url, error=None):
+        """ records a failure; error is the error message, or None if no target information was found """
+        self._write(namespace, url, False, None if error is None else str(error))
+
+    def _write(self, namespace, url, ok, value):
+        key = normalize_url(url)
+        line = json.dumps({"namespace": namespace, "key": key, "ok": ok, "value": value}) + "\n"
+        with self._lock:
+            self.outcomes[(namespace, key)] = (ok, value)
+            self.file.write(line)
+            self._pending += 1
+            if self._pending >= self.flush_every or time.monotonic() - self._flushed >= self.flush_interval:
+                self._flush()
+
+    def mark(self, **checkpoint):
+        """ writes a checkpoint line (e.g. offset=lines_done) and syncs the journal to disk """
+        with self._lock:
+            self.checkpoint = checkpoint
+            self.file.write(json.dumps({"checkpoint": checkpoint}) + "\n")
+            self._flush()
+            os.fsync(self.file.fileno())
+
+    def _flush(self):
+        self.file.flush()
+        self._pending = 0
+        self._flushed = time.monotonic()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self.file.close()
+
+    def __len__(self):
+        return len(self.outcomes)
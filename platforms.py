@@ -0,0 +1,203 @@
+import re
+
+
+class sub:
+    """ transform applying re.sub(pattern, repl, link) with a precompiled pattern """
+
+    def __init__(self, pattern, repl):
+        self.pattern = re.compile(pattern)
+        self.repl = repl
+
+    def __call__(self, link):
+        return self.pattern.sub(self.repl, link)
+
+
+class first_match:
+    """ transform replacing a link with the first match of pattern in it """
+
+    def __init__(self, pattern):
+        self.pattern = re.compile(pattern)
+
+    def __call__(self, link):
+        return self.pattern.search(link).group(0)
+
+
+class rule:
+    """
+    One step of the social media classification performed by formatter.clean(). A link that
+    passes the rule's test is sent to destination, optionally after being transformed.
+
+    Parameters
+    ----------
+    pattern: regex the link is tested against. Compiled once, when the rule is created.
+
+    destination: name of the formatter list the link is added to, e.g. "sm_urls_list",
+    "sm_other_urls_list", "youtube_watch_list" or a garbage bin such as "ig_garbage". Garbage
+    bins that formatter does not already have are created by clean() and counted in garbage_df.
+
+    platforms: platform prefixes (see platform_registry) whose links the rule applies to. None
+    applies the rule to links of every platform.
+
+    search: if True the pattern may match anywhere in the link (re.search), otherwise it must
+    match at the start (re.match).
+
+    transform: optional function applied to the link before it is added to destination. Use
+    sub(), first_match() or a module-level function rather than a lambda if the registry is used
+    with formatter.clean(processes=...), which sends it to worker processes.
+
+    resolve: optional tuple (platform, lookup, garbage) for links whose account can only be found
+    by fetching the page. lookup is the name of a formatter method, or a function called as
+    lookup(formatter_obj, link), returning the account URL or None. It is run through
+    formatter._resolve(); garbage is the name of the bin used when it fails.
+    """
+
+    def __init__(self, pattern, destination=None, platforms=None, search=False, transform=None, resolve=None):
+        self.pattern = re.compile(pattern)
+        self.destination = destination
+        self.platforms = None if platforms is None else tuple(platforms)
+        self.search = search
+        self.transform = transform
+        self.resolve = resolve
+        self._test = self.pattern.search if search else self.pattern.match
+
+    def test(self, link):
+        return self._test(link) is not None
+
+    def apply(self, link):
+        """ returns (destination, value), or ("resolve", (platform, lookup, garbage)) """
+        if self.resolve is not None:
+            return "resolve", self.resolve
+        if self.transform is not None:
+            link = self.transform(link)
+        return self.destination, link
+
+
+class platform_registry:
+    """
+    Ordered, extensible set of rules used by formatter.clean() to classify social media links.
+
+    Links are recognised by their platform prefix (e.g. "twitter", "vk.", "youtube.com"). Each
+    link is matched against the prefixes once, and the prefix selects through a dict the short,
+    ordered list of rules that can apply to it: that platform's rules plus the rules declared for
+    every platform, in the order they were added. The first rule whose pattern matches decides
+    where the link goes; if none does, fallback is used.
+
+    Parameters
+    ----------
+    fallback: (destination, transform) used for links that no rule matches
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.pattern: the regex string matching any supported social media link (optionally prefixed
+    by "m." or "mobile."), used by formatter as sm_platforms_re
+
+    self.filter: self.pattern compiled
+    """
+
+    def __init__(self, fallback=("sm_other_urls_list", None)):
+        self.fallback = fallback
+        self.platforms = []
+        self.rules = []
+        self._compiled = False
+
+    def add_platform(self, prefix):
+        """ adds a platform by its literal link prefix, e.g. "bsky.app" """
+        if prefix not in self.platforms:
+            self.platforms.append(prefix)
+            self._compiled = False
+
+    def add_rule(self, new_rule, index=None):
+        """ appends a rule, or inserts it at index so that it is tested before the rules that follow """
+        if index is None:
+            self.rules.append(new_rule)
+        else:
+            self.rules.insert(index, new_rule)
+        self._compiled = False
+
+    def garbage_bins(self):
+        """ names of every garbage bin the rules can send links to """
+        bins = [self.fallback[0]] + [r.destination for r in self.rules] + [r.resolve[2] for r in self.rules if r.resolve]
+        return [b for b in dict.fromkeys(bins) if b is not None and b.endswith("_garbage")]
+
+    def compile(self):
+        alternatives = "|".join(re.escape(prefix) for prefix in self.platforms)
+        self.pattern = "^(m\.|mobile\.)?(" + alternatives + ").*"
+        self.filter = re.compile(self.pattern)
+        self._prefix_re = re.compile("(" + alternatives + ")")
+        self._any_platform = [r for r in self.rules if r.platforms is None]
+        self._dispatch = {
+            prefix: [r for r in self.rules if r.platforms is None or prefix in r.platforms]
+            for prefix in self.platforms
+        }
+        self._compiled = True
+
+    def route(self, link):
+        """ returns (destination, value) for a link with its "m."/"mobile." prefix removed """
+        if not self._compiled:
+            self.compile()
+        match = self._prefix_re.match(link) if self.platforms else None
+        rules = self._dispatch[match.group(1)] if match else self._any_platform
+        for r in rules:
+            if r._test(link) is not None:
+                return r.apply(link)
+        destination, transform = self.fallback
+        return destination, link if transform is None else transform(link)
+
+
+def default_registry():
+    """ returns the rules used by formatter.clean() for social media links """
+    registry = platform_registry(fallback=("sm_other_urls_list", sub("/$", "")))
+    for prefix in [
+        "odysee", "vk.", "instagram", "twitter", "facebook", "fb.watch", "youtube.com", "t.me", "tiktok.",
+        "vm.tiktok", "bitchute", "gettr.com", "reddit.", "rumble.com", "gab.com", "4chan.org",
+    ]:
+        registry.add_platform(prefix)
+
+    for r in [
+        # these are discarded because usernames cannot be extracted from them
+        rule("(instagram\.com/p/|instagram\.com/tv)", "ig_garbage", platforms=["instagram"]),
+        rule(
+            "(twitter\.com/.*/status|facebook\.com/.*/posts|reddit\.com/r/.*/comments)",
+            "sm_urls_list",
+            search=True,
+            transform=sub("(/status.*|/posts.*|/comments.*)", ""),
+        ),
+        rule("twitter\.com/hashtag", "twitter_garbage", platforms=["twitter"]),
+        rule("facebook\.com/.*/videos", "sm_urls_list", search=True, transform=sub("/videos.*", "")),
+        # fb_watch, youtube_watch and vk links are placed in special lists for later processing
+        rule("(facebook\.com/watch|fb\.watch)", "fb_watch_list", platforms=["facebook", "fb.watch"]),
+        rule("facebook\.com/story", "facebook_garbage", platforms=["facebook"]),
+        rule("t\.me/", "sm_urls_list", platforms=["t.me"], transform=first_match("t\.me/[-+_a-zA-Z0-9]*")),
+        rule("youtube\.com/c/", "sm_urls_list", search=True, transform=sub("/c/", "/@")),
+        rule("youtube\.com/channel", search=True, resolve=("youtube", "_lookup_youtube_channel", "youtube_garbage")),
+        rule("youtube\.com/results", "youtube_garbage", platforms=["youtube.com"]),
+        rule("(youtube\.com/watch|youtube\.com/live)", "youtube_watch_list", platforms=["youtube.com"]),
+        rule("odysee\.com/[^@]", platforms=["odysee"], resolve=("odysee", "_lookup_odysee", "odysee_garbage")),
+        rule("odysee\.com/@", "sm_urls_list", platforms=["odysee"], transform=sub(":.*", "")),
+        rule("bitchute\.com", platforms=["bitchute"], resolve=("bitchute", "_lookup_bitchute", "bitchute_garbage")),
+        rule("vk\.com", "vk_list", platforms=["vk."]),
+        rule("(rumble\.com/user/|rumble\.com/c/)", "sm_urls_list", platforms=["rumble.com"]),
+        rule("rumble\.com", platforms=["rumble.com"], resolve=("rumble", "_lookup_rumble", "rumble_garbage")),
+        rule("gettr\.com/user/", "sm_urls_list", platforms=["gettr.com"]),
+        rule("gettr\.com", platforms=["gettr.com"], resolve=("gettr", "_lookup_gettr", "gettr_garbage")),
+        rule("(vm\.|m\.)", platforms=["vm.tiktok"], resolve=("tiktok", "_lookup_tiktok", "tiktok_garbage")),
+        rule("tiktok\.com/@", "sm_urls_list", platforms=["tiktok."], transform=sub("\?.*", "")),
+        rule("tiktok", "tiktok_garbage", platforms=["tiktok."]),
+    ]:
+        registry.add_rule(r)
+    return registry
+
+
+def default_vk_registry():
+    """ returns the rules used by formatter.clean() for the links collected in vk_list """
+    registry = platform_registry(fallback=("vk_garbage", None))
+    for r in [
+        rule("vk\.com/video/@", "sm_urls_list", search=True, transform=lambda link: re.sub("\?.*", "", re.sub("/video/@", "/", link))),
+        rule("vk\.com/video", search=True, resolve=("vk", "_lookup_vk_video", "vk_garbage")),
+        rule("vk\.com/wall", search=True, resolve=("vk", "_lookup_vk_wall", "vk_garbage")),
+        rule("vk\.com/.*\?\w(=photo|=wall)", "sm_urls_list", search=True, transform=sub("\?.*", "")),
+        rule("vk\.com/\w+$", search=True, resolve=("vk", "_lookup_vk_canonical", "vk_garbage")),
+        rule("vk\.com/[\w\.]+$", "sm_urls_list", search=True),
+    ]:
+        registry.add_rule(r)
+    return registry
@@ -0,0 +1,359 @@
+import asyncio
+import collections
+import contextlib
+import email.utils
+import re
+import threading
+import time
+
+
+""" matches an optional scheme and optional credentials, capturing the host and port that follow them """
+netloc_re = re.compile("^\s*(?:[a-zA-Z][-+.a-zA-Z0-9]*://)?(?:[^@/?#\s]*@)?([^/?#\s]*)")
+
+
+def host_key(url):
+    """ key the limits of a URL are kept under: its lowercased host and port, without 'www.' """
+    return re.sub("^www\.", "", netloc_re.match(url).group(1).lower().rstrip("."))
+
+
+def parse_retry_after(value):
+    """ returns the seconds asked for by a Retry-After header (a number or an HTTP date), or None """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class host_throttled(Exception):
+    """ raised by fetcher instead of waiting when a request inside fetcher.deferred() is throttled """
+
+    def __init__(self, host):
+        super().__init__(f"{host} is throttling requests")
+        self.host = host
+
+
+class host_bucket:
+    """
+    Token bucket and backoff state of one host.
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.current_rate: requests per second currently allowed. Halved each time the host throttles
+    a request and raised again by a tenth of rate after each success, up to rate.
+
+    self.blocked_until: time.monotonic() before which no request is sent to the host
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.current_rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.failures = 0
+
+    def _refill(self, now):
+        if self.current_rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.current_rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        self._refill(now)
+        wait = self.blocked_until - now
+        if self.current_rate is not None and self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.current_rate)
+        return max(0.0, wait)
+
+    def take(self, now):
+        self._refill(now)
+        if self.current_rate is not None:
+            self.tokens -= 1
+
+
+class rate_limiter:
+    """
+    Per-host request limits shared by every thread using a fetcher.
+
+    Each host has a token bucket: at most burst requests are sent at once, and after that one
+    request every 1 / rate seconds. When a host throttles a request (429 or 5xx), it is given a
+    cooldown, taken from its Retry-After header or growing exponentially with consecutive
+    throttled requests, and its rate is halved. Successful requests bring the rate back up.
+
+    Parameters
+    ----------
+    rate: default requests per second per host. None sends requests as fast as they are made,
+    while still backing off from hosts that throttle.
+
+    burst: number of requests a host can receive at once before rate applies
+
+    host_rates: optional dict mapping a host (e.g. "youtube.com") to its own rate. Applies to its
+    subdomains too.
+
+    backoff_factor: cooldown after the first throttled request, in seconds; doubled for each
+    consecutive one
+
+    max_backoff: longest cooldown, in seconds, including those asked for by Retry-After
+
+    min_rate: lowest rate a host is slowed down to
+    """
+
+    def __init__(self, rate=None, burst=1, host_rates=None, backoff_factor=0.5, max_backoff=60.0, min_rate=0.1):
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = {host_key(host): host_rate for host, host_rate in (host_rates or {}).items()}
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.min_rate = min_rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _rate_for(self, host):
+        name = host.split(":")[0]
+        while True:
+            if name in self.host_rates:
+                return self.host_rates[name]
+            dot = name.find(".")
+            if dot == -1:
+                return self.rate
+            name = name[dot + 1:]
+
+    def _bucket(self, host):
+        if host not in self._buckets:
+            self._buckets[host] = host_bucket(self._rate_for(host), self.burst)
+        return self._buckets[host]
+
+    def wait_time(self, host):
+        """ seconds until a request could be sent to host """
+        with self._lock:
+            return self._bucket(host).wait_time(time.monotonic())
+
+    def acquire(self, host):
+        """ blocks until a request may be sent to host, then takes its token """
+        while True:
+            with self._lock:
+                bucket = self._bucket(host)
+                now = time.monotonic()
+                wait = bucket.wait_time(now)
+                if wait <= 0:
+                    bucket.take(now)
+                    return
+            time.sleep(wait)
+
+    def throttled(self, host, retry_after=None):
+        with self._lock:
+            bucket = self._bucket(host)
+            delay = self.backoff_factor * 2 ** bucket.failures if retry_after is None else retry_after
+            bucket.failures += 1
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + min(delay, self.max_backoff))
+            if bucket.current_rate is not None:
+                bucket.current_rate = max(self.min_rate, bucket.current_rate / 2)
+
+    def succeeded(self, host):
+        with self._lock:
+            bucket = self._bucket(host)
+            bucket.failures = 0
+            if bucket.current_rate is not None and bucket.current_rate < bucket.rate:
+                bucket.current_rate = min(bucket.rate, bucket.current_rate + bucket.rate / 10)
+
+
+class scheduler:
+    """
+    Runs a batch of network jobs so that hosts are interleaved: jobs are taken from the hosts in
+    turn, skipping any host that is cooling down or out of tokens, so a slow or throttling
+    platform does not hold up the others. A job whose request is throttled is put back at the
+    end of its host's queue and retried once the host is ready, up to requeue_limit times; its
+    last attempt waits in place like any other fetcher request.
+
+    Parameters
+    ----------
+    http: the fetcher the jobs make their requests with. Its rate_limiter decides when each host
+    is ready.
+
+    workers: number of threads running jobs. 1 runs them in the calling thread.
+
+    per_host_limit: maximum number of jobs running at once against a single host. None means no
+    cap beyond workers. When http has host_slots() (see fetch.fetcher), the requests jobs make to
+    other hosts, e.g. while following redirects, are held to the same cap.
+
+    requeue_limit: number of times a throttled job is put back in the queue. Defaults to the
+    fetcher's retries.
+    """
+
+    def __init__(self, http, workers=1, per_host_limit=None, requeue_limit=None):
+        self.http = http
+        self.workers = max(1, workers)
+        self.per_host_limit = per_host_limit
+        if requeue_limit is None:
+            requeue_limit = getattr(http, "retries", 2)
+        self.requeue_limit = requeue_limit
+        self.limiter = getattr(http, "limiter", None)
+
+    def _queue(self, jobs):
+        """ returns the jobs queued by host, as an OrderedDict mapping each host to a deque of [key, function, attempts] """
+        pending = collections.OrderedDict()
+        for url, key, function in jobs:
+            pending.setdefault(host_key(url), collections.deque()).append([key, function, 0])
+        return pending
+
+    def _next_job(self, pending, hosts, in_flight):
+        """ takes the next job a host is ready for; returns (host, job), or (None, seconds to wait or None) """
+        shortest_wait = None
+        for _ in range(len(hosts)):
+            host = hosts[0]
+            hosts.rotate(-1)
+            if not pending[host] or (self.per_host_limit is not None and in_flight[host] >= self.per_host_limit):
+                continue
+            wait = self.limiter.wait_time(host) if self.limiter is not None else 0
+            if wait <= 0:
+                in_flight[host] += 1
+                return host, pending[host].popleft()
+            shortest_wait = wait if shortest_wait is None else min(shortest_wait, wait)
+        return None, shortest_wait
+
+    def _host_slots(self):
+        host_slots = getattr(self.http, "host_slots", None)
+        if self.per_host_limit is None or host_slots is None:
+            return contextlib.nullcontext()
+        return host_slots(self.per_host_limit)
+
+    def run(self, jobs):
+        """
+        Runs jobs, an iterable of (url, key, function) tuples, and returns a dict mapping each key
+        to what its function returned. url is only used to find the job's host.
+        """
+        pending = self._queue(jobs)
+        remaining = sum(len(queue) for queue in pending.values())
+        if remaining == 0:
+            return {}
+
+        hosts = collections.deque(pending)
+        in_flight = collections.Counter()
+        results = {}
+        failures = []
+        condition = threading.Condition()
+        deferred = getattr(self.http, "deferred", None)
+
+        def work():
+            nonlocal remaining
+            while True:
+                with condition:
+                    while True:
+                        if remaining == 0 or failures:
+                            condition.notify_all()
+                            return
+                        host, job = self._next_job(pending, hosts, in_flight)
+                        if host is not None:
+                            break
+                        condition.wait(job)
+                key, function, attempts = job
+                try:
+                    if deferred is not None and attempts < self.requeue_limit:
+                        with deferred():
+                            result = function()
+                    else:
+                        result = function()
+                except host_throttled:
+                    with condition:
+                        in_flight[host] -= 1
+                        job[2] += 1
+                        pending[host].append(job)
+                        condition.notify_all()
+                    continue
+                except BaseException as error:
+                    with condition:
+                        failures.append(error)
+                        condition.notify_all()
+                    return
+                with condition:
+                    results[key] = result
+                    in_flight[host] -= 1
+                    remaining -= 1
+                    condition.notify_all()
+
+        with self._host_slots():
+            if self.workers == 1:
+                work()
+            else:
+                threads = [threading.Thread(target=work, daemon=True) for _ in range(min(self.workers, remaining))]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        if failures:
+            raise failures[0]
+        return results
+
+
+class async_scheduler(scheduler):
+    """
+    scheduler for asyncio code: the jobs are run on a pool of workers threads and awaited, so the
+    event loop is never blocked by a request. Hosts are interleaved, paced and retried exactly as
+    by scheduler.
+
+    Cancelling the task awaiting run() stops it from starting further jobs. Requests already in
+    flight can not be interrupted; their threads finish in the background and their results are
+    dropped.
+    """
+
+    async def run(self, jobs):
+        """ same as scheduler.run(), awaited """
+        pending = self._queue(jobs)
+        remaining = sum(len(queue) for queue in pending.values())
+        if remaining == 0:
+            return {}
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        hosts = collections.deque(pending)
+        in_flight = collections.Counter()
+        results = {}
+        running = {}
+        deferred = getattr(self.http, "deferred", None)
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=min(self.workers, remaining))
+
+        def call(function, defer):
+            if defer:
+                with deferred():
+                    return function()
+            return function()
+
+        with self._host_slots():
+            try:
+                while remaining:
+                    wait = None
+                    while len(running) < self.workers:
+                        host, job = self._next_job(pending, hosts, in_flight)
+                        if host is None:
+                            wait = job
+                            break
+                        defer = deferred is not None and job[2] < self.requeue_limit
+                        running[loop.run_in_executor(executor, call, job[1], defer)] = (host, job)
+                    if not running:
+                        # every remaining job is waiting for its host to cool down
+                        await asyncio.sleep(wait or 0)
+                        continue
+                    done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                    for future in done:
+                        host, job = running.pop(future)
+                        in_flight[host] -= 1
+                        try:
+                            result = future.result()
+                        except host_throttled:
+                            job[2] += 1
+                            pending[host].append(job)
+                            continue
+                        results[job[0]] = result
+                        remaining -= 1
+            finally:
+                for future in running:
+                    future.cancel()
+                executor.shutdown(wait=False)
+        return results
@@ -0,0 +1,260 @@
+import re
+
+
+# the pure-string steps of formatter.clean(), used directly by clean() or through route_parallel()
+
+scheme_re = re.compile("https?://(www\.)?")
+# discards non-URLs typical of Telegram URL scrapes
+telegram_noise_re = re.compile("(css|photos|messages|#go_to_message|\)\[\^)")
+mailto_re = re.compile("mailto")
+mobile_prefix_re = re.compile("^(m\.|mobile\.)")
+m_tiktok_re = re.compile("m\.tiktok\.com")
+path_re = re.compile("/.*")
+www_re = re.compile("^www\.")
+
+
+def strip_scheme(link):
+    """ removes the scheme and a following 'www.' from a link """
+    return scheme_re.sub("", link)
+
+
+def route_raw_link(link, sm_filter):
+    """ returns (destination, value) for a link of raw_with_expansion """
+    if telegram_noise_re.match(link):
+        return "non_url_garbage", link
+    elif mailto_re.match(link):
+        return "mail_garbage", link
+    elif sm_filter.match(link):
+        return "sm_with_expansion", link
+    else:
+        return "non_sm_urls_list", path_re.sub("", link)
+
+
+def strip_sm_link(link):
+    """ removes the "m."/"mobile." prefix of a social media link; returns None for m.tiktok links, which are dropped """
+    if m_tiktok_re.match(link):
+        return None
+    return mobile_prefix_re.sub("", link)
+
+
+def normalize_link(link):
+    """ final form of a formatted link: lowercased, leading 'www.' removed """
+    return www_re.sub("", link.lower())
+
+
+# bulk versions of the steps above, for columns of distinct links. The column is joined into one
+# newline-separated string so that scheme and path stripping, lowercasing and "www." removal are
+# each a single regex or str call in C rather than one Python call per link; none of them can
+# match across a newline, so every line comes out as the single-link function would return it.
+
+def join_lines(links):
+    """ returns the links joined by newlines, or None if a link contains a newline itself """
+    text = "\n".join(links)
+    if text.count("\n") != max(len(links) - 1, 0):
+        return None
+    return text
+
+
+def bulk_strip_scheme(links):
+    """ list of strip_scheme() of each link """
+    text = join_lines(links)
+    if text is None or not links:
+        return [strip_scheme(link) for link in links]
+    return scheme_re.sub("", text).split("\n")
+
+
+def bulk_route_raw_link(links, sm_filter):
+    """
+    list of route_raw_link() of each link. Noise, mail and platform prefixes never contain a "/",
+    so a link is routed like its part before the first "/" (its value for non_sm_urls_list), and
+    each distinct part is tested once. Platforms added with a "/" in their prefix fall back to
+    routing link by link.
+    """
+    text = join_lines(links)
+    if text is None or not links or "/" in sm_filter.pattern:
+        return [route_raw_link(link, sm_filter) for link in links]
+    pathless = path_re.sub("", text).split("\n")
+    destinations = {part: route_raw_link(part, sm_filter)[0] for part in set(pathless)}
+    return [
+        (destination, part if destination == "non_sm_urls_list" else link)
+        for destination, link, part in zip(map(destinations.__getitem__, pathless), links, pathless)
+    ]
+
+
+def bulk_normalize_link(links):
+    """ list of normalize_link() of each link """
+    text = join_lines(links)
+    if text is None or not links:
+        return [normalize_link(link) for link in links]
+    # a leading "www." is one that follows a newline
+    return ("\n" + text.lower()).replace("\nwww.", "\n")[1:].split("\n")
+
+
+class shard_routes:
+    """
+    Routing tables produced for a set of distinct links, keyed like the memo dicts of clean().
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.schemeless: link --> strip_scheme() result, for links given with their scheme
+
+    self.routes: link of raw_with_expansion --> route_raw_link() result
+
+    self.stripped: social media link --> strip_sm_link() result
+
+    self.sm_routes: stripped social media link --> platform_registry.route() result. Links routed
+    to "resolve" are left out, because their lookups run in the parent process.
+
+    self.normalized: formatted link --> normalize_link() result
+    """
+
+    def __init__(self):
+        self.schemeless = {}
+        self.routes = {}
+        self.stripped = {}
+        self.sm_routes = {}
+        self.normalized = {}
+
+    def add(self, links, platform_rules, strip_schemes=False):
+        """ fills the tables for a list of distinct links, stripped, routed and normalized in bulk """
+        if strip_schemes:
+            schemeless = bulk_strip_scheme(links)
+            self.schemeless.update(zip(links, schemeless))
+            links = list(dict.fromkeys(schemeless))
+        self.routes.update(zip(links, bulk_route_raw_link(links, platform_rules.filter)))
+        non_sm = []
+        for link in links:
+            destination, value = self.routes[link]
+            if destination == "non_sm_urls_list":
+                non_sm.append(value)
+            elif destination == "sm_with_expansion":
+                stripped = strip_sm_link(link)
+                self.stripped[link] = stripped
+                if stripped is not None:
+                    sm_route = platform_rules.route(stripped)
+                    if sm_route[0] != "resolve":
+                        self.sm_routes[stripped] = sm_route
+                    if sm_route[0] == "sm_urls_list":
+                        self.normalized[sm_route[1]] = normalize_link(sm_route[1])
+        non_sm = list(dict.fromkeys(non_sm))
+        self.normalized.update(zip(non_sm, bulk_normalize_link(non_sm)))
+
+    def update(self, other):
+        self.schemeless.update(other.schemeless)
+        self.routes.update(other.routes)
+        self.stripped.update(other.stripped)
+        self.sm_routes.update(other.sm_routes)
+        self.normalized.update(other.normalized)
+
+
+_worker_rules = None
+_worker_strip_schemes = False
+
+
+def _init_worker(platform_rules, strip_schemes):
+    global _worker_rules, _worker_strip_schemes
+    platform_rules.compile()
+    _worker_rules = platform_rules
+    _worker_strip_schemes = strip_schemes
+
+
+def _route_shard(links):
+    tables = shard_routes()
+    tables.add(links, _worker_rules, _worker_strip_schemes)
+    return tables
+
+
+class shard_pool:
+    """
+    Process pool for route_parallel() that is started once and reused by every call, e.g. by the
+    chunks of format_stream(), instead of a pool being started and torn down for each call.
+    The workers are started on first use. Call close() (or use it as a context manager) when done.
+
+    Parameters
+    ----------
+    processes: number of worker processes
+
+    platform_rules: platform_registry sent to each worker when it starts
+
+    strip_schemes: as in route_parallel(). Calls with other rules or another strip_schemes start
+    their own pool.
+    """
+
+    def __init__(self, processes, platform_rules, strip_schemes=False):
+        self.processes = processes
+        self.platform_rules = platform_rules
+        self.strip_schemes = strip_schemes
+        self._executor = None
+
+    def serves(self, platform_rules, strip_schemes):
+        return platform_rules is self.platform_rules and strip_schemes == self.strip_schemes
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes, initializer=_init_worker, initargs=(self.platform_rules, self.strip_schemes)
+            )
+        return self._executor
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def route_parallel(links, platform_rules, processes, strip_schemes=False, shard_size=None, pool=None):
+    """
+    Routes the distinct links of an iterable across a pool of processes.
+
+    Parameters
+    ----------
+    links: iterable of links from raw_with_expansion; repeats are routed once
+
+    strip_schemes: if True the links still have their scheme, which is removed (and recorded in
+    schemeless) before they are routed
+
+    platform_rules: platform_registry sent to each worker when it starts. Its transforms must be
+    picklable (see platforms.rule).
+
+    processes: number of worker processes
+
+    shard_size: number of links sent to a worker at a time. Defaults to splitting the distinct
+    links into four shards per process, but no fewer than 1000 links per shard.
+
+    pool: optional shard_pool to run the shards on instead of starting a pool for this call
+
+    Returns
+    -------
+    shard_routes merged from every shard. Every link is routed independently, so the tables are
+    the same as those built by a single process.
+    """
+    # imported here so that multiprocessing is only loaded by runs that use it
+    from concurrent.futures import ProcessPoolExecutor
+
+    unique_links = list(dict.fromkeys(links))
+    if shard_size is None:
+        shard_size = max(1000, -(-len(unique_links) // (processes * 4)))
+    shards = [unique_links[i:i + shard_size] for i in range(0, len(unique_links), shard_size)]
+
+    tables = shard_routes()
+    if not shards:
+        return tables
+    if pool is not None and pool.serves(platform_rules, strip_schemes):
+        for shard_tables in pool.executor.map(_route_shard, shards):
+            tables.update(shard_tables)
+        return tables
+    with ProcessPoolExecutor(
+        max_workers=min(processes, len(shards)), initializer=_init_worker, initargs=(platform_rules, strip_schemes)
+    ) as executor:
+        for shard_tables in executor.map(_route_shard, shards):
+            tables.update(shard_tables)
+    return tables
@@ -0,0 +1,89 @@
+import importlib.util
+import itertools
+import operator
+import os
+import re
+import sys
+
+
+""" matches an optional scheme and optional credentials, capturing the host that follows them """
+host_re = re.compile("^\s*(?:[a-zA-Z][-+.a-zA-Z0-9]*://)?(?:[^@/?#\s]*@)?([^/?#:\s]*)")
+trailing_dots_re = re.compile("(?m)\.+$")
+
+
+def url_host(url):
+    """ returns the lowercased host of a URL, with or without a scheme (e.g. 'https://Bit.ly/x' --> 'bit.ly') """
+    return host_re.match(url).group(1).lower().rstrip(".")
+
+
+def url_hosts(urls):
+    """ list of url_host() of each URL; the hosts, which never contain a newline, are lowercased and stripped of dots as one string """
+    if not urls:
+        return []
+    hosts = "\n".join(map(operator.itemgetter(1), map(host_re.match, urls))).lower()
+    if ".\n" in hosts or hosts.endswith("."):
+        hosts = trailing_dots_re.sub("", hosts)
+    return hosts.split("\n")
+
+
+def default_shorteners():
+    """
+    Returns urlexpander's list of URL-shortening domains. The list lives in a module without
+    imports (urlexpander/core/constants.py), which is loaded on its own so that the pandas,
+    requests and tldextract imports of the urlexpander package are not paid for.
+    """
+    if "urlexpander" in sys.modules:
+        return list(sys.modules["urlexpander"].constants.all_short_domains)
+    spec = importlib.util.find_spec("urlexpander")
+    path = None if spec is None else os.path.join(os.path.dirname(spec.origin), "core", "constants.py")
+    if path is None or not os.path.exists(path):
+        import urlexpander
+        return list(urlexpander.constants.all_short_domains)
+    constants = importlib.util.module_from_spec(importlib.util.spec_from_file_location("_urlexpander_constants", path))
+    constants.__loader__.exec_module(constants)
+    return list(constants.all_short_domains)
+
+
+class shortener_index:
+    """
+    Hashed index of URL-shortening domains, built once from a list such as formatter.known_shorteners.
+
+    A link is short if its host, or any domain its host is a subdomain of, is in the index. Testing
+    a link costs one host parse plus a set lookup per label of its host, regardless of how many
+    shortening services are indexed.
+
+    Parameters
+    ----------
+    domains: iterable of shortener domains (e.g. "bit.ly", "youtu.be")
+    """
+
+    def __init__(self, domains):
+        self.domains = frozenset(domain.lower() for domain in domains)
+
+    def is_short_host(self, host):
+        if host in self.domains:
+            return True
+        # walk up the parent domains: 'on.bit.ly' --> 'bit.ly' --> 'ly'
+        dot = host.find(".")
+        while dot != -1:
+            host = host[dot + 1:]
+            if host in self.domains:
+                return True
+            dot = host.find(".")
+        return False
+
+    def is_short(self, link):
+        return self.is_short_host(url_host(link))
+
+    def short_links(self, links):
+        """ set of the links that are short; the hosts are parsed in bulk and each distinct host is looked up once """
+        links = list(dict.fromkeys(links))
+        hosts = url_hosts(links)
+        short_hosts = {host: self.is_short_host(host) for host in set(hosts)}
+        return set(itertools.compress(links, map(short_hosts.__getitem__, hosts)))
+
+    def __contains__(self, link):
+        return self.is_short(link)
+
+    def __len__(self):
+        return len(self.domains)
@@ -0,0 +1,118 @@
+import bisect
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+""" upper bounds, in milliseconds, of the latency histogram buckets """
+latency_buckets_ms = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+
+def no_lap(name):
+    """ stopwatch used when a formatter has no run_stats """
+
+
+class timing:
+    """ calls, total seconds, bytes received, errors and latency histogram of one stage or platform """
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes = 0
+        self.errors = 0
+        self.histogram = [0] * len(latency_buckets_ms)
+
+    def add(self, seconds, received=0, error=False):
+        self.calls += 1
+        self.seconds += seconds
+        self.bytes += received
+        self.errors += error
+        self.histogram[bisect.bisect_left(latency_buckets_ms, seconds * 1000)] += 1
+
+
+class run_stats:
+    """
+    Timings of formatter runs: wall time and calls of each stage of __init__, unshorten() and
+    clean(), and for each platform the network lookups made (calls, time, bytes received,
+    errors and a latency histogram). One object can be shared by several formatter objects,
+    e.g. the chunks of a stream, to accumulate their timings.
+
+    Each measurement is also passed, as a dict, to every hook and logged at DEBUG level on the
+    "urlFormatter.stats" logger, for metrics systems. Stage events look like {"event": "stage",
+    "name": "clean.lookups", "seconds": 1.5}, lookup events like {"event": "request", "name":
+    "rumble", "url": ..., "seconds": 0.2, "bytes": 15000, "error": False}.
+
+    Parameters
+    ----------
+    hooks: optional list of functions called with each event dict. They may be called from
+    worker threads.
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.stages: dict mapping a stage name such as "unshorten.requests" to its timing
+
+    self.platforms: dict mapping a platform (the namespace of its lookups, e.g. "unshorten",
+    "rumble" or "youtube_watch") to the timing of its network lookups
+    """
+
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or [])
+        self.stages = {}
+        self.platforms = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def _emit(self, event):
+        for hook in self.hooks:
+            hook(event)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s", event)
+
+    def stage(self, name, seconds):
+        with self._lock:
+            self.stages.setdefault(name, timing()).add(seconds)
+        self._emit({"event": "stage", "name": name, "seconds": seconds})
+
+    def request(self, platform, url, seconds, received=0, error=False):
+        with self._lock:
+            self.platforms.setdefault(platform, timing()).add(seconds, received, error)
+        self._emit({"event": "request", "name": platform, "url": url, "seconds": seconds, "bytes": received, "error": error})
+
+    def stopwatch(self, prefix):
+        """
+        returns lap(name): each call records the time since the previous call, or since
+        stopwatch() for the first one, as the stage prefix.name
+        """
+        last = [time.perf_counter()]
+
+        def lap(name):
+            now = time.perf_counter()
+            self.stage(prefix + "." + name, now - last[0])
+            last[0] = now
+
+        return lap
+
+    def to_df(self):
+        """ dataframe with one row per stage and per platform """
+        import pandas as pd
+
+        rows = []
+        for kind, timings in [("stage", self.stages), ("platform", self.platforms)]:
+            for name, entry in timings.items():
+                mean_ms = entry.seconds / entry.calls * 1000 if entry.calls else 0.0
+                rows.append((kind, name, entry.calls, entry.seconds, mean_ms, entry.bytes, entry.errors))
+        return pd.DataFrame(rows, columns=["kind", "name", "calls", "seconds", "mean_ms", "bytes", "errors"])
+
+    def latency_df(self):
+        """ dataframe of the latency histogram of each platform, one column per bucket """
+        import pandas as pd
+
+        columns = ["<={0:g}ms".format(bound) if bound != float("inf") else ">{0:g}ms".format(latency_buckets_ms[-2])
+                   for bound in latency_buckets_ms]
+        return pd.DataFrame(
+            [entry.histogram for entry in self.platforms.values()], index=list(self.platforms), columns=columns
+        )
@@ -0,0 +1,214 @@
+import heapq
+import itertools
+import os
+import tempfile
+
+from .shard import shard_pool
+
+
+def chunked(links, chunk_size):
+    """ yields lists of up to chunk_size links from any iterable, without reading it all into memory """
+    links = iter(links)
+    while True:
+        chunk = list(itertools.islice(links, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class stream_summary:
+    """
+    Running totals for a streamed run, aggregated chunk by chunk so that no per-link lists have
+    to be kept. Mirrors the metrics printed by formatter.clean() and formatter.unshorten().
+
+    Additional Info for Select Attributes
+    -------------------------------------
+    self.garbage_counts: dict mapping each garbage_df type to its number of lines
+
+    self.error_counts: dict mapping each platform to the number of errors it produced
+    """
+
+    def __init__(self):
+        self.chunks = 0
+        self.lines = 0
+        self.formatted = 0
+        self.discarded = 0
+        self.final_sm_garbage = 0
+        self.shortened = 0
+        self.unshortened = 0
+        self.garbage_counts = {}
+        self.error_counts = {}
+
+    def add(self, formatter_obj):
+        """ adds the results of a formatter object that has processed one chunk """
+        self.chunks += 1
+        self.lines += len(formatter_obj.raw_links)
+        self.shortened += len(formatter_obj.shortened_urls_list)
+        if formatter_obj.unshorten_executed:
+            self.unshortened += len(formatter_obj.expanded_urls_list)
+            self._count_errors(formatter_obj.unshorten_errors)
+        if formatter_obj.clean_executed:
+            if formatter_obj.link_counts is not None:
+                self.formatted += formatter_obj.link_counts.total
+            else:
+                self.formatted += len(formatter_obj.formatted_links)
+            self.discarded += formatter_obj.final_difference
+            self.final_sm_garbage += len(formatter_obj.final_sm_garbage)
+            for garbage_type, count in formatter_obj.garbage_counts:
+                self.garbage_counts[garbage_type] = self.garbage_counts.get(garbage_type, 0) + count
+            self._count_errors(formatter_obj.clean_errors)
+
+    def _count_errors(self, log):
+        for platform in log.platforms:
+            self.error_counts[platform] = self.error_counts.get(platform, 0) + 1
+
+    def report(self):
+        """ prints the same metrics as formatter.clean(), for the whole stream """
+        print(f"\n{self.lines} lines were processed in {self.chunks} chunks.")
+        if self.unshortened or "shortened_url" in self.error_counts:
+            print(f"\n{self.shortened} shortened URLs were detected, of which {self.unshortened} were successfully unshortened.")
+        if not self.garbage_counts:
+            return
+        total = self.formatted + self.final_sm_garbage
+        share = round(self.final_sm_garbage / total * 100, 2) if total else 0.0
+        print(
+            f"\n\n{self.formatted} URLs in total were successfully cleaned."
+            + "\n\n"
+            + f"{self.final_sm_garbage} URLs are included in final_sm_garbage, which is "
+            + f"{share}% of formatted_links + final_sm_garbage."
+            + "\n\n"
+            + f"{self.discarded} lines in total were discarded in the cleaning process, "
+            + f"of which {self.garbage_counts.get('non_url_garbage', 0)} were non-URLs."
+            + "\n\n"
+            + f"{sum(self.error_counts.values())} errors were produced."
+        )
+        counts = sorted(self.garbage_counts.items(), key=lambda item: item[1], reverse=True)
+        print("\nThe number of lines included in each garbage bin are:\n")
+        for garbage_type, count in counts:
+            print(f" {garbage_type:>16} {count:>6}")
+        print()
+
+
+def format_stream(
+    links, chunk_size=10000, unshorten=False, clean=True, summary=None, unshorten_kwargs=None, clean_kwargs=None,
+    start=0, checkpoint=None, counts=None, on_chunk=None, **kwargs
+):
+    """
+    Streaming counterpart of formatter: takes any iterable of raw links (e.g. an open file) and
+    yields processed links chunk by chunk, so memory use depends on chunk_size rather than on the
+    size of the input.
+
+    Each chunk is processed by its own formatter object. The HTTP session, resolution cache,
+    lookup cache, journal and run_stats of the first chunk are reused by the following ones.
+    Because each link is processed independently, the links yielded over the whole stream are the
+    same as formatted_links of a single formatter run over the whole input, except that they are
+    sorted within each chunk rather than overall (see external_sort()).
+
+    Parameters
+    ----------
+    links: iterable of raw links
+
+    chunk_size: number of links processed at a time
+
+    unshorten: run formatter.unshorten() on each chunk
+
+    clean: run formatter.clean() on each chunk. If False, the output of unshorten() is yielded.
+
+    summary: optional stream_summary that is updated after every chunk; call its report() method
+    after the stream is exhausted to print the metrics for the whole run
+
+    unshorten_kwargs: optional dict of arguments for formatter.unshorten() (workers, timeout, etc.)
+
+    clean_kwargs: optional dict of arguments for formatter.clean() (e.g. processes). With
+    processes > 1 the chunks share one process pool (see shard.shard_pool), closed with the stream.
+
+    start: number of links at the beginning of links to skip, e.g. the offset checkpointed by an
+    interrupted run that is being resumed
+
+    checkpoint: optional function called after each chunk with the number of input links processed
+    so far (counting the skipped ones). It is called once every link of the chunk has been taken from
+    the generator, so anything the caller did with them (e.g. writing them out) is complete.
+
+    counts: optional counts.link_counts. Each chunk is then cleaned with clean(counts=True) and
+    its counts are added to this object instead of its links being yielded, so that neither the
+    links nor their sort are kept.
+
+    on_chunk: optional function called with the formatter object of each chunk once it has been
+    processed, before its links are yielded (e.g. to write its links_df)
+
+    **kwargs: passed to formatter (http, cache, lookup_cache, journal, stats, platforms, error_sink)
+
+    Returns
+    -------
+    generator of processed links, which yields none when counts is given
+    """
+    from . import formatter
+
+    offset = start
+    links = itertools.islice(links, start, None)
+    # with processes > 1 the chunks share one process pool, started with the first chunk
+    processes = (clean_kwargs or {}).get("processes", 1) if clean else 1
+    pool = None
+    try:
+        for chunk in chunked((link.replace("\n", "") for link in links), chunk_size):
+            formatter_obj = formatter(chunk, **kwargs)
+            kwargs["cache"] = formatter_obj.cache
+            kwargs["lookup_cache"] = formatter_obj.lookup_cache
+            kwargs["platforms"] = formatter_obj.platform_rules
+            kwargs["error_sink"] = formatter_obj.error_sink
+            if processes > 1 and pool is None:
+                pool = shard_pool(processes, formatter_obj.platform_rules, strip_schemes=not unshorten)
+            formatter_obj.shard_pool = pool
+
+            results = []
+            if unshorten:
+                results = formatter_obj.unshorten(verbose=False, **(unshorten_kwargs or {}))
+            if clean and counts is not None:
+                counts.update(formatter_obj.clean(verbose=False, counts=True, **(clean_kwargs or {})))
+                results = []
+            elif clean:
+                results = formatter_obj.clean(verbose=False, **(clean_kwargs or {}))
+            if summary is not None:
+                summary.add(formatter_obj)
+            if on_chunk is not None:
+                on_chunk(formatter_obj)
+            # the fetcher is only created once a chunk makes a request; later chunks reuse it
+            kwargs["http"] = formatter_obj._http
+            kwargs["journal"] = formatter_obj.journal
+            kwargs["stats"] = formatter_obj.stats
+            yield from results
+            offset += len(chunk)
+            if checkpoint is not None:
+                checkpoint(offset)
+    finally:
+        if pool is not None:
+            pool.close()
+
+
+def external_sort(in_path, out_path, chunk_size=1000000, opener=None):
+    """
+    Sorts a newline-separated file that may not fit in memory: sorted runs of chunk_size lines
+    are written to temporary files and then merged into out_path. opener, if given, is called with
+    out_path to open it for writing (e.g. files.open_output, for compressed files or stdout).
+    """
+    run_paths = []
+    try:
+        with open(in_path, "r") as file:
+            for chunk in chunked(file, chunk_size):
+                chunk = [line if line.endswith("\n") else line + "\n" for line in chunk]
+                chunk.sort()
+                fd, run_path = tempfile.mkstemp(suffix=".run", dir=os.path.dirname(os.path.abspath(out_path)))
+                with os.fdopen(fd, "w") as run_file:
+                    run_file.writelines(chunk)
+                run_paths.append(run_path)
+
+        run_files = [open(run_path, "r") for run_path in run_paths]
+        try:
+            with (open(out_path, "w") if opener is None else opener(out_path)) as file:
+                file.writelines(heapq.merge(*run_files))
+        finally:
+            for run_file in run_files:
+                run_file.close()
+    finally:
+        for run_path in run_paths:
+            os.remove(run_path)
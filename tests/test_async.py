@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""Tests for `formatter.aunshorten()`, `aclean()` and `aadd()` against the local fake server."""
+
+
+import asyncio
+import unittest
+
+import urlFormatter
+from urlFormatter.benchmarks.fake_server import fake_server, route_to
+from urlFormatter.benchmarks.suite import corpus
+from urlFormatter.fetch import fetcher
+
+
+class TestAsync(unittest.TestCase):
+    """The asyncio methods give the results of their synchronous counterparts."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.server = fake_server()
+        self.links = corpus(400, seed=1)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.server.close()
+
+    def formatter(self, links):
+        http = fetcher(retries=0)
+        route_to(http, self.server.url)
+        return urlFormatter.formatter(links, http=http)
+
+    def assertSameResults(self, first, second):
+        for name in ["expanded_urls_list", "shortened_urls_garbage", "raw_with_expansion", "formatted_links",
+                     "final_sm_garbage", "garbage_counts"] + list(first.builtin_garbage_bins):
+            self.assertEqual(getattr(first, name), getattr(second, name), name)
+        for name in ["unshorten_errors_df", "clean_errors_df"]:
+            self.assertTrue(getattr(first, name).astype(str).equals(getattr(second, name).astype(str)), name)
+
+    def test_000_same_as_sync(self):
+        """aunshorten() and aclean() produce the lists, garbage bins and errors of unshorten() and clean()."""
+        sync = self.formatter(self.links)
+        sync.unshorten(verbose=False)
+        links = sync.clean(verbose=False)
+
+        async def run():
+            formatter_obj = self.formatter(self.links)
+            await formatter_obj.aunshorten(concurrency=8, verbose=False)
+            self.assertEqual(await formatter_obj.aclean(concurrency=8, verbose=False), links)
+            return formatter_obj
+
+        self.assertSameResults(asyncio.run(run()), sync)
+
+    def test_001_aadd(self):
+        """aadd() merges new links as add() does."""
+        sync = self.formatter(self.links[:250])
+        sync.unshorten(verbose=False)
+        sync.clean(verbose=False)
+        sync.add(self.links[250:])
+
+        async def run():
+            formatter_obj = self.formatter(self.links[:250])
+            await formatter_obj.aunshorten(verbose=False)
+            await formatter_obj.aclean(verbose=False)
+            await formatter_obj.aadd(self.links[250:], concurrency=8)
+            return formatter_obj
+
+        self.assertSameResults(asyncio.run(run()), sync)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""Tests for the resolution cache in `urlFormatter.cache`."""
+
+
+import os
+import tempfile
+import time
+import unittest
+
+from urlFormatter.cache import normalize_url, resolution_cache
+
+
+class TestResolutionCache(unittest.TestCase):
+    """Tests for `resolution_cache`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite")
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.tmpdir.cleanup()
+
+    def test_000_normalize_url(self):
+        """Scheme, 'www.' and trailing slashes do not change the key; path case does."""
+        self.assertEqual(normalize_url("https://www.Bit.ly/AbC/"), "bit.ly/AbC")
+        self.assertEqual(normalize_url("bit.ly/AbC"), "bit.ly/AbC")
+        self.assertNotEqual(normalize_url("bit.ly/abc"), "bit.ly/AbC")
+
+    def test_001_persists_between_instances(self):
+        """Entries written by one run are read back by the next."""
+        cache = resolution_cache(self.path)
+        self.assertIsNone(cache.get("unshorten", "bit.ly/x"))
+        cache.set("unshorten", "https://bit.ly/x", "nytimes.com/story")
+        cache.set_failure("rumble", "rumble.com/v1", "timed out")
+        cache.close()
+
+        cache = resolution_cache(self.path)
+        self.assertEqual(cache.get("unshorten", "bit.ly/x"), (True, "nytimes.com/story"))
+        self.assertEqual(cache.get("rumble", "rumble.com/v1"), (False, "timed out"))
+        self.assertIsNone(cache.get("gettr", "rumble.com/v1"))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        cache.close()
+
+    def test_002_negative_ttl(self):
+        """Failures expire after negative_ttl while resolved links are kept."""
+        cache = resolution_cache(self.path, negative_ttl=0)
+        cache.set("unshorten", "bit.ly/ok", "example.org")
+        cache.set_failure("unshorten", "bit.ly/dead")
+        time.sleep(0.01)
+        self.assertEqual(cache.get("unshorten", "bit.ly/ok"), (True, "example.org"))
+        self.assertIsNone(cache.get("unshorten", "bit.ly/dead"))
+        cache.close()
+
+    def test_003_eviction(self):
+        """The least recently used entries are evicted beyond max_entries."""
+        cache = resolution_cache(self.path, max_entries=10)
+        for i in range(25):
+            cache.set("unshorten", f"bit.ly/{i}", "example.org")
+        cache.flush()
+        self.assertEqual(len(cache), 10)
+        self.assertIsNone(cache.get("unshorten", "bit.ly/0"))
+        self.assertIsNotNone(cache.get("unshorten", "bit.ly/24"))
+        cache.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.compact` and `formatter.compact()`."""
+
+
+import unittest
+
+import urlFormatter
+from urlFormatter.compact import string_table
+
+LINKS = [
+    "https://www.nytimes.com/2023/01/01/story.html", "http://nytimes.com/b", "css-abc", "mailto:bob@x.com",
+    "instagram.com/p/abc", "instagram.com/someone/", "https://twitter.com/jack/status/20", "twitter.com/jack",
+    "t.me/channel/123", "bit.ly/abc", "Example.ORG/x", "t.me/channel/124", "css-abc",
+]
+
+
+class TestCompact(unittest.TestCase):
+    """Tests for `string_table` and `formatter.compact()`."""
+
+    def test_000_string_table(self):
+        """Equal strings share one entry and come back in order."""
+        table = string_table()
+        first = table.encode(["a", "b", "a"])
+        second = table.encode(["b" * 2, "".join(["b", "b"]), "a"])
+        table.freeze()
+        self.assertEqual(len(table), 3)
+        self.assertEqual(list(first) + list(second), [0, 1, 0, 2, 2, 0])
+        self.assertEqual(table.decode(second), ["bb", "bb", "a"])
+
+    def test_001_same_lists(self):
+        """The lists read back after compact() are those clean() built, and add() still works."""
+        formatter_obj = urlFormatter.formatter(LINKS)
+        formatter_obj.clean(verbose=False)
+        names = ["raw_links", "formatted_links", "final_sm_garbage", "sm_urls_list", "non_url_garbage", "ig_garbage"]
+        before = {name: list(getattr(formatter_obj, name)) for name in names}
+        links_df = formatter_obj.links_df
+
+        formatter_obj.compact()
+        self.assertNotIn("formatted_links", vars(formatter_obj))
+        self.assertEqual({name: getattr(formatter_obj, name) for name in names}, before)
+        self.assertTrue(formatter_obj.links_df.equals(links_df))
+
+        formatter_obj.add(["nytimes.com/c"])
+        self.assertEqual(formatter_obj.formatted_links.count("nytimes.com"), 3)
+        self.assertEqual(formatter_obj.raw_links, LINKS + ["nytimes.com/c"])
+
+    def test_002_drop_intermediates(self):
+        """Dropped lists are gone, final ones are kept, and the object can no longer be run."""
+        formatter_obj = urlFormatter.formatter(LINKS)
+        formatted_links = formatter_obj.clean(verbose=False)
+        formatter_obj.compact(drop_intermediates=True)
+        self.assertEqual(formatter_obj.formatted_links, formatted_links)
+        with self.assertRaises(AttributeError):
+            formatter_obj.sm_with_expansion
+        with self.assertRaises(ValueError):
+            formatter_obj.clean(verbose=False)
+        with self.assertRaises(AttributeError):
+            formatter_obj.no_such_attribute
+
+
+    def test_003_property_errors(self):
+        """An AttributeError raised inside a property names what is missing, not the property."""
+        formatter_obj = urlFormatter.formatter(LINKS)
+        with self.assertRaises(AttributeError) as raised:
+            formatter_obj.links_df
+        self.assertNotIn("links_df", str(raised.exception))
+        formatter_obj.clean(verbose=False)
+        formatter_obj.compact()
+        self.assertEqual(len(formatter_obj.links_df), len(LINKS))
+
+if __name__ == "__main__":
+    unittest.main()
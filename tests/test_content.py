@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.content`."""
+
+
+import os
+import tempfile
+import unittest
+
+import urlFormatter
+from urlFormatter.benchmarks.fake_server import fake_server, route_to
+from urlFormatter.cache import resolution_cache
+from urlFormatter.content import content_cache, content_key
+from urlFormatter.fetch import fetcher
+from urlFormatter.stream import format_stream
+
+VARIANTS = [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s",
+    "youtube.com/watch?feature=share&v=dQw4w9WgXcQ",
+    "https://m.youtube.com/live/dQw4w9WgXcQ?si=abc",
+]
+
+
+class TestContent(unittest.TestCase):
+    """Tests for `content_key` and `content_cache`."""
+
+    def test_000_content_key(self):
+        """Links to the same content have the same key; links without a content ID are their own key."""
+        for platform, links, key in [
+            ("youtube_watch", [
+                "youtube.com/watch?v=dQw4w9WgXcQ&t=42s", "youtube.com/watch?feature=share&v=dQw4w9WgXcQ",
+                "youtube.com/live/dQw4w9WgXcQ?si=abc",
+            ], "youtube.com/watch?v=dQw4w9WgXcQ"),
+            ("rumble", ["rumble.com/v4abc12-some-title.html", "rumble.com/v4abc12/?pub=x"], "rumble.com/v4abc12"),
+            ("gettr", ["gettr.com/post/p2abc", "gettr.com/post/p2abc?ref=x"], "gettr.com/post/p2abc"),
+            ("bitchute", ["bitchute.com/video/AbC-1/", "bitchute.com/embed/AbC-1"], "bitchute.com/video/AbC-1"),
+            ("odysee", ["odysee.com/title:3", "odysee.com/title:3/?r=x"], "odysee.com/title:3"),
+            ("vk", ["vk.com/video-1_2?list=x", "vk.com/video?z=video-1_2"], "vk.com/video-1_2"),
+            ("vk", ["vk.com/somebody"], "vk.com/somebody"),
+        ]:
+            for link in links:
+                self.assertEqual(content_key(platform, link), key, link)
+        # embed IDs are not video page IDs, so embed links are only shared with the same link
+        self.assertEqual(content_key("rumble", "rumble.com/embed/v4abc12/?pub=x"), "rumble.com/embed/v4abc12/?pub=x")
+        self.assertNotEqual(content_key("youtube_watch", "youtube.com/watch?v=dQw4w9WgXcq"), content_key(
+            "youtube_watch", "youtube.com/watch?v=dQw4w9WgXcQ"))
+
+    def test_001_lru_and_store(self):
+        """The least recently used outcomes are evicted, and the store keeps them between runs."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "content.sqlite")
+            cache = content_cache(max_entries=2, store=path)
+            cache.set("rumble", "rumble.com/v1", "rumble.com/c/a")
+            cache.set_failure("rumble", "rumble.com/v2", ValueError("timed out"))
+            cache.get("rumble", "rumble.com/v1")
+            cache.set("gettr", "gettr.com/post/x", "gettr.com/user/x")
+            self.assertEqual(len(cache), 2)
+            self.assertEqual(list(cache._entries), [("rumble", "rumble.com/v1"), ("gettr", "gettr.com/post/x")])
+            cache.close()
+
+            cache = content_cache(store=path)
+            self.assertEqual(cache.get("rumble", "rumble.com/v2"), (False, "timed out"))
+            self.assertEqual(cache.get("gettr", "gettr.com/post/x"), (True, "gettr.com/user/x"))
+            self.assertIsNone(cache.get("gettr", "gettr.com/post/y"))
+            self.assertEqual((cache.hits, cache.misses), (2, 1))
+            cache.close()
+
+    def test_002_errors_not_kept_in_memory(self):
+        """Pages without the account are kept in the LRU; errors are not, so they are retried."""
+        cache = content_cache()
+        cache.set_failure("rumble", "rumble.com/v1")
+        cache.set_failure("rumble", "rumble.com/v2", TimeoutError("timed out"))
+        self.assertEqual(cache.get("rumble", "rumble.com/v1"), (False, None))
+        self.assertIsNone(cache.get("rumble", "rumble.com/v2"))
+
+        class flaky_http:
+            calls = 0
+
+            def get(self, url, **kwargs):
+                flaky_http.calls += 1
+                raise TimeoutError("timed out")
+
+        formatter_obj = urlFormatter.formatter(VARIANTS[:1], http=flaky_http(), lookup_cache=cache)
+        formatter_obj.clean(verbose=False)
+        formatter_obj.clean(verbose=False)
+        self.assertEqual(flaky_http.calls, 2)
+        self.assertEqual(len(formatter_obj.clean_errors_df), 1)
+
+    def test_003_recalled_outcomes_not_persisted(self):
+        """Outcomes recalled from the resolution cache are not written back to the store, which would restart their TTL."""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = resolution_cache(os.path.join(directory, "cache.sqlite"))
+            cache.set_failure("youtube_watch", VARIANTS[0], TimeoutError("timed out"))
+            cache.set("youtube_watch", "youtube.com/watch?v=aaaaaaaaaaa", "youtube.com/@someone")
+            store = resolution_cache(os.path.join(directory, "lookups.sqlite"))
+
+            formatter_obj = urlFormatter.formatter(
+                [VARIANTS[0], "youtube.com/watch?v=aaaaaaaaaaa"], cache=cache, lookup_cache=content_cache(store=store),
+            )
+            formatter_obj.clean(verbose=False)
+            self.assertEqual(formatter_obj.sm_urls_list, ["youtube.com/@someone"])
+            self.assertEqual(len(formatter_obj.clean_errors), 1)
+            self.assertIsNone(store.get("youtube_watch", "youtube.com/watch?v=dQw4w9WgXcQ"))
+            self.assertIsNone(store.get("youtube_watch", "youtube.com/watch?v=aaaaaaaaaaa"))
+            cache.close()
+            store.close()
+
+    def test_004_formatter_looks_up_content_once(self):
+        """Query-string variants of a video cost one request, within a run and across the chunks of a stream."""
+        server = fake_server()
+        try:
+            http = fetcher()
+            route_to(http, server.url)
+            formatter_obj = urlFormatter.formatter(VARIANTS, http=http)
+            formatted_links = formatter_obj.clean(verbose=False)
+            self.assertEqual(len(formatted_links), 3)
+            self.assertEqual(len(set(formatted_links)), 1)
+            self.assertEqual(server.hits["youtube.com"], 1)
+
+            links = list(format_stream(VARIANTS * 2, chunk_size=1, http=http))
+            self.assertEqual(len(set(links)), 1)
+            self.assertEqual(server.hits["youtube.com"], 2)
+        finally:
+            server.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
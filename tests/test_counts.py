@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.counts` and `formatter.clean(counts=True)`."""
+
+
+import collections
+import os
+import shutil
+import tempfile
+import unittest
+
+import urlFormatter
+from urlFormatter.counts import link_counts
+from urlFormatter.stream import format_stream
+
+LINKS = [
+    "https://www.nytimes.com/2023/01/01/story.html", "http://nytimes.com/b", "css-abc", "mailto:bob@x.com",
+    "instagram.com/p/abc", "instagram.com/someone/", "https://twitter.com/jack/status/20", "twitter.com/jack",
+    "https://twitter.com/Jack/status/21", "t.me/channel/123", "bit.ly/abc", "Example.ORG/x", "t.me/channel/124",
+]
+
+
+class TestLinkCounts(unittest.TestCase):
+    """Tests for `link_counts`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.directory)
+
+    def test_000_same_as_formatted_links(self):
+        """Counting gives the frequencies of formatted_links, and the same metrics, without the list."""
+        full = urlFormatter.formatter(LINKS)
+        formatted_links = full.clean(verbose=False)
+        counted = urlFormatter.formatter(LINKS)
+        counts = counted.clean(verbose=False, counts=True)
+
+        self.assertIsNone(counted.formatted_links)
+        self.assertIs(counts, counted.link_counts)
+        self.assertEqual(counts.links, collections.Counter(formatted_links))
+        self.assertEqual(counts.total, len(formatted_links))
+        self.assertEqual(counts.top(2), [("twitter.com/jack", 3), ("nytimes.com", 2)])
+        self.assertEqual(counts.top(1, by="domain"), [("twitter.com", 3)])
+        self.assertEqual(counted.final_difference, full.final_difference)
+        self.assertEqual(counted.garbage_counts, full.garbage_counts)
+
+        counted.add(LINKS[:3])
+        self.assertEqual(counted.link_counts.links["nytimes.com"], 4)
+        self.assertEqual(counted.link_counts.total, len(formatted_links) + 2)
+
+    def test_001_stream_and_write(self):
+        """Counts of a stream add up over its chunks and are written as CSV."""
+        counts = link_counts()
+        self.assertEqual(list(format_stream(LINKS, chunk_size=4, counts=counts)), [])
+        self.assertEqual(counts.links, collections.Counter(urlFormatter.formatter(LINKS).clean(verbose=False)))
+
+        path = os.path.join(self.directory, "domains.csv")
+        counts.write(path, n=2, by="domain")
+        with open(path) as file:
+            self.assertEqual(file.read().splitlines(), ["domain,count", "twitter.com,3", "nytimes.com,2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
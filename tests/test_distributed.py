@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.distributed`."""
+
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import urlFormatter
+from urlFormatter.benchmarks.fake_server import fake_server, route_to
+from urlFormatter.benchmarks.suite import corpus
+from urlFormatter.distributed import coordinator, sqlite_queue, worker
+from urlFormatter.fetch import fetcher
+
+
+class TestDistributed(unittest.TestCase):
+    """Tests for `sqlite_queue`, `worker` and `coordinator`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "queue.sqlite")
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.directory.cleanup()
+
+    def test_000_lease_expiry(self):
+        """A task whose worker stops answering is claimed again, and marked failed after max_attempts."""
+        queue = sqlite_queue(self.path, lease=0.1, max_attempts=2)
+        batch = queue.put("unshorten", [{"links": ["bit.ly/a"]}])
+        task_id, phase, payload = queue.claim("dead")
+        self.assertEqual((phase, payload), ("unshorten", {"links": ["bit.ly/a"]}))
+        self.assertIsNone(queue.claim("other"))
+        time.sleep(0.2)
+
+        self.assertEqual(queue.claim("other")[0], task_id)
+        time.sleep(0.2)
+        self.assertIsNone(queue.claim("third"))
+        self.assertEqual(queue.counts(batch), {"pending": 0, "claimed": 0, "done": 0, "failed": 1})
+
+        batch = queue.put("clean", [{"links": ["x"]}])
+        task_id = queue.claim("w")[0]
+        queue.complete(task_id, [["rumble", "x", None, "timed out"]])
+        self.assertEqual(list(queue.results(batch)), [[["rumble", "x", None, "timed out"]]])
+        self.assertFalse(queue.closed())
+        queue.close_queue()
+        self.assertTrue(queue.closed())
+        queue.close()
+
+    def test_001_batches(self):
+        """A reused queue only reports the tasks of the current batch, and put() reopens a closed queue."""
+        queue = sqlite_queue(self.path)
+        old = queue.put("clean", [{"links": ["a"]}, {"links": ["b"]}])
+        queue.complete(queue.claim("w")[0], [["rumble", "a", "rumble.com/c/old", None]])
+        queue.fail(queue.claim("w")[0])
+        queue.cancel(old)
+        queue.close_queue()
+
+        batch = queue.put("clean", [{"links": ["c"]}])
+        self.assertFalse(queue.closed())
+        self.assertEqual(queue.counts(batch), {"pending": 1, "claimed": 0, "done": 0, "failed": 0})
+        queue.complete(queue.claim("w")[0], [["rumble", "c", "rumble.com/c/new", None]])
+        self.assertEqual(list(queue.results(batch)), [[["rumble", "c", "rumble.com/c/new", None]]])
+        self.assertEqual(queue.counts(old), {"pending": 0, "claimed": 0, "done": 1, "failed": 1})
+        queue.close()
+
+    def test_002_timeout_without_workers(self):
+        """With no worker running, the coordinator stops waiting after timeout and resolves the links itself."""
+        links = corpus(100)
+        server = fake_server()
+        try:
+            http = fetcher(retries=0)
+            route_to(http, server.url)
+            single = urlFormatter.formatter(links, http=http)
+            single.unshorten(verbose=False)
+            single.clean(verbose=False)
+
+            http = fetcher(retries=0)
+            route_to(http, server.url)
+            formatter_obj = urlFormatter.formatter(links, http=http)
+            runner = coordinator(self.path, task_size=40, poll=0.05, timeout=0.2)
+            runner.run(formatter_obj, verbose=False)
+        finally:
+            server.close()
+        self.assertGreater(runner.failed, 0)
+        self.assertEqual(formatter_obj.formatted_links, single.formatted_links)
+        self.assertEqual(formatter_obj.garbage_counts, single.garbage_counts)
+
+    def test_003_same_output_as_one_node(self):
+        """Workers resolve the requests, and the coordinator ends with the lists of a single-node run."""
+        links = corpus(300)
+        server = fake_server()
+        try:
+            http = fetcher(retries=0)
+            route_to(http, server.url)
+            single = urlFormatter.formatter(links, http=http)
+            single.unshorten(verbose=False)
+            single.clean(verbose=False)
+
+            workers = []
+            for i in range(2):
+                http = fetcher(retries=0)
+                route_to(http, server.url)
+                workers.append(worker(self.path, worker_id="w%d" % i, poll=0.05, http=http))
+            threads = [threading.Thread(target=w.run) for w in workers]
+            hits = sum(server.hits.values())
+
+            http = fetcher(retries=0)
+            route_to(http, server.url)
+            formatter_obj = urlFormatter.formatter(links, http=http)
+            for thread in threads:
+                thread.start()
+            coordinator(self.path, task_size=40, poll=0.05).run(formatter_obj, verbose=False)
+            for thread in threads:
+                thread.join()
+        finally:
+            server.close()
+
+        self.assertGreater(sum(server.hits.values()), hits)
+        self.assertGreater(sum(w.tasks for w in workers), 2)
+        self.assertEqual(formatter_obj.formatted_links, single.formatted_links)
+        self.assertEqual(formatter_obj.final_sm_garbage, single.final_sm_garbage)
+        self.assertEqual(formatter_obj.garbage_counts, single.garbage_counts)
+        self.assertEqual(list(formatter_obj.clean_errors_df["url"]), list(single.clean_errors_df["url"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
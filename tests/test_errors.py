@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.errors`."""
+
+
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from urlFormatter.errors import error_log, error_sink
+
+
+class TestErrors(unittest.TestCase):
+    """Tests for `error_log` and `error_sink`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.directory.cleanup()
+
+    def test_000_log(self):
+        """Records are appended in order, and the cached DataFrame is rebuilt after a change."""
+        log = error_log()
+        log.append("bit.ly/a", ValueError("timed out"), "shortened_url")
+        df = log.to_df()
+        self.assertIs(log.to_df(), df)
+        self.assertEqual(list(df.columns), error_log.columns)
+
+        other = error_log()
+        other.append("rumble.com/v1", None, "rumble")
+        other.append("gettr.com/post/x", "not found", "gettr")
+        log.extend(other)
+        self.assertEqual(len(log), 3)
+        df = log.to_df()
+        self.assertEqual(list(df["url"]), ["bit.ly/a", "rumble.com/v1", "gettr.com/post/x"])
+        self.assertEqual(list(df["platform"]), ["shortened_url", "rumble", "gettr"])
+
+        log.append("t.co/b", "reset", "shortened_url")
+        self.assertEqual(len(log.to_df()), 4)
+
+    def test_001_jsonl_sink(self):
+        """Each record is written as one JSON object, with the error as text."""
+        path = os.path.join(self.directory.name, "errors.jsonl")
+        sink = error_sink(path)
+        log = error_log(sink)
+        log.append("bit.ly/a", ValueError("timed out"), "shortened_url")
+        log.append("rumble.com/v1", None, "rumble")
+        sink.close()
+        with open(path) as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(records, [
+            {"url": "bit.ly/a", "error_message": "timed out", "platform": "shortened_url"},
+            {"url": "rumble.com/v1", "error_message": "None", "platform": "rumble"},
+        ])
+
+    def test_002_csv_sink_reopened(self):
+        """A CSV sink writes its header once, also when an existing file is reopened and appended to."""
+        path = os.path.join(self.directory.name, "errors.csv")
+        sink = error_sink(path)
+        self.assertEqual(sink.format, "csv")
+        sink.write("bit.ly/a", ValueError("timed out, retried"), "shortened_url")
+        sink.close()
+
+        sink = error_sink(path)
+        sink.write("rumble.com/v1", "not found", "rumble")
+        sink.close()
+        with open(path, newline="") as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(rows, [
+            error_log.columns,
+            ["bit.ly/a", "timed out, retried", "shortened_url"],
+            ["rumble.com/v1", "not found", "rumble"],
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.extract`."""
+
+
+import re
+import unittest
+
+from bs4 import BeautifulSoup
+
+from urlFormatter.extract import stream_find
+
+
+class fake_response:
+    """Serves a body in small chunks and records how much of it was read."""
+
+    headers = {"content-type": "text/html; charset=utf-8"}
+
+    def __init__(self, body):
+        self.body = body.encode()
+        self.read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), 8):
+            self.read = start + 8
+            yield self.body[start:start + 8]
+
+    def close(self):
+        self.closed = True
+
+
+class TestStreamFind(unittest.TestCase):
+    """Tests for `stream_find`."""
+
+    def test_000_stops_at_match(self):
+        """Reading stops once the element has been read, and the response is closed."""
+        response = fake_response('<a class="x media-by--a" href="/c/Chan">x</a>' + "<p>filler</p>" * 1000)
+        found, page_content = stream_find(response, "a", attrs={"class": "media-by--a"})
+        self.assertEqual(found.get("href"), "/c/Chan")
+        self.assertIsNone(page_content)
+        self.assertTrue(response.closed)
+        self.assertLess(response.read, 100)
+
+    def test_001_same_element_as_beautifulsoup(self):
+        """Nesting, text and attribute lists follow BeautifulSoup's html.parser tree."""
+        page = (
+            '<html><head><title>User &amp; Co on GETTR<script>x</script></title>'
+            '<link rel="alternate canonical" href="https://vk.com/club_1/"></head><body>'
+            '<span itemprop="author"></span><div><span itemprop="author"><b><link href="/rel">'
+            '<link itemprop="url" href="http://www.youtube.com/@Author"></b></span></div></body></html>'
+        )
+        soup = BeautifulSoup(page, "html.parser")
+
+        title, _ = stream_find(fake_response(page), "title", text=True)
+        self.assertEqual(title.get_text(), soup.title.get_text())
+
+        canonical, _ = stream_find(fake_response(page), "link", attrs={"rel": "canonical"})
+        self.assertEqual(canonical.attrs, soup.find("link", attrs={"rel": "canonical"}).attrs)
+
+        # the first author span is empty, so BeautifulSoup finds nothing and neither does stream_find
+        author, page_content = stream_find(
+            fake_response(page), "link", attrs={"href": re.compile("https?://")}, within=("span", {"itemprop": "author"})
+        )
+        self.assertIsNone(author)
+        self.assertEqual(page_content, page.encode())
+
+    def test_002_missing_element_returns_page(self):
+        """Without a match the whole body is returned for a full parse."""
+        page = "<a>0</a><a>1</a><a>2</a>"
+        found, page_content = stream_find(fake_response(page), "a", index=3)
+        self.assertIsNone(found)
+        self.assertEqual(page_content, page.encode())
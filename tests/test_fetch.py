@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.fetch` against a local stub server."""
+
+
+import collections
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from urlFormatter.fetch import fetcher
+
+
+class recording_server:
+    """
+    Local HTTP/1.1 server answering each path with the statuses of `statuses` in turn (200 once
+    they run out), and recording the headers (lowercased) and client port of every request.
+    """
+
+    def __init__(self, statuses=None):
+        hits = self.hits = collections.Counter()
+        self.requests = []
+        requests = self.requests
+        lock = threading.Lock()
+
+        class handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with lock:
+                    hits[self.path] += 1
+                    count = hits[self.path]
+                    requests.append((self.path, {k.lower(): v for k, v in self.headers.items()}, self.client_address[1]))
+                sequence = (statuses or {}).get(self.path, [])
+                status = sequence[count - 1] if count <= len(sequence) else 200
+                body = ("%d %s" % (status, self.path)).encode()
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestFetcher(unittest.TestCase):
+    """Tests for `fetcher`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.server = recording_server({"/flaky": [503, 500], "/down": [503] * 10})
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.server.close()
+
+    def test_000_shared_session(self):
+        """Requests share one session, and its keep-alive connection to a host."""
+        http = fetcher()
+        for path in ["/a", "/b", "/c"]:
+            self.assertEqual(http.get(self.server.url + path).text, "200 " + path)
+        self.assertEqual(len({port for _, _, port in self.server.requests}), 1)
+
+    def test_001_pool_sizes(self):
+        """Hosts in pool_sizes get their own pool size, with or without 'www.'; others get pool_maxsize."""
+        http = fetcher(pool_maxsize=4, pool_sizes={"youtube.com": 32})
+        for url in ["https://youtube.com/watch?v=1", "https://www.youtube.com/watch?v=1", "http://youtube.com/x"]:
+            self.assertEqual(http.session.get_adapter(url)._pool_maxsize, 32, url)
+        self.assertEqual(http.session.get_adapter("https://rumble.com/v1")._pool_maxsize, 4)
+
+    def test_002_headers_and_timeout(self):
+        """Default headers go with every request, and the default timeout unless a call gives its own."""
+        http = fetcher(headers={"user-agent": "test-agent/1.0"}, timeout=7)
+        timeouts = []
+        request = http.session.request
+
+        def recording_request(method, url, **kwargs):
+            timeouts.append(kwargs.get("timeout"))
+            return request(method, url, **kwargs)
+
+        http.session.request = recording_request
+        http.get(self.server.url + "/a")
+        http.get(self.server.url + "/b", timeout=2)
+        self.assertEqual(timeouts, [7, 2])
+        self.assertEqual([headers["user-agent"] for _, headers, _ in self.server.requests], ["test-agent/1.0"] * 2)
+
+    def test_003_retries_server_errors(self):
+        """5xx responses are retried up to retries times; the last response is returned when they all fail."""
+        http = fetcher(retries=2, backoff_factor=0)
+        self.assertEqual(http.get(self.server.url + "/flaky").status_code, 200)
+        self.assertEqual(self.server.hits["/flaky"], 3)
+
+        response = http.get(self.server.url + "/down")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.hits["/down"], 3)
+
+        http = fetcher(retries=0, backoff_factor=0)
+        self.assertEqual(http.get(self.server.url + "/down").status_code, 503)
+        self.assertEqual(self.server.hits["/down"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.files`, `formatter.links_df` and the command line."""
+
+
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import urlFormatter
+from urlFormatter.files import expand_inputs, open_input, open_output, table_writer
+
+LINKS = [
+    "https://www.nytimes.com/a", "css-abc", "https://twitter.com/jack/status/1", "mailto:x@y.com", "bit.ly/abc",
+    "m.facebook.com/someone", "example.org/x",
+]
+
+
+class TestFiles(unittest.TestCase):
+    """Tests for input and output files."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def test_000_compressed_round_trip(self):
+        """gzip output is recognized by its magic number when read back, whatever its name."""
+        with open_output(self.path("links.txt.gz")) as file:
+            file.write("a\nb\n")
+        os.rename(self.path("links.txt.gz"), self.path("links.txt"))
+        with open_input(self.path("links.txt")) as file:
+            self.assertEqual(file.read(), "a\nb\n")
+        with open(self.path("links.txt"), "rb") as file:
+            self.assertEqual(gzip.decompress(file.read()), b"a\nb\n")
+
+    def test_001_expand_inputs(self):
+        """Globs are expanded in sorted order; other paths and stdin are kept as they are."""
+        for name in ["b.gz", "a.gz", "c.txt"]:
+            open(self.path(name), "w").close()
+        self.assertEqual(
+            expand_inputs([self.path("*.gz"), "-", self.path("missing.txt")]),
+            [self.path("a.gz"), self.path("b.gz"), "-", self.path("missing.txt")],
+        )
+
+    def test_002_links_df(self):
+        """links_df has a row per line, with the platform of social media links and the bin of discarded lines."""
+        formatter_obj = urlFormatter.formatter(LINKS)
+        formatted_links = formatter_obj.clean(verbose=False)
+        df = formatter_obj.links_df
+        self.assertEqual(len(df), len(LINKS))
+        self.assertEqual(list(df["link"][:len(formatted_links)]), formatted_links)
+        cells = df.astype(object).where(df.notna(), None)
+        rows = {link: (platform, garbage_type) for link, platform, garbage_type in cells.itertuples(index=False)}
+        self.assertEqual(rows["twitter.com/jack"], ("twitter.com", None))
+        self.assertEqual(rows["facebook.com/someone"], ("facebook.com", None))
+        self.assertEqual(rows["nytimes.com"], (None, None))
+        self.assertEqual(rows["css-abc"], (None, "non_url_garbage"))
+        self.assertEqual(rows["mailto:x@y.com"], (None, "mail"))
+        self.assertEqual(rows["bit.ly/abc"], (None, "shortened_urls"))
+
+        writer = table_writer(self.path("links.csv"), "csv")
+        writer.write(df)
+        writer.write(df)
+        writer.close()
+        with open(self.path("links.csv")) as file:
+            self.assertEqual(len(file.read().splitlines()), 2 * len(LINKS) + 1)
+
+    def test_003_command_line(self):
+        """The command line reads globs of compressed files and writes the same links as clean()."""
+        for name in ["a.txt.gz", "b.txt.gz"]:
+            with gzip.open(self.path(name), "wt") as file:
+                file.write("\n".join(LINKS) + "\n")
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        command = [sys.executable, "-m", "urlFormatter", "-c", "-j", "2", "--output-dir", self.directory]
+        subprocess.run(command + [self.path("*.gz")], capture_output=True, env=env, check=True)
+        expected = urlFormatter.formatter(LINKS).clean(verbose=False)
+        for name in ["a_cleaned_links.txt", "b_cleaned_links.txt"]:
+            with open(self.path(name)) as file:
+                self.assertEqual(file.read().splitlines(), expected)
+
+        # piped, with the metrics kept out of the output
+        output = subprocess.run(
+            command + ["-s", "--chunk-size=3", "--sort"], input="\n".join(LINKS), capture_output=True, text=True,
+            env=env, check=True,
+        )
+        self.assertEqual(output.stdout.splitlines(), expected)
+        self.assertIn("lines were processed", output.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+"""Tests for the import cost of `urlFormatter`."""
+
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# generous bound on the import time of the stdlib-only core; importing pandas alone takes longer
+IMPORT_TIME_TARGET = 0.25
+HEAVY_MODULES = ["pandas", "bs4", "requests", "urlexpander", "tldextract"]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import urlFormatter
+elapsed = time.perf_counter() - start
+f = urlFormatter.formatter(["https://bit.ly/x", "https://www.example.com/a", "twitter.com/a/status/1", "mailto:x"])
+links = f.clean(verbose=False)
+print(json.dumps({"elapsed": elapsed, "links": links, "loaded": [m for m in %r if m in sys.modules]}))
+""" % HEAVY_MODULES
+
+
+class TestImports(unittest.TestCase):
+    """Tests for lazy loading of the heavy dependencies."""
+
+    def run_fresh(self):
+        """Runs SCRIPT in a new interpreter, so that nothing is imported beforehand."""
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        output = subprocess.run([sys.executable, "-c", SCRIPT], capture_output=True, text=True, env=env, check=True)
+        return json.loads(output.stdout.splitlines()[-1])
+
+    def test_000_offline_clean_is_stdlib_only(self):
+        """Importing the package and an offline clean() load none of the heavy dependencies."""
+        result = self.run_fresh()
+        self.assertEqual(result["loaded"], [])
+        self.assertEqual(result["links"], ["example.com", "twitter.com/a"])
+
+    def test_001_import_time(self):
+        """The package imports within IMPORT_TIME_TARGET seconds (best of three runs)."""
+        elapsed = min(self.run_fresh()["elapsed"] for _ in range(3))
+        self.assertLess(elapsed, IMPORT_TIME_TARGET)
+
+    def test_002_default_shorteners(self):
+        """The shortener list is read from urlexpander without importing the package."""
+        from urlFormatter.shorteners import default_shorteners
+
+        shorteners = default_shorteners()
+        import urlexpander
+
+        self.assertEqual(shorteners, list(urlexpander.constants.all_short_domains))
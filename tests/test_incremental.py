@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+"""Tests for `formatter.add`."""
+
+
+import unittest
+
+import urlFormatter
+from urlFormatter.shorteners import shortener_index
+
+
+LINKS = [
+    "https://www.nytimes.com/2023/01/01/story.html", "http://example.org/a/b?c=1", "css-abc", "mailto:bob@x.com",
+    "instagram.com/p/abc", "instagram.com/someone/", "https://twitter.com/jack/status/20", "twitter.com/hashtag/foo",
+    "facebook.com/story.php?id=1", "t.me/channel/123", "youtube.com/c/Chan", "youtube.com/results?search_query=x",
+    "bit.ly/abc", "tiktok.com/tag/x", "odysee.com/@chan:1/vid:2", "Example.ORG/x", "t.me/channel/123",
+]
+
+
+class TestAdd(unittest.TestCase):
+    """Tests for `formatter.add`."""
+
+    def test_000_same_as_full_run(self):
+        """Adding links in batches gives the results of a single run over all of them."""
+        full = urlFormatter.formatter(list(LINKS))
+        full.clean(verbose=False)
+
+        incremental = urlFormatter.formatter(LINKS[:6])
+        incremental.clean(verbose=False)
+        incremental.add(LINKS[6:12])
+        formatted_links = incremental.add(LINKS[12:])
+
+        self.assertEqual(formatted_links, full.formatted_links)
+        self.assertEqual(incremental.raw_links, LINKS)
+        self.assertEqual(incremental.garbage_counts, full.garbage_counts)
+        for name in ["final_difference", "final_overall_garbage", "garbage_less_difference", "shortened_urls_list"]:
+            self.assertEqual(getattr(incremental, name), getattr(full, name), name)
+        for name in incremental.builtin_garbage_bins + ("sm_urls_list", "non_sm_urls_list"):
+            self.assertEqual(sorted(getattr(incremental, name)), sorted(getattr(full, name)), name)
+
+    def test_001_before_any_method(self):
+        """Links added before unshorten() or clean() are only classified."""
+        formatter_obj = urlFormatter.formatter(LINKS[:12])
+        raw_links = formatter_obj.raw_links
+        self.assertIsNone(formatter_obj.add(LINKS[12:]))
+        self.assertEqual(formatter_obj.shortened_urls_list, ["bit.ly/abc"])
+        self.assertEqual(len(raw_links), 12)
+
+    def test_002_batches_share_parent_state(self):
+        """Batches of add() use the object's fetcher and shorteners instead of building their own."""
+        formatter_obj = urlFormatter.formatter(LINKS[:6])
+        formatter_obj.clean(verbose=False)
+        formatter_obj.known_shorteners = formatter_obj.known_shorteners + ["sho.rt"]
+        formatter_obj.shortener_index = shortener_index(formatter_obj.known_shorteners)
+        first, second = formatter_obj._spawn(["a.com"]), formatter_obj._spawn(["b.com"])
+        self.assertIs(first.http, formatter_obj.http)
+        self.assertIs(second.http, formatter_obj.http)
+        self.assertIs(first.shortener_index, formatter_obj.shortener_index)
+        self.assertIs(first.vk_rules, formatter_obj.vk_rules)
+
+        formatter_obj.add(["sho.rt/abc", "nytimes.com/a"])
+        self.assertEqual(formatter_obj.shortened_urls_list[-1], "sho.rt/abc")
+        self.assertNotIn("sho.rt", formatter_obj.formatted_links)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+"""Tests for the run journal in `urlFormatter.journal`."""
+
+
+import os
+import tempfile
+import unittest
+
+import urlFormatter
+from urlFormatter.journal import run_journal
+
+
+class offline_http:
+    """Stands in for fetcher in runs that must not make any request."""
+
+    def get(self, url, **kwargs):
+        raise AssertionError("unexpected request to " + url)
+
+    head = get
+
+
+class TestRunJournal(unittest.TestCase):
+    """Tests for `run_journal`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "run.journal")
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.tmpdir.cleanup()
+
+    def test_000_resume(self):
+        """Outcomes and the last checkpoint are read back; a line cut off by a crash is dropped."""
+        journal = run_journal(self.path)
+        journal.set("unshorten", "https://bit.ly/x", "nytimes.com/story")
+        journal.set_failure("rumble", "rumble.com/v1", ValueError("timed out"))
+        journal.mark(offset=10)
+        journal.set_failure("gettr", "gettr.com/post/1")
+        journal.close()
+        with open(self.path, "a") as file:
+            file.write('{"namespace": "unsh')
+
+        journal = run_journal(self.path, resume=True)
+        self.assertEqual(journal.get("unshorten", "bit.ly/x"), (True, "nytimes.com/story"))
+        self.assertEqual(journal.get("rumble", "rumble.com/v1"), (False, "timed out"))
+        self.assertEqual(journal.get("gettr", "gettr.com/post/1"), (False, None))
+        self.assertEqual(journal.checkpoint, {"offset": 10})
+        journal.set("unshorten", "bit.ly/y", "example.org")
+        journal.close()
+
+        self.assertEqual(len(run_journal(self.path, resume=True)), 4)
+        self.assertEqual(len(run_journal(self.path)), 0)
+
+    def test_001_formatter_replays_journal(self):
+        """A formatter given the journal of an earlier run makes no request for what it recorded."""
+        journal = run_journal(self.path)
+        journal.set("unshorten", "https://bit.ly/good", "nytimes.com/2023/story.html")
+        journal.set_failure("unshorten", "https://tinyurl.com/dead", "Name or service not known")
+        journal.set("rumble", "rumble.com/v1-video.html", "rumble.com/c/Chan")
+        journal.close()
+
+        links = ["bit.ly/good", "tinyurl.com/dead", "rumble.com/v1-video.html", "example.org/a"]
+        formatter_obj = urlFormatter.formatter(links, http=offline_http(), journal=self.path)
+        formatter_obj.unshorten(verbose=False)
+        formatted_links = formatter_obj.clean(verbose=False)
+
+        self.assertEqual(formatted_links, ["example.org", "nytimes.com", "rumble.com/c/chan"])
+        self.assertEqual(formatter_obj.shortened_urls_garbage, ["https://tinyurl.com/dead"])
+        self.assertEqual(list(formatter_obj.unshorten_errors.errors), ["Name or service not known"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.platforms`."""
+
+
+import unittest
+
+from urlFormatter.platforms import default_registry, rule, sub
+
+
+class TestPlatformRegistry(unittest.TestCase):
+    """Tests for `platform_registry`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.registry = default_registry()
+
+    def test_000_routes(self):
+        """Links are sent to the same destinations as the original if/elif chain."""
+        self.assertEqual(self.registry.route("instagram.com/p/abc"), ("ig_garbage", "instagram.com/p/abc"))
+        self.assertEqual(self.registry.route("twitter.com/jack/status/20"), ("sm_urls_list", "twitter.com/jack"))
+        self.assertEqual(self.registry.route("t.me/channel/123"), ("sm_urls_list", "t.me/channel"))
+        self.assertEqual(self.registry.route("youtube.com/c/Chan"), ("sm_urls_list", "youtube.com/@Chan"))
+        self.assertEqual(self.registry.route("vk.com/durov"), ("vk_list", "vk.com/durov"))
+        self.assertEqual(self.registry.route("gab.com/someone/"), ("sm_other_urls_list", "gab.com/someone"))
+        self.assertEqual(
+            self.registry.route("rumble.com/v1-x.html"), ("resolve", ("rumble", "_lookup_rumble", "rumble_garbage"))
+        )
+
+    def test_001_rules_for_every_platform(self):
+        """Rules declared without platforms apply to links of every platform, in order."""
+        self.assertEqual(
+            self.registry.route("t.me/share?url=twitter.com/a/status/1"), ("sm_urls_list", "t.me/share?url=twitter.com/a")
+        )
+
+    def test_002_add_platform(self):
+        """New platforms are recognised by the filter and routed by their own rules."""
+        self.registry.add_platform("bsky.app")
+        self.registry.add_rule(rule("bsky\.app/profile/[^/]+/post", "sm_urls_list", platforms=["bsky.app"], transform=sub("/post.*", "")))
+        self.registry.add_rule(rule("bsky\.app/search", "bsky_garbage", platforms=["bsky.app"]))
+        self.registry.compile()
+        self.assertTrue(self.registry.filter.match("m.bsky.app/profile/x"))
+        self.assertEqual(self.registry.route("bsky.app/profile/x/post/1"), ("sm_urls_list", "bsky.app/profile/x"))
+        self.assertEqual(self.registry.route("bsky.app/search?q=1"), ("bsky_garbage", "bsky.app/search?q=1"))
+        self.assertIn("bsky_garbage", self.registry.garbage_bins())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.ratelimit` against a local stub server."""
+
+
+import asyncio
+import collections
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from urlFormatter.fetch import fetcher
+from urlFormatter.ratelimit import async_scheduler, host_key, rate_limiter, scheduler
+
+
+class stub_server:
+    """
+    Local HTTP server simulating a throttling platform: the first `throttled` requests to each
+    path are answered with 429 and a Retry-After of `retry_after` seconds, later ones with 200.
+    """
+
+    def __init__(self, throttled=0, retry_after="0"):
+        hits = self.hits = collections.Counter()
+        lock = threading.Lock()
+
+        class handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with lock:
+                    hits[self.path] += 1
+                    count = hits[self.path]
+                if count <= throttled:
+                    self.send_response(429)
+                    self.send_header("Retry-After", retry_after)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = self.path.encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.url = "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestRateLimit(unittest.TestCase):
+    """Tests for `rate_limiter`, `scheduler` and the throttling handled by `fetcher`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.servers = []
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        for server in self.servers:
+            server.close()
+
+    def serve(self, **kwargs):
+        server = stub_server(**kwargs)
+        self.servers.append(server)
+        return server
+
+    def test_000_host_key(self):
+        """Limits are kept per host and port, with or without scheme and 'www.'."""
+        self.assertEqual(host_key("https://www.YouTube.com/watch?v=1"), "youtube.com")
+        self.assertEqual(host_key("rumble.com/v1"), "rumble.com")
+        self.assertEqual(host_key("http://127.0.0.1:8080/x"), "127.0.0.1:8080")
+
+    def test_001_retries_throttled_requests(self):
+        """429 responses are retried after the host's Retry-After."""
+        server = self.serve(throttled=2, retry_after="0.1")
+        http = fetcher(retries=2)
+        start = time.monotonic()
+        response = http.get(server.url + "/page")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.hits["/page"], 3)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_002_token_bucket(self):
+        """A host receives no more than its rate of requests per second."""
+        server = self.serve()
+        http = fetcher(host_rates={"127.0.0.1": 20})
+        start = time.monotonic()
+        for i in range(6):
+            http.get(server.url + "/%d" % i)
+        self.assertGreaterEqual(time.monotonic() - start, 0.25)
+
+    def test_003_adaptive_rate(self):
+        """Throttling halves a host's rate and successes bring it back."""
+        limiter = rate_limiter(rate=8, backoff_factor=0)
+        limiter.throttled("a.com")
+        self.assertEqual(limiter._bucket("a.com").current_rate, 4)
+        limiter.succeeded("a.com")
+        self.assertAlmostEqual(limiter._bucket("a.com").current_rate, 4.8)
+        self.assertEqual(limiter._bucket("b.com").current_rate, 8)
+
+    def test_004_scheduler_interleaves_hosts(self):
+        """A throttling host is retried later while the jobs of other hosts go ahead."""
+        slow = self.serve(throttled=1, retry_after="0.5")
+        fast = self.serve()
+        http = fetcher(retries=2)
+        finished = []
+
+        def job(url):
+            def fetch():
+                response = http.get(url)
+                finished.append(url)
+                return response.status_code
+            return fetch
+
+        urls = [slow.url + "/1", slow.url + "/2"] + [fast.url + "/%d" % i for i in range(4)]
+        results = scheduler(http).run((url, url, job(url)) for url in urls)
+
+        self.assertEqual(results, {url: 200 for url in urls})
+        # every job of the healthy host finished before the throttled host's cooldown ended
+        self.assertEqual(finished[:4], urls[2:])
+        self.assertEqual(sorted(finished[4:]), urls[:2])
+
+    def test_005_async_scheduler(self):
+        """async_scheduler returns what scheduler does, and a throttled host is retried after its cooldown."""
+        slow = self.serve(throttled=1, retry_after="0.2")
+        fast = self.serve()
+        http = fetcher(retries=2)
+        urls = [slow.url + "/1"] + [fast.url + "/%d" % i for i in range(4)]
+        jobs = [(url, url, lambda url=url: http.get(url).text) for url in urls]
+
+        results = asyncio.run(async_scheduler(http, workers=3).run(jobs))
+        self.assertEqual(results, {url: url[-2:] for url in urls})
+        self.assertEqual(slow.hits["/1"], 2)
+
+    def test_006_async_scheduler_cancel(self):
+        """Cancelling the awaiting task stops further jobs from being started."""
+        started = []
+
+        def job(i):
+            def run():
+                started.append(i)
+                time.sleep(0.05)
+                return i
+            return run
+
+        async def cancelled_run():
+            task = asyncio.ensure_future(async_scheduler(None, workers=2).run(("h%d" % i, i, job(i)) for i in range(40)))
+            await asyncio.sleep(0.12)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancelled_run())
+        time.sleep(0.1)
+        self.assertLess(len(started), 12)
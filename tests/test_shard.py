@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.shard`."""
+
+
+import pickle
+import unittest
+
+import urlFormatter
+from urlFormatter import shard
+from urlFormatter.platforms import default_registry
+from urlFormatter.shorteners import url_host, url_hosts
+
+LINKS = [
+    "https://www.site1.com/2023/article.html",
+    "http://news2.org/world/1?utm_source=telegram",
+    "https://twitter.com/user1/status/10",
+    "https://m.facebook.com/page2/posts/11",
+    "reddit.com/r/sub3/comments/12",
+    "https://t.me/Channel4/13",
+    "instagram.com/p/abc",
+    "https://www.instagram.com/user5/",
+    "m.tiktok.com/v/1",
+    "tiktok.com/@user6?lang=en",
+    "gab.com/user7/",
+    "photos/1.jpg",
+    "mailto:someone@example.com",
+    "https://bit.ly/x",
+]
+
+
+class TestShard(unittest.TestCase):
+    """Tests for sharded execution of `formatter.clean()`."""
+
+    def clean(self, links, processes):
+        formatter_obj = urlFormatter.formatter(links)
+        formatter_obj.clean(verbose=False, processes=processes)
+        return formatter_obj
+
+    def test_000_registry_is_picklable(self):
+        """The default registry can be sent to worker processes."""
+        registry = pickle.loads(pickle.dumps(default_registry()))
+        self.assertEqual(registry.route("twitter.com/jack/status/20"), ("sm_urls_list", "twitter.com/jack"))
+
+    def test_001_matches_single_process(self):
+        """Every list produced by a sharded run equals the single-process run."""
+        links = LINKS * 300
+        single = self.clean(links, 1)
+        sharded = self.clean(links, 2)
+        for name in ["raw_with_expansion", "formatted_links", "sm_urls_list", "non_sm_urls_list", "final_sm_garbage",
+                     "non_url_garbage", "mail_garbage", "ig_garbage", "tiktok_garbage", "garbage_counts"]:
+            self.assertEqual(getattr(sharded, name), getattr(single, name), name)
+
+    def test_002_bulk_steps(self):
+        """The bulk steps give the result of the single-link steps, also for links they cannot join by newlines."""
+        registry = default_registry()
+        registry.add_platform("example.com/videos")
+        for links in [LINKS, LINKS + ["WWW.Example.com/videos/1", "https://www.example.com/a", "", "x.org/a\nb", "Bit.LY./x"]]:
+            schemeless = shard.bulk_strip_scheme(links)
+            self.assertEqual(schemeless, [shard.strip_scheme(link) for link in links])
+            self.assertEqual(url_hosts(links), [url_host(link) for link in links])
+            self.assertEqual(shard.bulk_normalize_link(schemeless), [shard.normalize_link(link) for link in schemeless])
+            for platforms in [default_registry(), registry]:
+                platforms.compile()
+                self.assertEqual(
+                    shard.bulk_route_raw_link(schemeless, platforms.filter),
+                    [shard.route_raw_link(link, platforms.filter) for link in schemeless],
+                )
+
+    def test_003_stream_shares_one_pool(self):
+        """A stream with processes > 1 starts one process pool for all its chunks, and closes it at the end."""
+        import concurrent.futures
+
+        from urlFormatter.stream import format_stream
+
+        started = []
+        executor_class = concurrent.futures.ProcessPoolExecutor
+
+        class counting_executor(executor_class):
+            def __init__(self, *args, **kwargs):
+                started.append(self)
+                super().__init__(*args, **kwargs)
+
+        concurrent.futures.ProcessPoolExecutor = counting_executor
+        try:
+            links = list(format_stream(LINKS * 200, chunk_size=700, clean_kwargs={"processes": 2}))
+        finally:
+            concurrent.futures.ProcessPoolExecutor = executor_class
+        self.assertEqual(sorted(links), self.clean(LINKS * 200, 1).formatted_links)
+        self.assertEqual(len(started), 1)
+        self.assertTrue(started[0]._shutdown_thread)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.shorteners`."""
+
+
+import os
+import tempfile
+import unittest
+
+import urlFormatter
+from urlFormatter.benchmarks.fake_server import fake_server, page_for, route_to
+from urlFormatter.cache import resolution_cache
+from urlFormatter.fetch import fetcher
+from urlFormatter.shorteners import shortener_index, url_host
+
+
+class TestShortenerIndex(unittest.TestCase):
+    """Tests for `shortener_index`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.index = shortener_index(["bit.ly", "t.co", "youtu.be", "on.fb.me"])
+
+    def test_000_url_host(self):
+        """Hosts are extracted with or without scheme, credentials and port."""
+        self.assertEqual(url_host("https://Bit.ly/AbC"), "bit.ly")
+        self.assertEqual(url_host("bit.ly/AbC?x=1"), "bit.ly")
+        self.assertEqual(url_host("http://user:pw@bit.ly:8080/x"), "bit.ly")
+        self.assertEqual(url_host("css-abc"), "css-abc")
+
+    def test_001_is_short(self):
+        """Shorteners and their subdomains match; lookalike domains do not."""
+        for link in ["bit.ly/x", "https://www.bit.ly/x", "T.CO/abc", "youtu.be", "https://on.fb.me/1"]:
+            self.assertTrue(self.index.is_short(link), link)
+        for link in ["xt.co/abc", "bit.ly.example.com/x", "fb.me/x", "nytimes.com/bit.ly", "mailto"]:
+            self.assertFalse(self.index.is_short(link), link)
+
+
+class TestRedirects(unittest.TestCase):
+    """Tests for the hop-by-hop redirects of `formatter.unshorten()`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.server = fake_server()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.server.close()
+
+    def test_000_stops_at_first_destination(self):
+        """Redirects are followed through shorteners only, and the destination itself is never requested."""
+        # a bit.ly link redirecting to another bit.ly link, which redirects to nytimes.com
+        paths = ("p%d" % i for i in range(100))
+        path = next(p for p in paths if "bit.ly" in page_for("bit.ly", "/" + p, 0)[1]["Location"])
+        http = fetcher()
+        route_to(http, self.server.url)
+        formatter_obj = urlFormatter.formatter(["bit.ly/" + path, "youtu.be/abc", "nytimes.com/a"], http=http)
+        links = formatter_obj.unshorten(verbose=False)
+
+        self.assertEqual(links[0], "nytimes.com/a")
+        self.assertRegex(links[1], "^nytimes.com/2023/05/")
+        self.assertEqual(links[2], "youtube.com/watch?v=abc")
+        chain = formatter_obj.redirect_chains["https://bit.ly/" + path]
+        self.assertEqual([url_host(url) for url in chain], ["bit.ly", "bit.ly", "www.nytimes.com"])
+        self.assertEqual(formatter_obj.redirect_chains["https://youtu.be/abc"], [
+            "https://youtu.be/abc", "https://www.youtube.com/watch?v=abc",
+        ])
+        self.assertEqual(self.server.hits["youtube.com"] + self.server.hits["nytimes.com"], 0)
+
+    def test_001_failed_hop(self):
+        """A hop failing part way leaves the URL unresolved and cached as a failure; add() keeps the chains."""
+        import requests
+
+        paths = ("p%d" % i for i in range(100))
+        path = next(p for p in paths if "bit.ly" in page_for("t.co", "/" + p, 0)[1]["Location"])
+        http = fetcher(retries=0)
+        adapter = route_to(http, self.server.url)
+        send = adapter.send
+
+        def failing_send(request, **kwargs):
+            if "bit.ly" in request.url:
+                raise requests.ConnectionError("connection reset")
+            return send(request, **kwargs)
+
+        adapter.send = failing_send
+        with tempfile.TemporaryDirectory() as directory:
+            cache = resolution_cache(os.path.join(directory, "cache.sqlite"))
+            formatter_obj = urlFormatter.formatter(["t.co/" + path], http=http, cache=cache)
+            self.assertEqual(formatter_obj.unshorten(verbose=False), [])
+            self.assertEqual(formatter_obj.shortened_urls_garbage, ["https://t.co/" + path])
+            self.assertEqual(len(formatter_obj.redirect_chains["https://t.co/" + path]), 2)
+            ok, error = cache.get("unshorten", "https://t.co/" + path)
+            self.assertFalse(ok)
+            self.assertIn("connection reset", error)
+
+            formatter_obj.add(["youtu.be/abc"])
+            self.assertIn("https://youtu.be/abc", formatter_obj.redirect_chains)
+            cache.close()
+
+
+    def test_002_too_many_redirects(self):
+        """A URL still on a shortener after max_redirects hops is an error, not a result."""
+        paths = ("p%d" % i for i in range(100))
+        path = next(p for p in paths if "bit.ly/chain" in page_for("t.co", "/" + p, 0)[1]["Location"])
+        http = fetcher(retries=0)
+        route_to(http, self.server.url)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = resolution_cache(os.path.join(directory, "cache.sqlite"))
+            formatter_obj = urlFormatter.formatter(["t.co/" + path], http=http, cache=cache)
+            formatter_obj.max_redirects = 1
+            self.assertEqual(formatter_obj.unshorten(verbose=False), [])
+            self.assertEqual(formatter_obj.shortened_urls_garbage, ["https://t.co/" + path])
+            self.assertIn("Exceeded 1 redirects", str(formatter_obj.unshorten_errors.errors[0]))
+            self.assertFalse(cache.get("unshorten", "https://t.co/" + path)[0])
+            cache.close()
+
+            # with the default limit the same chain reaches its destination
+            formatter_obj = urlFormatter.formatter(["t.co/" + path], http=http)
+            self.assertRegex(formatter_obj.unshorten(verbose=False)[0], "^nytimes.com/")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+"""Tests for the timing instrumentation in `urlFormatter.stats`."""
+
+
+import unittest
+
+import urlFormatter
+from urlFormatter.stats import run_stats
+
+
+class TestRunStats(unittest.TestCase):
+    """Tests for `run_stats` and formatter's stats argument."""
+
+    def test_000_events(self):
+        """Stages and lookups are accumulated and passed to hooks."""
+        events = []
+        stats = run_stats(hooks=[events.append])
+        lap = stats.stopwatch("clean")
+        lap("route")
+        lap("route")
+        stats.request("rumble", "rumble.com/v1", 0.02, 1500)
+        stats.request("rumble", "rumble.com/v2", 3.0, 0, error=True)
+
+        self.assertEqual(stats.stages["clean.route"].calls, 2)
+        rumble = stats.platforms["rumble"]
+        self.assertEqual((rumble.calls, rumble.bytes, rumble.errors), (2, 1500, 1))
+        self.assertEqual(rumble.histogram[2], 1)
+        self.assertEqual(rumble.histogram[9], 1)
+        self.assertEqual([event["event"] for event in events], ["stage", "stage", "request", "request"])
+        self.assertEqual(events[-1]["url"], "rumble.com/v2")
+
+    def test_001_formatter_stages(self):
+        """A formatter created with stats=True times each stage; without it nothing is recorded."""
+        links = ["https://www.nytimes.com/2023/01/01/story.html", "twitter.com/jack/status/20", "css-abc"]
+        formatter_obj = urlFormatter.formatter(links, stats=True)
+        formatter_obj.clean(verbose=False)
+        stages = set(formatter_obj.stats.stages)
+        self.assertTrue({"init.classify", "clean.route", "clean.lookups", "clean.normalize"} <= stages)
+        self.assertEqual(formatter_obj.stats.platforms, {})
+        self.assertEqual(list(formatter_obj.stats_df["kind"].unique()), ["stage"])
+
+        formatter_obj = urlFormatter.formatter(links)
+        formatter_obj.clean(verbose=False)
+        self.assertIsNone(formatter_obj.stats)
+        self.assertIsNone(formatter_obj.stats_df)
+
+
+if __name__ == "__main__":
+    unittest.main()
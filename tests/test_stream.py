@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""Tests for `urlFormatter.stream`."""
+
+
+import os
+import tempfile
+import unittest
+
+import urlFormatter
+from urlFormatter.stream import external_sort, format_stream, stream_summary
+
+LINKS = [
+    "https://www.nytimes.com/2023/01/01/story.html", "css-abc", "mailto:bob@x.com", "instagram.com/p/abc",
+    "instagram.com/someone/", "https://twitter.com/jack/status/20", "t.me/channel/123", "bit.ly/abc",
+    "Example.ORG/x", "youtube.com/watch?v=dQw4w9WgXcQ", "http://nytimes.com/b", "css-abc", "twitter.com/jack",
+    "youtube.com/watch?v=aaaaaaaaaaa", "photos/1.jpg", "t.me/channel/124", "mailto:eve@y.org",
+]
+
+
+class offline_http:
+    """ fetcher stand-in whose every request fails, so that page lookups produce errors without a network """
+
+    def get(self, url, **kwargs):
+        raise ConnectionError("offline")
+
+
+class TestStream(unittest.TestCase):
+    """Tests for `external_sort` and `stream_summary`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.directory.cleanup()
+
+    def test_000_external_sort(self):
+        """Lines spilled to several sorted runs are merged back in order, duplicates kept, and the runs removed."""
+        lines = ["line%03d" % ((i * 37) % 50) for i in range(120)] + ["line007"] * 3
+        in_path = os.path.join(self.directory.name, "in.txt")
+        out_path = os.path.join(self.directory.name, "out.txt")
+        with open(in_path, "w") as file:
+            # the last line has no newline, as at the end of a file
+            file.write("\n".join(lines))
+
+        external_sort(in_path, out_path, chunk_size=7)
+        with open(out_path) as file:
+            self.assertEqual(file.read().splitlines(), sorted(lines))
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["in.txt", "out.txt"])
+
+    def test_001_stream_summary(self):
+        """The totals of a stream are those of one formatter run over all of its chunks."""
+        whole = urlFormatter.formatter(LINKS, http=offline_http())
+        formatted_links = whole.clean(verbose=False)
+
+        summary = stream_summary()
+        links = list(format_stream(LINKS, chunk_size=4, summary=summary, http=offline_http()))
+
+        self.assertEqual(sorted(links), formatted_links)
+        self.assertEqual(summary.chunks, 5)
+        self.assertEqual(summary.lines, len(LINKS))
+        self.assertEqual(summary.formatted, len(formatted_links))
+        self.assertEqual(summary.discarded, whole.final_difference)
+        self.assertEqual(summary.final_sm_garbage, len(whole.final_sm_garbage))
+        self.assertEqual(summary.garbage_counts, dict(whole.garbage_counts))
+        self.assertEqual(summary.error_counts, {"youtube_watch": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+"""Tests for the concurrent `formatter.unshorten()` against the local fake server."""
+
+
+import collections
+import threading
+import unittest
+
+import urlFormatter
+from urlFormatter.benchmarks.fake_server import fake_server, page_for, route_to
+from urlFormatter.fetch import fetcher
+from urlFormatter.ratelimit import host_key
+
+LINKS = (
+    ["bit.ly/a%d" % i for i in range(12)] + ["t.co/b%d" % i for i in range(12)] + ["tinyurl.com/c%d" % i for i in range(8)]
+    + ["bit.ly/broken1", "nytimes.com/x", "t.co/broken2", "bit.ly/a3", "youtu.be/abcdefghijk", "ow.ly/d1"]
+)
+
+
+class TestConcurrentUnshorten(unittest.TestCase):
+    """Tests for `unshorten(workers=N, per_host_limit=k)`."""
+
+    def setUp(self):
+        """Set up test fixtures, if any."""
+        self.server = fake_server(latency=0.02)
+
+    def tearDown(self):
+        """Tear down test fixtures, if any."""
+        self.server.close()
+
+    def run_unshorten(self, **kwargs):
+        """ runs unshorten() on LINKS; returns the formatter object and the most requests in flight at once per host """
+        import requests
+
+        http = fetcher(retries=0)
+        adapter = route_to(http, self.server.url)
+        send = adapter.send
+        in_flight = collections.Counter()
+        most = collections.Counter()
+        lock = threading.Lock()
+
+        def counting_send(request, **send_kwargs):
+            host = host_key(request.url)
+            with lock:
+                in_flight[host] += 1
+                most[host] = max(most[host], in_flight[host])
+            try:
+                if "broken" in request.url:
+                    raise requests.ConnectionError("connection reset")
+                return send(request, **send_kwargs)
+            finally:
+                with lock:
+                    in_flight[host] -= 1
+
+        adapter.send = counting_send
+        formatter_obj = urlFormatter.formatter(LINKS, http=http)
+        formatter_obj.unshorten(verbose=False, **kwargs)
+        return formatter_obj, most
+
+    def test_000_same_results_as_serial(self):
+        """Concurrent runs give the lists and errors of a serial run, in the same order."""
+        serial, _ = self.run_unshorten(workers=1)
+        concurrent, _ = self.run_unshorten(workers=8, per_host_limit=2)
+        self.assertEqual(len(serial.shortened_urls_garbage), 2)
+        self.assertEqual(concurrent.expanded_urls_list, serial.expanded_urls_list)
+        self.assertEqual(concurrent.shortened_urls_garbage, serial.shortened_urls_garbage)
+        self.assertEqual(concurrent.raw_with_expansion, serial.raw_with_expansion)
+        errors = concurrent.unshorten_errors_df.astype(str)
+        self.assertTrue(errors.equals(serial.unshorten_errors_df.astype(str)))
+
+    def test_001_per_host_limit(self):
+        """No more than per_host_limit requests are in flight against one host, while hosts run in parallel."""
+        _, most = self.run_unshorten(workers=8, per_host_limit=2)
+        self.assertLessEqual(max(most.values()), 2)
+        self.assertEqual(most["bit.ly"], 2)
+        _, most = self.run_unshorten(workers=8, per_host_limit=1)
+        self.assertEqual(max(most.values()), 1)
+
+    def test_002_each_url_requested_once(self):
+        """Repeats of a shortened URL, in any spelling, cost one request, and every occurrence is expanded."""
+        paths = ("p%d" % i for i in range(100))
+        path = next(p for p in paths if "bit.ly" not in page_for("bit.ly", "/" + p, 0)[1]["Location"])
+        spellings = [
+            "bit.ly/" + path, "https://bit.ly/" + path, "http://www.bit.ly/" + path, "https://BIT.LY/" + path,
+            "youtu.be/abcdefghijk", "https://youtu.be/abcdefghijk", "www.youtu.be/abcdefghijk",
+        ]
+        links = spellings + ["nytimes.com/x"] + spellings[::-1]
+        http = fetcher(retries=0)
+        adapter = route_to(http, self.server.url)
+        formatter_obj = urlFormatter.formatter(links, http=http)
+        formatter_obj.unshorten(workers=4, verbose=False)
+
+        self.assertEqual(adapter.requests, 2)
+        self.assertEqual(self.server.hits["bit.ly"] + self.server.hits["youtu.be"], 2)
+        self.assertEqual(len(formatter_obj.expanded_urls_list), len(spellings) * 2)
+        self.assertEqual(len(set(formatter_obj.expanded_urls_list)), 2)
+        self.assertIn("youtube.com/watch?v=abcdefghijk", formatter_obj.expanded_urls_list)
+
+
+if __name__ == "__main__":
+    unittest.main()